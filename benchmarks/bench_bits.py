@@ -0,0 +1,107 @@
+###############################################################################
+# Project: PLC Simulator
+# Purpose: Benchmark the MemoryManager bits section access
+# Author:  Paul M. Breen
+# Date:    2026-10-16
+###############################################################################
+
+"""
+Benchmark the MemoryManager bits section access
+
+This compares `MemoryManager.get_bits()` and `MemoryManager.set_bits()`
+against the original mask-based implementation, for byte-aligned and
+unaligned bit ranges, up to the Modbus maximum of 2000 coils per request.
+
+Usage:
+
+  python -m benchmarks.bench_bits
+"""
+
+import timeit
+
+from plcsimulator.MemoryManager import MemoryManager, BITS_PER_BYTE
+
+def legacy_get_bits(mm, section='bits', addr=None, nbits=None):
+    """
+    Get bits using the original mask-based implementation
+    """
+
+    byteorder = mm.DEFAULTS['byteorder']
+    masks = mm.calc_masks(addr, nbits)
+    left_byte, right_byte = mm.calc_mem_slice_byte_bounds(addr, nbits)
+
+    with mm.locks[section].read:
+        mem_slice = mm.memspace[section][left_byte:right_byte]
+
+    data = mem_slice.copy()
+    data_bits = int.from_bytes(data, byteorder=byteorder)
+    masks_bits = int.from_bytes(masks, byteorder=byteorder)
+
+    masked_bits = data_bits & masks_bits
+    data = bytearray(masked_bits.to_bytes(len(masks), byteorder=byteorder))
+    data = mm.rshift_bits(data, addr % BITS_PER_BYTE, truncate=True)
+
+    data_len = nbits // BITS_PER_BYTE
+
+    if nbits % BITS_PER_BYTE > 0:
+        data_len += 1
+
+    return data[(data_len * -1):]
+
+def legacy_set_bits(mm, section='bits', addr=None, nbits=None, data=None):
+    """
+    Set bits using the original mask-based implementation
+    """
+
+    byteorder = mm.DEFAULTS['byteorder']
+    masks = mm.calc_masks(addr, nbits)
+    left_byte, right_byte = mm.calc_mem_slice_byte_bounds(addr, nbits)
+
+    with mm.locks[section].write:
+        mem_slice = mm.memspace[section][left_byte:right_byte]
+
+        data = mm.lshift_bits(data, addr % BITS_PER_BYTE)
+
+        mem_slice_bits = int.from_bytes(mem_slice, byteorder=byteorder)
+        data_bits = int.from_bytes(data, byteorder=byteorder)
+        masks_bits = int.from_bytes(masks, byteorder=byteorder)
+
+        patched_bits = data_bits & masks_bits
+        patched_bits = patched_bits | (mem_slice_bits & ~masks_bits)
+        patched_bytes = bytearray(patched_bits.to_bytes(len(masks), byteorder=byteorder))
+
+        mm.memspace[section][left_byte:right_byte] = patched_bytes
+
+    return data
+
+def bench(stmt, number):
+    """
+    Time the given statement, returning the best time per call in us
+    """
+
+    return min(timeit.repeat(stmt, number=number, repeat=5)) / number * 1e6
+
+def main():
+    """
+    Run the benchmarks and print a table of results
+    """
+
+    mm = MemoryManager(blen=4096)
+    cases = [('aligned', 8, 8), ('aligned', 0, 2000), ('unaligned', 3, 5), ('unaligned', 3, 2000)]
+    number = 2000
+
+    print('{:<14} {:>5} {:>6} {:>12} {:>12} {:>8}'.format('op', 'addr', 'nbits', 'legacy (us)', 'new (us)', 'speedup'))
+
+    for label, addr, nbits in cases:
+        data = bytearray(b'\xa5' * ((nbits + BITS_PER_BYTE - 1) // BITS_PER_BYTE))
+
+        old = bench(lambda: legacy_get_bits(mm, addr=addr, nbits=nbits), number)
+        new = bench(lambda: mm.get_bits(addr=addr, nbits=nbits), number)
+        print('{:<14} {:>5} {:>6} {:>12.2f} {:>12.2f} {:>7.1f}x'.format('get ' + label, addr, nbits, old, new, old / new))
+
+        old = bench(lambda: legacy_set_bits(mm, addr=addr, nbits=nbits, data=data.copy()), number)
+        new = bench(lambda: mm.set_bits(addr=addr, nbits=nbits, data=data.copy()), number)
+        print('{:<14} {:>5} {:>6} {:>12.2f} {:>12.2f} {:>7.1f}x'.format('set ' + label, addr, nbits, old, new, old / new))
+
+if __name__ == '__main__':
+    main()
@@ -13,15 +13,19 @@ This module contains the main application class for instantiating and running th
 * Reading the given simulation configuration file and setting up logging.
 * Instantiating the memory manager to provide the memory space of the PLC.
 * Instantiating the IO manager to provide the simulated IO of the PLC.
+* Alternatively, instantiating a fleet of PLCs, each with its own memory space and simulated IO.
 * Instantiating the fieldbus manager to provide a fieldbus-specific interface to the PLC.
 * Instantiating the TCP/IP Listener to handle incoming connections.
 """
 
+import logging
+
 from plcsimulator.Configurator import Configurator
 from plcsimulator.Listener import Listener
 from plcsimulator.FieldbusManager import FieldbusManager
 from plcsimulator.MemoryManager import MemoryManager
 from plcsimulator.IoManager import IoManager
+from plcsimulator.Fleet import Fleet
 
 class App(object):
     """
@@ -38,6 +42,9 @@ class App(object):
 
         self.conf_file = conf_file
         self.conf = {}
+        self.memory_manager = None
+        self.io_manager = None
+        self.fleet = None
  
     def init_components(self):
         """
@@ -48,22 +55,60 @@ class App(object):
         self.conf = self.configurator.get_configuration()
         self.configurator.setup_logging()
 
-        self.memory_manager = MemoryManager(**self.conf['memory_manager']['memspace'])
+        if 'fleet' in self.conf:
+            self.init_fleet_components()
+            return
+
+        self.memory_manager = MemoryManager(**self.conf['memory_manager']['memspace'], shared=self.conf['memory_manager'].get('shared'))
 
         self.io_manager = IoManager(self.conf['io_manager'], memory_manager=self.memory_manager)
-        self.io_manager.init_io()
 
         self.fieldbus_manager = FieldbusManager(**self.conf['fieldbus_manager'], memory_manager=self.memory_manager)
         self.fieldbus_manager.init_modules()
 
         self.listener = Listener(**self.conf['listener'], fieldbus_manager=self.fieldbus_manager)
 
+        # Any listener workers are forked before the simulation threads are
+        # started.  The workers only initialise the lazy simulations, which
+        # are evaluated when they are read
+        if self.listener.workers > 1 and self.listener.fork_workers():
+            self.io_manager.init_io(eager=False)
+        else:
+            self.io_manager.init_io()
+
+    def init_fleet_components(self):
+        """
+        Instantiate and initialise the components for a fleet of PLCs
+
+        Each PLC's memory space and simulations are created when it is first
+        addressed by a client
+        """
+
+        if self.conf['memory_manager'].get('shared'):
+            raise ValueError('A fleet of PLCs can\'t have a shared memory space')
+
+        self.fleet = Fleet(self.conf['fleet'], memspace=self.conf['memory_manager']['memspace'], io_conf=self.conf['io_manager'])
+
+        self.fieldbus_manager = FieldbusManager(**self.conf['fieldbus_manager'], fleet=self.fleet)
+        self.fieldbus_manager.init_modules()
+
+        self.listener = Listener(**self.conf['listener'], fieldbus_manager=self.fieldbus_manager)
+
+        if self.listener.workers > 1:
+            raise ValueError('A fleet of PLCs can\'t have listener workers')
+
+        self.fleet.start()
+
     def run(self):
         """
         Run the main application
 
         * Instantiate and initialise the main application components
         * Start the TCP/IP listener to accept incoming client connections
+        * On exit, log the listener's backend pool admission counters, and
+          the memory manager's lock contention counters and the timing
+          statistics of each simulation, or, for a fleet of PLCs, the number
+          of PLCs created
         """
 
         self.init_components()
@@ -73,3 +118,15 @@ class App(object):
         except KeyboardInterrupt:
             pass
 
+        logging.info("Listener backend pool stats: {}".format(self.listener.pool.get_stats()))
+
+        if self.fleet:
+            logging.info("Fleet PLCs created: {}".format(len(self.fleet.get_plcs())))
+            return
+
+        for section, stats in self.memory_manager.get_lock_stats().items():
+            logging.info("Memory manager lock stats: {}: {}".format(section, stats))
+
+        for id, stats in self.io_manager.get_simulation_stats().items():
+            logging.info("Simulation timing stats: {}: {}".format(id, stats))
+
@@ -0,0 +1,226 @@
+###############################################################################
+# Project: PLC Simulator
+# Purpose: Class to encapsulate a pool of backends with admission control
+# Author:  Paul M. Breen
+# Date:    2026-10-16
+###############################################################################
+
+"""
+PLC simulator backend pool module
+
+This module contains the backend pool class.  It manages:
+
+* Admitting client connections, subject to a limit on the number of
+  concurrent backends, the depth of the queue of connections waiting for a
+  backend, and the number of connections from each client address.
+* In the thread listener mode, running the backends from a pool of worker
+  threads, which are reused for later connections.
+* Counting the admitted, queued and rejected connections.
+
+A connection that can't be admitted is rejected, so that the latency for the
+admitted clients stays bounded when the simulator is overloaded.
+"""
+
+import collections
+import logging
+import threading
+
+class BackendPool(object):
+    """
+    Pool of backends for the PLC simulator
+    """
+
+    DEFAULTS = {
+        'max_backends': None,
+        'queue_depth': 0,
+        'max_per_client': None,
+        'idle_timeout': None,
+        'worker_linger': 60
+    }
+
+    def __init__(self, max_backends=DEFAULTS['max_backends'], queue_depth=DEFAULTS['queue_depth'], max_per_client=DEFAULTS['max_per_client'], idle_timeout=DEFAULTS['idle_timeout'], worker_linger=DEFAULTS['worker_linger']):
+        """
+        Constructor
+
+        :param max_backends: The maximum number of backends that run
+        concurrently.  If None, the number is unlimited
+        :type max_backends: int
+        :param queue_depth: The maximum number of admitted connections that
+        wait for a backend when the maximum number are running
+        :type queue_depth: int
+        :param max_per_client: The maximum number of admitted connections
+        from each client address.  If None, the number is unlimited
+        :type max_per_client: int
+        :param idle_timeout: The time (s) that a backend waits for a request
+        before closing the connection.  If None, it waits indefinitely
+        :type idle_timeout: float
+        :param worker_linger: The time (s) that an idle worker thread waits
+        for another connection before it exits
+        :type worker_linger: float
+        :raises: ValueError if a limit is invalid
+        """
+
+        if max_backends is not None and max_backends < 1:
+            raise ValueError("Backend pool max_backends must be at least 1: {}".format(max_backends))
+
+        if queue_depth < 0:
+            raise ValueError("Backend pool queue_depth must not be negative: {}".format(queue_depth))
+
+        if max_per_client is not None and max_per_client < 1:
+            raise ValueError("Backend pool max_per_client must be at least 1: {}".format(max_per_client))
+
+        if idle_timeout is not None and idle_timeout <= 0:
+            raise ValueError("Backend pool idle_timeout must be greater than 0: {}".format(idle_timeout))
+
+        if worker_linger <= 0:
+            raise ValueError("Backend pool worker_linger must be greater than 0: {}".format(worker_linger))
+
+        self.max_backends = max_backends
+        self.queue_depth = queue_depth
+        self.max_per_client = max_per_client
+        self.idle_timeout = idle_timeout
+        self.worker_linger = worker_linger
+        self.cond = threading.Condition()
+        self.nadmitted = 0
+        self.clients = collections.Counter()
+        self.pending = collections.deque()
+        self.nworkers = 0
+        self.nidle = 0
+        self.stats = {'admitted': 0, 'queued': 0, 'rejected': 0, 'max_concurrent': 0}
+
+    def admit(self, address):
+        """
+        Admit a connection from the given client address, if within the limits
+
+        An admitted connection must be released when it is closed
+
+        :param address: The client address
+        :type address: tuple
+        :returns: True if the connection is admitted, otherwise False
+        :rtype: bool
+        """
+
+        client = address[0] if address else None
+
+        with self.cond:
+            if self.max_per_client is not None and self.clients[client] >= self.max_per_client:
+                self.stats['rejected'] += 1
+                return False
+
+            if self.max_backends is not None:
+                if self.nadmitted >= self.max_backends + self.queue_depth:
+                    self.stats['rejected'] += 1
+                    return False
+
+                if self.nadmitted >= self.max_backends:
+                    self.stats['queued'] += 1
+
+            self.nadmitted += 1
+            self.clients[client] += 1
+            self.stats['admitted'] += 1
+
+            if self.nadmitted > self.stats['max_concurrent']:
+                self.stats['max_concurrent'] = self.nadmitted
+
+        return True
+
+    def release(self, address):
+        """
+        Release an admitted connection from the given client address
+
+        :param address: The client address
+        :type address: tuple
+        """
+
+        client = address[0] if address else None
+
+        with self.cond:
+            self.nadmitted -= 1
+            self.clients[client] -= 1
+
+            if self.clients[client] <= 0:
+                del self.clients[client]
+
+    def submit(self, target, conn, address):
+        """
+        Submit a connection to be serviced by a worker thread
+
+        If the connection is admitted, target is called with the connection
+        and address on a worker thread, as soon as one is free.  Otherwise,
+        the connection is closed
+
+        :param target: The function to service the connection
+        :type target: function
+        :param conn: The client socket
+        :type conn: socket.socket
+        :param address: The client address
+        :type address: tuple
+        :returns: True if the connection is admitted, otherwise False
+        :rtype: bool
+        """
+
+        if not self.admit(address):
+            logging.debug("Backend pool at capacity, rejected client {}".format(address))
+            conn.close()
+            return False
+
+        with self.cond:
+            self.pending.append((target, conn, address))
+
+            # Start another worker if all the others are busy
+            if self.nidle < len(self.pending) and (self.max_backends is None or self.nworkers < self.max_backends):
+                self.nworkers += 1
+                worker = threading.Thread(target=self.run_worker, daemon=True)
+                worker.start()
+            else:
+                self.cond.notify()
+
+        return True
+
+    def run_worker(self):
+        """
+        Run a worker thread
+
+        The worker services pending connections until none has been pending
+        for the worker linger time
+        """
+
+        while True:
+            with self.cond:
+                self.nidle += 1
+
+                # Waits for the whole linger time, even if woken for a
+                # connection that another worker has already taken
+                self.cond.wait_for(lambda: self.pending, timeout=self.worker_linger)
+                self.nidle -= 1
+
+                if not self.pending:
+                    self.nworkers -= 1
+                    return
+
+                target, conn, address = self.pending.popleft()
+
+            try:
+                target(conn, address)
+            except Exception as e:
+                logging.exception("Error detected running backend: {}".format(e))
+            finally:
+                self.release(address)
+
+    def get_stats(self):
+        """
+        Get a snapshot of the admission counters
+
+        The counters are the total number of admitted connections, how many
+        of those were queued for a backend, the number of rejected
+        connections, and the maximum number of concurrently admitted
+        connections
+
+        :returns: The admission counters
+        :rtype: dict
+        """
+
+        with self.cond:
+            stats = self.stats.copy()
+
+        return stats
@@ -14,6 +14,7 @@ This module contains the base class for fieldbus classes.  Fieldbus-specific cla
 import logging
 import socket
 import select
+import asyncio
 
 class BaseFieldbusModule(object):
     """
@@ -31,6 +32,9 @@ class BaseFieldbusModule(object):
         self.id = id
         self.conf = {}
         self.memory_manager = None
+        self.fleet = None
+        self.port = None
+        self.idle_timeout = None
         self.conn = None
 
     def get_id(self):
@@ -55,6 +59,17 @@ class BaseFieldbusModule(object):
         self.conf = conf
         self.memory_manager = memory_manager
 
+    def init_connection(self):
+        """
+        Initialise any per-connection state of this backend
+
+        This is called when a backend starts servicing a client, before any
+        requests are handled.  Fieldbus-specific classes can override this
+        to set up, for example, per-connection buffers
+        """
+
+        pass
+
     def service_client(self):
         """
         Service the client
@@ -65,9 +80,14 @@ class BaseFieldbusModule(object):
           then a single request is handled and the connection is closed.
           Otherwise, the connection is kept open and multiple requests are
           serviced until the client closes the connection.
+        * If the backend has an idle timeout, then the connection is closed
+          when the client doesn't send a request within that time, or stalls
+          for longer than that part way through a request.
         """
 
         try:
+            self.init_connection()
+
             if 'one_shot' in self.conf and self.conf['one_shot'] is True:
                 retval = self.handle_request()
             else:
@@ -76,6 +96,8 @@ class BaseFieldbusModule(object):
 
                     if retval != 0:
                         break
+        except socket.timeout:
+            logging.debug("Client idle for {} s, closing connection".format(self.idle_timeout))
         except Exception as e:
             logging.debug("Error detected servicing client: {}".format(e))
 
@@ -84,24 +106,74 @@ class BaseFieldbusModule(object):
         self.conn.shutdown(socket.SHUT_RDWR)
         self.conn.close()
 
-    def handle_request(self, timeout=60):
+    async def service_client_async(self, reader, writer):
+        """
+        Service the client over asyncio streams
+
+        This is the entry point for a new backend from the FieldbusManager
+        when the listener is running in asyncio mode.  It is the coroutine
+        equivalent of `service_client()`, and so honours the `one_shot`
+        configuration in the same way
+
+        :param reader: The stream to read requests from
+        :type reader: asyncio.StreamReader
+        :param writer: The stream to write responses to
+        :type writer: asyncio.StreamWriter
+        """
+
+        try:
+            self.init_connection()
+
+            if 'one_shot' in self.conf and self.conf['one_shot'] is True:
+                retval = await self.process_request_async(reader, writer)
+            else:
+                while True:
+                    retval = await self.process_request_async(reader, writer)
+
+                    if retval != 0:
+                        break
+        except asyncio.TimeoutError:
+            logging.debug("Client idle for {} s, closing connection".format(self.idle_timeout))
+        except Exception as e:
+            logging.debug("Error detected servicing client: {}".format(e))
+
+        # Ensure we close the socket
+        logging.debug("Closing backend")
+        writer.close()
+
+        try:
+            await writer.wait_closed()
+        except Exception:
+            pass
+
+    def handle_request(self, timeout=None):
         """
         Handle an incoming request
 
-        Wait until a client sends a request, then process it
+        Wait until a client sends a request, then process it.  If the backend
+        has an idle timeout, and no request is received within that time,
+        then this backend is done
 
-        :param timeout: Timeout for checking for an incoming request
-        :type timeout: int
+        :param timeout: Timeout for checking for an incoming request.  If
+        None, the backend's idle timeout is used
+        :type timeout: float
         :returns: Zero to continue to service requests or non-zero if done
         :rtype: int
         """
 
         retval = 0
+
+        if timeout is None:
+            timeout = self.idle_timeout
+
         rfds, wfds, efds = select.select([self.conn], [], [], timeout)
 
         if len(rfds) > 0:
             if self.conn in rfds:
                 retval = self.process_request()
+        elif self.idle_timeout is not None:
+            logging.debug("Client idle for {} s, closing connection".format(self.idle_timeout))
+            retval = 1
 
         return retval
 
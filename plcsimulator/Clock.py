@@ -0,0 +1,157 @@
+###############################################################################
+# Project: PLC Simulator
+# Purpose: Class to encapsulate the simulation clock
+# Author:  Paul M. Breen
+# Date:    2026-10-16
+###############################################################################
+
+"""
+PLC simulator clock module
+
+This module contains the clock class.  It manages:
+
+* The virtual time that the simulations are scheduled by, and that
+  time-based simulation values are calculated from.
+* Converting virtual time delays to real time delays.
+
+The clock mode is one of:
+
+* realtime: (Default) Virtual time advances at `speed` times real time.
+  With the default speed of 1, virtual time is real time.
+* step: Virtual time only advances when it is explicitly advanced, to the
+  time that the next simulation is due.  The simulations therefore run one
+  after the other as fast as possible, and, given seeded random simulations
+  and a single scheduler worker, are deterministic.
+"""
+
+import time
+
+class Clock(object):
+    """
+    Simulation clock for the PLC simulator
+    """
+
+    DEFAULTS = {
+        'modes': ['realtime', 'step'],
+        'mode': 'realtime',
+        'speed': 1.0
+    }
+
+    def __init__(self, mode='realtime', speed=1.0):
+        """
+        Constructor
+
+        :param mode: The clock mode, one of 'realtime' or 'step'
+        :type mode: str
+        :param speed: For the realtime mode, the factor by which virtual time
+        advances faster than real time
+        :type speed: float
+        """
+
+        if mode not in self.DEFAULTS['modes']:
+            raise ValueError("Unknown clock mode: {}".format(mode))
+
+        if speed <= 0:
+            raise ValueError("Clock speed must be greater than 0: {}".format(speed))
+
+        self.mode = mode
+        self.speed = float(speed)
+        self.stepping = mode == 'step'
+        self.origin = time.monotonic()
+        self.wall_origin = time.time()
+        self.virtual = self.origin
+
+        if self.stepping:
+            self.monotonic = self.get_stepped_time
+        elif self.speed == 1.0:
+            # Virtual time is real time, so avoid any overhead
+            self.monotonic = time.monotonic
+        else:
+            self.monotonic = self.get_scaled_time
+
+    def get_stepped_time(self):
+        """
+        Get the virtual time in the step mode
+
+        :returns: The virtual time (s)
+        :rtype: float
+        """
+
+        return self.virtual
+
+    def get_scaled_time(self):
+        """
+        Get the virtual time in the realtime mode with a speed factor
+
+        :returns: The virtual time (s)
+        :rtype: float
+        """
+
+        return self.origin + (time.monotonic() - self.origin) * self.speed
+
+    def elapsed(self):
+        """
+        Get the virtual time elapsed since the clock was created
+
+        :returns: The elapsed virtual time (s)
+        :rtype: float
+        """
+
+        return self.monotonic() - self.origin
+
+    def time(self):
+        """
+        Get the virtual wall clock time
+
+        This is the wall clock time when the clock was created, plus the
+        elapsed virtual time
+
+        :returns: The virtual time in seconds since the epoch
+        :rtype: float
+        """
+
+        return self.wall_origin + self.elapsed()
+
+    def to_real(self, delay):
+        """
+        Convert a virtual time delay to a real time delay
+
+        :param delay: The virtual time delay (s)
+        :type delay: float
+        :returns: The real time delay (s)
+        :rtype: float
+        """
+
+        return 0.0 if self.stepping else delay / self.speed
+
+    def advance(self, t):
+        """
+        Advance the virtual time in the step mode
+
+        The virtual time never goes backwards, and isn't affected in the
+        realtime mode
+
+        :param t: The virtual time to advance to
+        :type t: float
+        """
+
+        if t > self.virtual:
+            self.virtual = t
+
+    def sleep(self, delay):
+        """
+        Sleep for the given virtual time delay
+
+        In the step mode, the virtual time is advanced instead
+
+        :param delay: The virtual time delay (s)
+        :type delay: float
+        """
+
+        if delay <= 0:
+            return
+
+        if self.stepping:
+            self.advance(self.virtual + delay)
+        else:
+            time.sleep(delay / self.speed)
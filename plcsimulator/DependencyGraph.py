@@ -0,0 +1,364 @@
+###############################################################################
+# Project: PLC Simulator
+# Purpose: Class to encapsulate the dependencies between simulations
+# Author:  Paul M. Breen
+# Date:    2026-10-16
+###############################################################################
+
+"""
+PLC simulator dependency graph module
+
+This module contains the dependency graph class.  It manages:
+
+* Finding, for each simulation that reads its input from the memory space,
+  the simulations that write to that input.
+* Evaluating these dependent simulations, in topological order, as soon as
+  any simulation that they depend on has written changed data.
+* Detecting cycles of dependencies.
+
+A simulation is driven by the graph only if every memory space range that it
+reads is fully covered by the memory space ranges written by other
+simulations.  Otherwise, for example if some of its input is written by
+clients, it continues to be run periodically, but can still drive other
+simulations.
+"""
+
+import logging
+import bisect
+import threading
+
+def evaluate_dirty(downstream, dirty):
+    """
+    Evaluate the dirty nodes, in topological order
+
+    Each node that writes changed data makes its own dependents dirty.  An
+    error evaluating a node is logged, and the remaining dirty nodes are
+    still evaluated, so that a failing simulation can't stop the simulation
+    whose write is being propagated
+
+    :param downstream: The nodes that may need evaluating, in topological
+    order
+    :type downstream: list
+    :param dirty: The dirty nodes.  This is updated in place
+    :type dirty: set
+    """
+
+    for node in downstream:
+        if node in dirty:
+            try:
+                if node.evaluate():
+                    dirty.update(node.dependents)
+            except Exception as e:
+                logging.exception("Error detected evaluating simulation {}: {}".format(node.simulation.id, e))
+
+class DependencyNode(object):
+    """
+    A simulation in the dependency graph
+    """
+
+    def __init__(self, simulation, output, inputs):
+        """
+        Constructor
+
+        :param simulation: The simulation
+        :type simulation: plcsimulator.Simulation.Simulation
+        :param output: The memory space range that the simulation writes,
+        as a (section, addr, nrefs) tuple
+        :type output: tuple
+        :param inputs: The memory space ranges that the simulation reads,
+        as (section, addr, nrefs) tuples
+        :type inputs: list
+        """
+
+        self.simulation = simulation
+        self.output = output
+        self.inputs = inputs
+        self.driven = False
+        self.rank = 0
+        self.dependents = set()
+        self.downstream = []
+        self.last_data = None
+        self.lock = threading.Lock()
+        self.last_data_lock = threading.Lock()
+
+    def changed(self, data):
+        """
+        Record the data written by the simulation, and check if it changed
+
+        The simulation may be run by several scheduler workers, so the check
+        and the record are made atomically, and only one of any concurrent
+        writers of the same changed data sees it as changed
+
+        :param data: The data written by the simulation
+        :type data: bytes
+        :returns: True if the data differ from the previous data written
+        :rtype: bool
+        """
+
+        with self.last_data_lock:
+            if data == self.last_data:
+                return False
+
+            self.last_data = bytes(data)
+
+        return True
+
+    def evaluate(self):
+        """
+        Run a step of a driven simulation
+
+        :returns: True if the simulation wrote changed data
+        :rtype: bool
+        """
+
+        with self.lock:
+            data = self.simulation.generate()
+
+            if data is None:
+                return False
+
+            self.simulation.write(data)
+
+            return self.changed(data)
+
+    def propagate(self, data):
+        """
+        Evaluate the downstream simulations after this simulation has written
+
+        Only those downstream simulations that depend, directly or through
+        other simulations, on changed data are evaluated
+
+        :param data: The data written by the simulation
+        :type data: bytes
+        """
+
+        if self.changed(data):
+            evaluate_dirty(self.downstream, set(self.dependents))
+
+class DependencyGraph(object):
+    """
+    Dependency graph of the simulations for the PLC simulator
+    """
+
+    def __init__(self):
+        """
+        Constructor
+        """
+
+        self.nodes = []
+
+    def add(self, simulation, output, inputs):
+        """
+        Add a simulation to the graph
+
+        :param simulation: The simulation
+        :type simulation: plcsimulator.Simulation.Simulation
+        :param output: The memory space range that the simulation writes,
+        as a (section, addr, nrefs) tuple
+        :type output: tuple
+        :param inputs: The memory space ranges that the simulation reads,
+        as (section, addr, nrefs) tuples
+        :type inputs: list
+        :returns: The graph node for the simulation
+        :rtype: DependencyNode
+        """
+
+        node = DependencyNode(simulation, output, inputs)
+        self.nodes.append(node)
+
+        return node
+
+    def index_outputs(self):
+        """
+        Index the nodes by the memory space range that they write
+
+        :returns: For each section, the sorted range starts, the sorted
+        (start, end, node) entries, and the maximum range length
+        :rtype: dict
+        """
+
+        entries = {}
+        index = {}
+
+        for node in self.nodes:
+            section, addr, nrefs = node.output
+            entries.setdefault(section, []).append((addr, addr + nrefs, node))
+
+        for section, section_entries in entries.items():
+            section_entries.sort(key=lambda entry: entry[:2])
+            starts = [entry[0] for entry in section_entries]
+            max_span = max([entry[1] - entry[0] for entry in section_entries])
+            index[section] = (starts, section_entries, max_span)
+
+        return index
+
+    def find_producers(self, index, section, addr, nrefs):
+        """
+        Find the nodes that write to the given memory space range
+
+        :param index: The index from `index_outputs()`
+        :type index: dict
+        :param section: The memory space section
+        :type section: str
+        :param addr: The start address in the memory space section
+        :type addr: int
+        :param nrefs: The number of references offset from start address
+        :type nrefs: int
+        :returns: The (start, end, node) entries that overlap the range,
+        ordered by start
+        :rtype: list
+        """
+
+        if section not in index:
+            return []
+
+        starts, entries, max_span = index[section]
+        lo = bisect.bisect_right(starts, addr - max_span)
+        hi = bisect.bisect_left(starts, addr + nrefs)
+
+        return [entry for entry in entries[lo:hi] if entry[1] > addr]
+
+    def is_covered(self, producers, addr, nrefs):
+        """
+        Check if the producers' ranges fully cover the given range
+
+        :param producers: The (start, end, node) entries, ordered by start
+        :type producers: list
+        :param addr: The start address of the range
+        :type addr: int
+        :param nrefs: The number of references in the range
+        :type nrefs: int
+        :returns: True if every reference in the range is written
+        :rtype: bool
+        """
+
+        covered = addr
+
+        for start, end, node in producers:
+            if start > covered:
+                break
+
+            covered = max(covered, end)
+
+        return covered >= addr + nrefs
+
+    def build(self):
+        """
+        Build the graph from the nodes that have been added
+
+        Each node that has inputs fully covered by other nodes' outputs is
+        driven by the graph, and the nodes are ranked in topological order.
+        A node's own output doesn't cover its inputs
+
+        :raises: ValueError if the driven nodes contain a cycle
+        """
+
+        index = self.index_outputs()
+
+        for node in self.nodes:
+            # A simulation that reads its own output, such as an accumulator,
+            # isn't driven by its own writes
+            producers = [[entry for entry in self.find_producers(index, *input) if entry[2] is not node] for input in node.inputs]
+
+            if node.inputs and all([self.is_covered(entries, input[1], input[2]) for entries, input in zip(producers, node.inputs)]):
+                node.driven = True
+
+                for entries in producers:
+                    for start, end, producer in entries:
+                        producer.dependents.add(node)
+
+        self.rank_nodes()
+
+        for node in self.nodes:
+            node.downstream = self.find_downstream(node)
+
+    def rank_nodes(self):
+        """
+        Rank the nodes in topological order
+
+        :raises: ValueError if the nodes contain a cycle
+        """
+
+        nparents = {node: 0 for node in self.nodes}
+
+        for node in self.nodes:
+            for dependent in node.dependents:
+                nparents[dependent] += 1
+
+        ready = [node for node in self.nodes if nparents[node] == 0]
+        rank = 0
+
+        while ready:
+            node = ready.pop()
+            node.rank = rank
+            rank += 1
+
+            for dependent in node.dependents:
+                nparents[dependent] -= 1
+
+                if nparents[dependent] == 0:
+                    ready.append(dependent)
+
+        if rank < len(self.nodes):
+            ids = [node.simulation.id for node in self.nodes if nparents[node] > 0]
+            raise ValueError("Dependency cycle detected involving simulations: {}".format(', '.join(ids)))
+
+    def find_downstream(self, node):
+        """
+        Find all the nodes that depend on the given node, directly or not
+
+        :param node: The node
+        :type node: DependencyNode
+        :returns: The downstream nodes in topological order
+        :rtype: list
+        """
+
+        downstream = set()
+        stack = list(node.dependents)
+
+        while stack:
+            dependent = stack.pop()
+
+            if dependent not in downstream:
+                downstream.add(dependent)
+                stack.extend(dependent.dependents)
+
+        return sorted(downstream, key=lambda dependent: dependent.rank)
+
+    def propagate(self, changes):
+        """
+        Evaluate the downstream simulations after several simulations have written
+
+        This is as `DependencyNode.propagate()`, except that each downstream
+        simulation is evaluated at most once, however many of the
+        simulations that it depends on have written changed data
+
+        :param changes: The (node, data) pairs of the nodes that have written
+        and the data that they wrote
+        :type changes: list
+        """
+
+        dirty = set()
+        changed = []
+
+        for node, data in changes:
+            if node.changed(data):
+                dirty.update(node.dependents)
+                changed.append(node)
+
+        if len(changed) == 1:
+            downstream = changed[0].downstream
+        else:
+            downstream = sorted(set().union(*[node.downstream for node in changed]), key=lambda node: node.rank)
+
+        evaluate_dirty(downstream, dirty)
+
+    def get_driven(self):
+        """
+        Get the simulations that are driven by the graph
+
+        :returns: The driven simulations
+        :rtype: list
+        """
+
+        return [node.simulation for node in self.nodes if node.driven]
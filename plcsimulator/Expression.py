@@ -0,0 +1,157 @@
+###############################################################################
+# Project: PLC Simulator
+# Purpose: Class to encapsulate a compiled simulation expression
+# Author:  Paul M. Breen
+# Date:    2026-10-16
+###############################################################################
+
+"""
+PLC simulator expression module
+
+This module contains the expression class.  It manages:
+
+* Parsing an arithmetic and boolean expression over named operands, such as
+  `(a * 10 + b) >> 2`.
+* Validating that the expression only contains the permitted syntax.
+* Compiling the expression, once, into a function of its operands.
+
+The permitted syntax is:
+
+* Integer, float and boolean constants, and the names of operands.
+* The arithmetic operators `+`, `-`, `*`, `/`, `//`, `%` and `**`.
+* The bitwise operators `&`, `|`, `^`, `~`, `<<` and `>>`.
+* The comparison operators `==`, `!=`, `<`, `<=`, `>` and `>=`, and the
+  boolean operators `and`, `or` and `not`.
+* Conditional expressions, `x if condition else y`.
+* Calls of the functions `abs`, `min`, `max`, `int` and `round`.
+"""
+
+import ast
+import keyword
+
+class Expression(object):
+    """
+    Compiled expression for the PLC simulator
+    """
+
+    DEFAULTS = {
+        'nodes': (
+            ast.Expression, ast.Load, ast.Name, ast.Constant, ast.Call,
+            ast.BinOp, ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv,
+            ast.Mod, ast.Pow, ast.BitAnd, ast.BitOr, ast.BitXor, ast.LShift,
+            ast.RShift, ast.UnaryOp, ast.UAdd, ast.USub, ast.Invert, ast.Not,
+            ast.BoolOp, ast.And, ast.Or, ast.Compare, ast.Eq, ast.NotEq,
+            ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.IfExp
+        ),
+        'constants': (int, float, bool),
+        'functions': {'abs': abs, 'min': min, 'max': max, 'int': int, 'round': round}
+    }
+
+    def __init__(self, source, names, constants=None):
+        """
+        Constructor
+
+        :param source: The expression
+        :type source: str
+        :param names: The names of the operands that are passed to the
+        compiled function, in the order that they are passed
+        :type names: list
+        :param constants: Named constants that can be used in the expression
+        :type constants: dict
+        :raises: ValueError if the expression is invalid
+        """
+
+        constants = constants or {}
+
+        self.source = source
+        self.names = list(names)
+        self.constants = dict(constants)
+
+        self.validate_names()
+        self.tree = self.parse()
+        self.validate(self.tree)
+        self.evaluate = self.compile(self.tree)
+
+    def validate_names(self):
+        """
+        Validate the names of the operands and constants
+
+        :raises: ValueError if a name isn't a valid identifier, is a keyword,
+        is a function name, or is given more than once
+        """
+
+        names = self.names + list(self.constants)
+
+        for name in names:
+            if not isinstance(name, str) or not name.isidentifier() or keyword.iskeyword(name):
+                raise ValueError("Invalid expression operand name: {}".format(name))
+
+            if name in self.DEFAULTS['functions']:
+                raise ValueError("Expression operand name is a function name: {}".format(name))
+
+        if len(set(names)) != len(names):
+            raise ValueError("Duplicate expression operand names: {}".format(names))
+
+    def parse(self):
+        """
+        Parse the expression
+
+        :raises: ValueError if the expression has a syntax error
+        :returns: The expression's syntax tree
+        :rtype: ast.Expression
+        """
+
+        try:
+            tree = ast.parse(self.source, mode='eval')
+        except SyntaxError as e:
+            raise ValueError("Invalid expression syntax: {}: {}".format(self.source, e))
+
+        return tree
+
+    def validate(self, tree):
+        """
+        Validate that the syntax tree only contains the permitted syntax
+
+        :param tree: The expression's syntax tree
+        :type tree: ast.Expression
+        :raises: ValueError if the expression contains any syntax that isn't
+        permitted, or any unknown names
+        """
+
+        known_names = set(self.names) | set(self.constants)
+
+        for node in ast.walk(tree):
+            if not isinstance(node, self.DEFAULTS['nodes']):
+                raise ValueError("Expression syntax not permitted: {}: {}".format(self.source, type(node).__name__))
+
+            if isinstance(node, ast.Constant) and not isinstance(node.value, self.DEFAULTS['constants']):
+                raise ValueError("Expression constant not permitted: {}: {!r}".format(self.source, node.value))
+
+            if isinstance(node, ast.Call):
+                if not (isinstance(node.func, ast.Name) and node.func.id in self.DEFAULTS['functions']) or node.keywords:
+                    raise ValueError("Expression function call not permitted: {}".format(self.source))
+            elif isinstance(node, ast.Name) and node.id not in known_names and node.id not in self.DEFAULTS['functions']:
+                raise ValueError("Unknown expression operand: {}: {}".format(self.source, node.id))
+
+    def compile(self, tree):
+        """
+        Compile the expression into a function of its operands
+
+        The validated syntax tree is compiled as the body of a lambda, taking
+        the operands as positional arguments.  The constants and permitted
+        functions are the lambda's only globals
+
+        :param tree: The expression's syntax tree
+        :type tree: ast.Expression
+        :returns: The compiled function
+        :rtype: function
+        """
+
+        args = ast.arguments(posonlyargs=[], args=[ast.arg(arg=name, annotation=None) for name in self.names], vararg=None, kwonlyargs=[], kw_defaults=[], kwarg=None, defaults=[])
+        code = ast.Expression(body=ast.Lambda(args=args, body=tree.body))
+        ast.fix_missing_locations(code)
+        namespace = {'__builtins__': {}}
+        namespace.update(self.DEFAULTS['functions'])
+        namespace.update(self.constants)
+
+        return eval(compile(code, '<expression>', 'eval'), namespace)
@@ -11,7 +11,7 @@ PLC simulator fieldbus manager module
 This module contains the fieldbus manager class.  It manages:
 
 * Loading fieldbus-specific modules and instantiating the contained class.
-* Track the instantiated classes in a lookup table, identified by TCP port.
+* Track the instantiated classes in a lookup table, identified by TCP port.  A module can be mapped to a single port, or to a range of ports.
 * Create an instance of a PLC based on the fieldbus-specific class in response to an incomming connection.  The PLC instance then handles the fieldbus comms.
 """
 
@@ -25,7 +25,7 @@ class FieldbusManager(object):
     Fieldbus manager for the PLC simulator
     """
 
-    def __init__(self, modules=[], memory_manager=None):
+    def __init__(self, modules=[], memory_manager=None, fleet=None):
         """
         Constructor
 
@@ -33,10 +33,14 @@ class FieldbusManager(object):
         :type modules: list
         :param memory_manager: The instantiated memory_manager object
         :type memory_manager: plcsimulator.MemoryManager.MemoryManager
+        :param fleet: For a fleet of PLCs, the fleet that resolves the memory
+        space of each request, instead of the memory_manager
+        :type fleet: plcsimulator.Fleet.Fleet
         """
 
         self.modules = modules
         self.memory_manager = memory_manager
+        self.fleet = fleet
         self.modules_table = {}
 
     def init_modules(self):
@@ -50,8 +54,25 @@ class FieldbusManager(object):
             m = importlib.import_module(item['module'])
             c = getattr(m, item['class'])
             o = c(item['id'])
+            o.fleet = self.fleet
             o.init(conf=item['conf'], memory_manager=self.memory_manager)
-            self.modules_table.update({item['port']: o})
+
+            # A range of ports is given as an inclusive [first, last] list
+            if 'ports' in item:
+                first, last = item['ports']
+                self.modules_table.update({port: o for port in range(first, last + 1)})
+            else:
+                self.modules_table.update({item['port']: o})
+
+    def get_ports(self):
+        """
+        Get the ports that modules are mapped to
+
+        :returns: The ports, in ascending order
+        :rtype: list
+        """
+
+        return sorted(self.modules_table)
 
     def get_module_by_id(self, id):
         """
@@ -81,7 +102,7 @@ class FieldbusManager(object):
 
         return self.modules_table[port]
 
-    def create_new_backend(self, current_conn, address):
+    def create_new_backend(self, current_conn, address, idle_timeout=None):
         """
         Create a new backend to service the incoming client request
 
@@ -92,6 +113,9 @@ class FieldbusManager(object):
         :type current_conn: socket object
         :param address: The address bound to the client end of the connection
         :type address: address object
+        :param idle_timeout: The time (s) that the backend waits for a request
+        before closing the connection.  If None, it waits indefinitely
+        :type idle_timeout: float
         """
 
         logging.debug("New backend to service client on {}".format(address))
@@ -99,7 +123,41 @@ class FieldbusManager(object):
         # Get the listener port and map it to the corresponding fieldbus module
         port = current_conn.getsockname()[1]
 
+        # Bound every read, so a client that stalls part way through a
+        # request can't hold on to this backend
+        current_conn.settimeout(idle_timeout)
+
         plc = copy.copy(self.get_module_by_port(port))
         plc.conn = current_conn
+        plc.port = port
+        plc.idle_timeout = idle_timeout
         plc.service_client()
 
+    async def create_new_backend_async(self, reader, writer, idle_timeout=None):
+        """
+        Create a new backend to service the incoming client request
+
+        This is the coroutine equivalent of `create_new_backend()`, used
+        when the listener is running in asyncio mode.  The backend is run as
+        a task on the listener's event loop, rather than in its own thread
+
+        :param reader: The stream to read client requests from
+        :type reader: asyncio.StreamReader
+        :param writer: The stream to write responses to the client
+        :type writer: asyncio.StreamWriter
+        :param idle_timeout: The time (s) that the backend waits for a request
+        before closing the connection.  If None, it waits indefinitely
+        :type idle_timeout: float
+        """
+
+        address = writer.get_extra_info('peername')
+        logging.debug("New backend to service client on {}".format(address))
+
+        # Get the listener port and map it to the corresponding fieldbus module
+        port = writer.get_extra_info('sockname')[1]
+
+        plc = copy.copy(self.get_module_by_port(port))
+        plc.conn = writer.get_extra_info('socket')
+        plc.port = port
+        plc.idle_timeout = idle_timeout
+        await plc.service_client_async(reader, writer)
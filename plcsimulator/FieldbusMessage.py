@@ -106,7 +106,7 @@ class FieldbusMessage(object):
 
                 # Append this message fragment to the total message buffer
                 fragment = conn.recv(nbytes_left, flags)
-                self.buf += bytearray(fragment)
+                self.buf += fragment
 
                 if len(self.buf) >= nbytes:
                     break
@@ -0,0 +1,189 @@
+###############################################################################
+# Project: PLC Simulator
+# Purpose: Class to encapsulate a fleet of simulated PLCs
+# Author:  Paul M. Breen
+# Date:    2026-10-16
+###############################################################################
+
+"""
+PLC simulator fleet module
+
+This module contains the fleet class.  It manages:
+
+* A fleet of simulated PLCs in a single process, each with its own
+  independent memory space and simulations.
+* Addressing each PLC by the port that a client connects to, and by the
+  Modbus unit identifier of the request.
+* Creating each PLC's memory space and simulations only when the PLC is
+  first addressed.
+* Running the simulations of all the PLCs from a single scheduler.
+
+Each PLC has the memory space given by the `memory_manager` configuration,
+and runs the simulations given by the `io_manager` configuration.  The PLCs
+are addressed on each of the ports of the fieldbus modules.  If the fleet
+has `units`, then each port has a PLC for each unit identifier in that
+range, otherwise each port has a single PLC and the unit identifier is
+ignored.
+"""
+
+import copy
+import logging
+import threading
+
+from plcsimulator.Clock import Clock
+from plcsimulator.MemoryManager import MemoryManager
+from plcsimulator.IoManager import IoManager
+from plcsimulator.Scheduler import Scheduler
+from plcsimulator.WriteBatch import WriteBatch
+
+class Fleet(object):
+    """
+    Fleet of simulated PLCs for the PLC simulator
+    """
+
+    DEFAULTS = {
+        'units': None
+    }
+
+    def __init__(self, conf, memspace=None, io_conf=None):
+        """
+        Constructor
+
+        :param conf: The fleet configuration section
+        :type conf: dict
+        :param memspace: The memory space configuration of each PLC
+        :type memspace: dict
+        :param io_conf: The IO manager configuration of each PLC.  Its
+        `scheduler` and `clock` configure the scheduler shared by all PLCs
+        :type io_conf: dict
+        :raises: ValueError if the configuration is invalid
+        """
+
+        self.conf = conf
+        self.memspace = memspace or {}
+        self.io_conf = io_conf or {}
+        self.units = conf.get('units', self.DEFAULTS['units'])
+        self.plcs = {}
+        self.lock = threading.Lock()
+
+        if self.units is not None:
+            if len(self.units) != 2 or not 0 <= self.units[0] <= self.units[1] <= 255:
+                raise ValueError("Fleet units must be a [first, last] range of unit identifiers: {}".format(self.units))
+
+        self.scheduler, self.write_batch = self.init_scheduler()
+
+    def init_scheduler(self):
+        """
+        Construct the scheduler shared by all PLCs
+
+        The simulations are always run from a scheduler, whatever the IO
+        manager's scheduler mode, as a thread per simulation doesn't scale to
+        a fleet
+
+        :returns: The scheduler and its write batch, which is None if writes
+        aren't batched
+        :rtype: tuple
+        """
+
+        scheduler_conf = IoManager.DEFAULTS['scheduler'].copy()
+        scheduler_conf.update(self.io_conf.get('scheduler', {}))
+        clock_conf = IoManager.DEFAULTS['clock'].copy()
+        clock_conf.update(self.io_conf.get('clock', {}))
+        clock = Clock(mode=clock_conf['mode'], speed=clock_conf['speed'])
+        workers = scheduler_conf['workers']
+
+        if clock.stepping and workers != 1:
+            logging.warning('The step clock mode requires a single scheduler worker, so this will be used')
+            workers = 1
+
+        write_batch = WriteBatch() if scheduler_conf['batch_writes'] else None
+        scheduler = Scheduler(workers=workers, clock=clock, context=write_batch)
+
+        return scheduler, write_batch
+
+    def start(self):
+        """
+        Start running the simulations of the PLCs
+        """
+
+        self.scheduler.start()
+
+    def stop(self):
+        """
+        Stop running the simulations of the PLCs
+        """
+
+        self.scheduler.stop()
+
+    def get_memory_manager(self, port, unit):
+        """
+        Get the memory manager of the PLC with the given address
+
+        If the PLC hasn't been addressed before, its memory space and
+        simulations are created
+
+        :param port: The port that the client connected to
+        :type port: int
+        :param unit: The unit identifier of the request
+        :type unit: int
+        :returns: The memory manager, or None if there is no PLC with the
+        given address
+        :rtype: plcsimulator.MemoryManager.MemoryManager
+        """
+
+        if self.units is None:
+            key = (port, None)
+        elif self.units[0] <= unit <= self.units[1]:
+            key = (port, unit)
+        else:
+            return None
+
+        plc = self.plcs.get(key)
+
+        if plc is None:
+            with self.lock:
+                plc = self.plcs.get(key)
+
+                if plc is None:
+                    plc = self.create_plc(*key)
+                    self.plcs[key] = plc
+
+        return plc[0]
+
+    def create_plc(self, port, unit):
+        """
+        Create the memory space and simulations of a PLC
+
+        :param port: The port of the PLC
+        :type port: int
+        :param unit: The unit identifier of the PLC, or None if unit
+        identifiers are ignored
+        :type unit: int
+        :returns: The PLC's memory manager and IO manager
+        :rtype: tuple
+        """
+
+        logging.info("Creating fleet PLC: port {}, unit {}".format(port, unit))
+
+        memory_manager = MemoryManager(**self.memspace)
+
+        # Each PLC's simulations are compiled from their own copy of the
+        # configuration
+        io_manager = IoManager(copy.deepcopy(self.io_conf), memory_manager=memory_manager, scheduler=self.scheduler, write_batch=self.write_batch)
+        io_manager.init_io()
+
+        return memory_manager, io_manager
+
+    def get_plcs(self):
+        """
+        Get the PLCs that have been created
+
+        :returns: The memory manager and IO manager of each PLC, keyed by the
+        PLC's (port, unit) address
+        :rtype: dict
+        """
+
+        with self.lock:
+            plcs = dict(self.plcs)
+
+        return plcs
@@ -12,14 +12,59 @@ This module contains the IO manager class.  It manages:
 
 * Initialising each IO simulation specified in the configuration.
 * Running each IO simulation according to its parameters.
+
+The simulations can be run in one of two scheduler modes, as given by the
+`scheduler` setting in the configuration:
+
+* thread: (Default) Each simulation is run in its own thread.
+* heap: All simulations are run from a fixed number of worker threads.  Each
+  worker keeps its simulations in a heap keyed on when each is next due to
+  run.  This scales to many thousands of simulations.  By default, the
+  memory space writes of all the simulations that a worker runs in a single
+  pass are batched, and applied with a single lock acquisition per memory
+  space section.  See `plcsimulator.WriteBatch`.
+
+In either mode, a simulation's `timing` determines how its `pause` is
+applied.  See `plcsimulator.SimulationTimer`.  The timing of each simulation
+is recorded, and can be retrieved with `get_simulation_stats()`.
+
+Simulations of a function that depends only on time can instead be
+evaluated lazily, as given by the simulation's `evaluation` setting.  A lazy
+simulation isn't run at all.  Its value is calculated when its memory space
+is read.  See `init_lazy_simulation()`.
+
+If `dependencies` is enabled in the configuration, simulations that read
+their input from the memory space (such as `copy`, `transform`, `operation`
+and `expression`) are evaluated as soon as the simulations that write that
+input have written changed data, rather than being run periodically.  See
+`plcsimulator.DependencyGraph`.
+
+All simulations are timed by the IO manager's clock, which can run faster
+than real time, or step from one simulation to the next as fast as
+possible.  See `plcsimulator.Clock`.
 """
 
 import logging
 import threading
-import time
 import math
 import random
 import operator
+import struct
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from plcsimulator.Clock import Clock
+from plcsimulator.Scheduler import Scheduler
+from plcsimulator.WriteBatch import WriteBatch
+from plcsimulator.SimulationTimer import SimulationTimer
+from plcsimulator.Simulation import Simulation
+from plcsimulator.DependencyGraph import DependencyGraph
+from plcsimulator.Expression import Expression
+from plcsimulator.TransformIndex import TransformIndex
+from plcsimulator.Recording import Recording
 
 BITS_PER_BYTE = 8
 
@@ -30,9 +75,34 @@ class IoManager(object):
 
     DEFAULTS = {
         'byteorder': 'big',
+        'scheduler': {
+            'modes': ['thread','heap'],
+            'mode': 'thread',
+            'workers': 1,
+            'batch_writes': True
+        },
+        'timing': {
+            'mode': 'pause',
+            'overrun': 'skip'
+        },
+        'clock': {
+            'mode': 'realtime',
+            'speed': 1.0
+        },
+        'dependencies': False,
+        'evaluation': {
+            'modes': ['eager','lazy'],
+            'mode': 'eager',
+            'types': ['counter','binary','static','sin','sine','cos','cosine','sawtooth','square']
+        },
         'wave': {
             'types': ['sin','sine','cos','cosine','sawtooth','square'],
-            'resolution': 1e3
+            'shapes': {'sin': 'sine', 'sine': 'sine', 'cos': 'cosine', 'cosine': 'cosine', 'sawtooth': 'sawtooth', 'square': 'square'},
+            'resolution': 1e3,
+            'amplitude': None,    # N.B.: None defaults to the resolution
+            'offset': None,       # N.B.: None defaults to the resolution
+            'phase': 0.0,
+            'period': None        # N.B.: None steps through the table once per run
         },
         'range': {                # N.B.: stop is calculated from word length
             'types': ['counter','randrange'],
@@ -42,12 +112,37 @@ class IoManager(object):
         'random': {
             'types': ['randrange','lognormal','uniform'],
             'resolution': 1e3,
+            'seed': None,
+            'block': 0,
             'lognormal': {'mu': 0, 'sigma': 1},
             'uniform': {'a': 0, 'b': 1}
-        }
+        },
+        'batch': {
+            'waveforms': ['sine','cosine','sawtooth','square'],
+            'waveform': 'sine',
+            'steps': 2000,
+            'phase': 0.0,
+            'phase_step': 0.0,
+            'scale': 1000,
+            'offset': 1000
+        },
+        'replay': {
+            'speed': 1.0,
+            'loop': False
+        },
+        'clock_function': {
+            'epochs': ['start','unix'],
+            'epoch': 'start',
+            'resolution': 1
+        },
+        'struct_codes': {2: 'H', 4: 'I', 8: 'Q'}
     }
 
-    def __init__(self, conf, memory_manager=None):
+    # Wave tables are shared by all simulations.  See `get_wave_table()`
+    wave_tables = {}
+    wave_tables_lock = threading.Lock()
+
+    def __init__(self, conf, memory_manager=None, scheduler=None, write_batch=None):
         """
         Constructor
 
@@ -55,26 +150,239 @@ class IoManager(object):
         :type conf: dict
         :param memory_manager: The instantiated memory_manager object
         :type memory_manager: plcsimulator.MemoryManager.MemoryManager
+        :param scheduler: A scheduler, shared with other IO managers, to run
+        the simulations from.  It is started by its owner, and its clock is
+        used.  If None, the IO manager creates its own scheduler, according
+        to its `scheduler` configuration
+        :type scheduler: plcsimulator.Scheduler.Scheduler
+        :param write_batch: For a shared scheduler, the write batch that is
+        its context, if any
+        :type write_batch: plcsimulator.WriteBatch.WriteBatch
         """
 
         self.conf = conf
         self.memory_manager = memory_manager
-
-    def init_io(self):
+        self.scheduler = scheduler
+        self.shared_scheduler = scheduler is not None
+        self.timers = {}
+        self.graph = None
+        self.clock = scheduler.clock if scheduler else self.define_clock()
+        self.write_batch = write_batch
+
+        # The lazy simulations are evaluated from this epoch, which is taken
+        # before any listener workers are forked, so that every process
+        # sharing the memory space calculates the same values
+        self.epoch = self.clock.monotonic()
+
+    def init_io(self, eager=True):
         """
         Initialise the IO simulations from the configuration
+
+        :param eager: If False, only the lazy simulations are initialised.
+        This is for a process, such as a listener worker, that shares the
+        memory space with the process that runs the other simulations
+        :type eager: bool
+        :raises: ValueError if the configuration is invalid
         """
 
+        if not eager:
+            for conf in self.conf['simulations']:
+                if conf.get('evaluation', self.DEFAULTS['evaluation']['mode']) == 'lazy':
+                    self.define_id(conf)
+                    self.init_lazy_simulation(conf)
+
+            return
+
+        if not self.shared_scheduler:
+            self.init_scheduler()
+
+        confs = []
+        nlazy = 0
+
         for conf in self.conf['simulations']:
             id = self.define_id(conf)
             logging.info('Starting simulation {}'.format(id))
+            evaluation = conf.get('evaluation', self.DEFAULTS['evaluation']['mode'])
+
+            if evaluation not in self.DEFAULTS['evaluation']['modes']:
+                raise ValueError("Unknown simulation evaluation mode: {}".format(evaluation))
 
-            # N.B.: args expects a tuple, hence the trailing comma.  Setting
-            # the thread's daemon status to True, ensures that the thread will
-            # terminate when the application main thread is terminated
-            simulation = threading.Thread(target=self.run_simulation, args=(conf,))
-            simulation.daemon = True
-            simulation.start()
+            if evaluation == 'lazy':
+                self.init_lazy_simulation(conf)
+                nlazy += 1
+            else:
+                confs.append(conf)
+
+        if self.conf.get('dependencies', self.DEFAULTS['dependencies']):
+            for simulation in self.init_dependency_graph(confs):
+                self.start_simulation(simulation.conf, simulation=simulation)
+        else:
+            for conf in confs:
+                self.start_simulation(conf)
+
+        # The step clock only advances to the time that the next periodic
+        # simulation is due
+        if self.clock.stepping and nlazy > 0 and not self.timers:
+            raise ValueError('The step clock mode requires at least one periodically run simulation, otherwise the lazy simulations never change')
+
+        # A periodic simulation without a pause is always due, so the step
+        # clock would never advance past it
+        if self.clock.stepping:
+            for id, timer in self.timers.items():
+                if timer.period <= 0:
+                    raise ValueError("The step clock mode requires each periodically run simulation to have a pause greater than 0: {}".format(id))
+
+        if self.scheduler and not self.shared_scheduler:
+            self.scheduler.start()
+
+    def init_scheduler(self):
+        """
+        Construct the scheduler from the IO manager's `scheduler` configuration
+
+        In the thread scheduler mode, there is no scheduler, as each
+        simulation runs in its own thread
+        """
+
+        scheduler_conf = self.DEFAULTS['scheduler'].copy()
+        scheduler_conf.update(self.conf.get('scheduler', {}))
+
+        if scheduler_conf['mode'] not in scheduler_conf['modes']:
+            raise ValueError("Unknown scheduler mode: {}".format(scheduler_conf['mode']))
+
+        # Stepping through the simulations one after the other requires them
+        # all to be run from a single worker
+        if self.clock.stepping and (scheduler_conf['mode'] != 'heap' or scheduler_conf['workers'] != 1):
+            logging.warning('The step clock mode requires the heap scheduler mode with a single worker, so these will be used')
+            scheduler_conf.update({'mode': 'heap', 'workers': 1})
+
+        if scheduler_conf['mode'] == 'heap':
+            if scheduler_conf['batch_writes']:
+                self.write_batch = WriteBatch(self.memory_manager)
+
+            self.scheduler = Scheduler(workers=scheduler_conf['workers'], clock=self.clock, context=self.write_batch)
+
+    def start_simulation(self, conf, simulation=None):
+        """
+        Start running the simulation, according to the scheduler mode
+
+        :param conf: The simulation configuration
+        :type conf: dict
+        :param simulation: The compiled simulation.  If None, the simulation
+        is compiled from its configuration
+        :type simulation: plcsimulator.Simulation.Simulation
+        """
+
+        if self.scheduler:
+            self.schedule_simulation(conf, simulation=simulation)
+        else:
+            # N.B.: Setting the thread's daemon status to True, ensures that
+            # the thread will terminate when the application main thread is
+            # terminated
+            thread = threading.Thread(target=self.run_simulation, args=(conf, simulation))
+            thread.daemon = True
+            thread.start()
+
+    def init_dependency_graph(self, confs):
+        """
+        Compile the simulations and build their dependency graph
+
+        The simulations that are driven by the graph aren't run periodically,
+        so they have no timer
+
+        :param confs: The simulation configurations
+        :type confs: list
+        :raises: ValueError if there is a cycle of dependencies
+        :returns: The simulations that must be run periodically
+        :rtype: list
+        """
+
+        self.graph = DependencyGraph()
+        nodes = []
+
+        for conf in confs:
+            simulation = self.init_simulation(conf)
+            output = self.get_memspace_conf_range(conf['memspace'])
+            inputs = [self.get_memspace_conf_range(memconf) for memconf in self.get_simulation_inputs(conf)]
+            nodes.append(self.graph.add(simulation, output, inputs))
+
+        self.graph.build()
+
+        for node in nodes:
+            if node.dependents:
+                if self.write_batch:
+                    # Dependent simulations must read the data once written,
+                    # and are evaluated once for all the changes in a pass
+                    node.simulation.propagate = self.make_batched_propagate(node)
+                else:
+                    node.simulation.propagate = node.propagate
+
+            if node.driven:
+                logging.info('Simulation {} is driven by its dependencies'.format(node.simulation.id))
+                self.timers.pop(node.simulation.id, None)
+                node.simulation.timer = None
+
+        return [node.simulation for node in nodes if not node.driven]
+
+    def make_batched_propagate(self, node):
+        """
+        Make a function to propagate a simulation's data after a batch of writes
+
+        :param node: The simulation's dependency graph node
+        :type node: plcsimulator.DependencyGraph.DependencyNode
+        :returns: A function that takes the data as its only argument
+        :rtype: function
+        """
+
+        collect = self.write_batch.collect
+        propagate = self.graph.propagate
+
+        def batched_propagate(data):
+            collect(propagate, (node, data))
+
+        return batched_propagate
+
+    def get_simulation_inputs(self, conf):
+        """
+        Get the memory spaces that the simulation reads as its input
+
+        :param conf: The simulation configuration
+        :type conf: dict
+        :returns: The memspace configurations
+        :rtype: list
+        """
+
+        inputs = []
+
+        if 'memspace' in conf.get('source', {}):
+            inputs.append(conf['source']['memspace'])
+
+        operands = conf.get('operands', [])
+
+        # Expression operands are named
+        if isinstance(operands, dict):
+            operands = operands.values()
+
+        for operand in operands:
+            # Get the operand definition from any optional source object
+            if 'source' in operand:
+                operand = operand['source']
+
+            if 'memspace' in operand:
+                inputs.append(operand['memspace'])
+
+        return inputs
+
+    def get_memspace_conf_range(self, conf):
+        """
+        Get the address range from the given memory space conf
+
+        :param conf: The memspace configuration
+        :type conf: dict
+        :returns: The section, start address and number of references
+        :rtype: tuple
+        """
+
+        return conf['section'], conf['addr'], self.get_memspace_conf_nrefs(conf)
 
     def define_id(self, conf):
         """
@@ -144,6 +452,53 @@ class IoManager(object):
 
         return range_params
 
+    def define_clock(self):
+        """
+        Construct the clock from the IO manager's `clock` configuration
+
+        :returns: The clock
+        :rtype: plcsimulator.Clock.Clock
+        """
+
+        clock_conf = self.DEFAULTS['clock'].copy()
+        clock_conf.update(self.conf.get('clock', {}))
+
+        return Clock(mode=clock_conf['mode'], speed=clock_conf['speed'])
+
+    def define_timer(self, conf):
+        """
+        Construct the timer for the simulation
+
+        The timing parameters are taken from the simulation's `timing`
+        configuration, falling back to the IO manager's `timing`
+        configuration, and then to the defaults
+
+        :param conf: The simulation configuration
+        :type conf: dict
+        :returns: The simulation timer
+        :rtype: plcsimulator.SimulationTimer.SimulationTimer
+        """
+
+        timing = self.DEFAULTS['timing'].copy()
+        timing.update(self.conf.get('timing', {}))
+        timing.update(conf.get('timing', {}))
+
+        timer = SimulationTimer(period=conf.get('pause', 0), mode=timing['mode'], overrun=timing['overrun'])
+        self.timers[conf['id']] = timer
+
+        return timer
+
+    def get_simulation_stats(self):
+        """
+        Get the timing statistics of each simulation
+
+        :returns: The timing statistics, keyed by simulation ID.  See
+        `plcsimulator.SimulationTimer.SimulationTimer.get_stats()`
+        :rtype: dict
+        """
+
+        return {id: timer.get_stats() for id, timer in self.timers.items()}
+
     def define_parameter(self, name, conf, default):
         """
         Get a parameter of the simulation function or a default if not present
@@ -225,7 +580,7 @@ class IoManager(object):
 
         return nrefs
 
-    def run_simulation(self, conf):
+    def run_simulation(self, conf, simulation=None):
         """
         Run the simulation according to its configuration
 
@@ -233,46 +588,60 @@ class IoManager(object):
 
         :param conf: The simulation configuration
         :type conf: dict
+        :param simulation: The compiled simulation.  If None, the simulation
+        is compiled from its configuration
+        :type simulation: plcsimulator.Simulation.Simulation
         """
 
-        sources = {
-            'counter': 0
-        }
+        if simulation is None:
+            simulation = self.init_simulation(conf)
 
-        self.init_simulation(conf, sources)
+        timer = simulation.timer
+        clock = self.clock
+        due = clock.monotonic()
 
         while True:
-            data = self.simulate_data(conf, sources)
+            started = clock.monotonic()
+            simulation.step()
+            due = timer.complete(due, started, clock.monotonic())
+            clock.sleep(due - clock.monotonic())
 
-            if data is not None:
-                self.set_memspace(conf['memspace'], data)
+    def schedule_simulation(self, conf, simulation=None):
+        """
+        Add the simulation to the scheduler according to its configuration
 
-            try:
-                time.sleep(conf['pause'])
-            except KeyError:
-                pass
+        The simulation is run as a scheduler task.  As for a simulation
+        running in its own thread, the simulation's timer determines when the
+        task is next due to run
 
-    def init_simulation(self, conf, sources):
+        :param conf: The simulation configuration
+        :type conf: dict
+        :param simulation: The compiled simulation.  If None, the simulation
+        is compiled from its configuration
+        :type simulation: plcsimulator.Simulation.Simulation
+        """
+
+        if simulation is None:
+            simulation = self.init_simulation(conf)
+
+        self.scheduler.add(simulation.run)
+
+    def init_simulation(self, conf):
         """
         Initialise the simulation according to its configuration
 
+        Once the configuration has been fully specified, the simulation is
+        compiled.  See `compile_simulation()`
+
         :param conf: The simulation configuration
         :type conf: dict
-        :param sources: Seeds for the simulation values
-        :type sources: dict
+        :returns: The compiled simulation
+        :rtype: plcsimulator.Simulation.Simulation
         """
 
-        # If constrained to a range, ensure the range is fully specified and
-        # that the sources are suitably initialised
+        # If constrained to a range, ensure the range is fully specified
         if conf['function']['type'] in self.DEFAULTS['range']['types']:
             self.define_range(conf)
-            sources['counter'] = conf['function']['range'][0]
-
-        if conf['function']['type'] in self.DEFAULTS['random']['types']:
-            try:
-                random.seed(a=conf['function']['seed'])
-            except KeyError:
-                pass
 
         # Fallback to default parameters if not specified in configuration
         if conf['function']['type'] == 'lognormal':
@@ -282,172 +651,666 @@ class IoManager(object):
             conf['function']['a'] = self.define_parameter('a', conf['function'], self.DEFAULTS['random']['uniform'])
             conf['function']['b'] = self.define_parameter('b', conf['function'], self.DEFAULTS['random']['uniform'])
 
-    def simulate_data(self, conf, sources):
+        return self.compile_simulation(conf)
+
+    def init_lazy_simulation(self, conf):
         """
-        Generate data for the simulation according to its configuration
+        Initialise the simulation to be evaluated lazily
+
+        A lazy simulation isn't run periodically.  Instead, a read hook is
+        added to the memory manager for its memory space.  When any read
+        overlaps the memory space, the simulation's value is calculated from
+        the number of runs that it would have made since the IO manager's
+        epoch (the elapsed time divided by its `pause`), and written to the
+        memory space if it has changed.  A simulation that isn't read costs
+        nothing.
+
+        Only simulations of a function that depends on time alone can be
+        evaluated lazily.  See `compile_lazy()`
 
         :param conf: The simulation configuration
         :type conf: dict
-        :param sources: The simulation value sources (counters)
-        :type sources: dict
-        :returns: The simulation data values or None if the simulation didn't
-        generate any data
-        :rtype: bytearray or None
+        :returns: The simulation
+        :rtype: plcsimulator.Simulation.Simulation
         """
 
-        data = bytearray(0)
+        ftype = conf['function']['type']
+        pause = conf.get('pause', 0)
+
+        if ftype not in self.DEFAULTS['evaluation']['types']:
+            raise ValueError("Simulation function type can't be evaluated lazily: {}".format(ftype))
+
+        if pause <= 0:
+            raise ValueError("Lazy simulations require a pause greater than 0: {}".format(pause))
+
+        if ftype in self.DEFAULTS['range']['types']:
+            self.define_range(conf)
+
+        value_at = self.compile_lazy(conf)
+        monotonic = self.clock.monotonic
+        started = self.epoch
+        last_run = None
+        lock = threading.Lock()
+
+        def generate():
+            nonlocal last_run
+            run = int((monotonic() - started) // pause)
+
+            if run == last_run:
+                return None
+
+            last_run = run
+
+            return value_at(run)
+
+        # The value must be in the memory space before the read that
+        # materialised it, which may be by a simulation in a batched pass
+        simulation = Simulation(conf['id'], conf, generate, self.make_memspace_writer(conf['memspace'], batched=False), clock=self.clock)
+
+        def materialise():
+            # Serialise concurrent reads, so an older value can't overwrite
+            # a newer one
+            with lock:
+                simulation.step()
+
+        materialise()
+        memconf = conf['memspace']
+        self.memory_manager.add_read_hook(memconf['section'], memconf['addr'], self.get_memspace_conf_nrefs(memconf), materialise)
+
+        return simulation
+
+    def compile_lazy(self, conf):
+        """
+        Compile a lazily evaluated simulation function
+
+        The function is in closed form.  It gives the same data as the
+        corresponding compiled simulation function, after the given number
+        of runs
+
+        :param conf: The simulation configuration
+        :type conf: dict
+        :returns: A function that takes the number of runs and returns the
+        simulation data
+        :rtype: function
+        """
+
+        nrefs, wlen = self.get_memspace_conf_layout(conf)
+        byteorder = self.DEFAULTS['byteorder']
+        ftype = conf['function']['type']
+
+        if ftype == 'counter':
+            values = range(*conf['function']['range'])
+
+            # As for a compiled counter, an empty range stays at its start
+            if len(values) == 0:
+                values = [values.start]
+
+            nvalues = len(values)
+
+            def value_at(run):
+                return values[run % nvalues].to_bytes(wlen, byteorder) * nrefs
+        elif ftype == 'binary':
+            states = (self.value_to_bytes(0, nrefs, wlen), self.value_to_bytes(1, nrefs, wlen))
+
+            def value_at(run):
+                return states[run & 1]
+        elif ftype == 'static':
+            data = self.value_to_bytes(int(conf['function']['value']), nrefs, wlen)
+
+            def value_at(run):
+                return data
+        else:
+            table, index, advance = self.define_wave(conf)
+            nsteps = len(table)
+
+            def value_at(run):
+                return table[int((index + run * advance) % nsteps)]
+
+        return value_at
+
+    def compile_simulation(self, conf):
+        """
+        Compile the simulation from its fully-specified configuration
+
+        The simulation function is compiled into a function that generates
+        the simulation data, with everything that can be resolved from the
+        configuration already resolved.  Running a step of the simulation is
+        then a call to this function and a call to write its data to the
+        memory space, with no further lookups in the configuration
+
+        :param conf: The simulation configuration
+        :type conf: dict
+        :returns: The compiled simulation
+        :rtype: plcsimulator.Simulation.Simulation
+        """
+
+        ftype = conf['function']['type']
+
+        if ftype == 'counter':
+            generate = self.compile_counter(conf)
+        elif ftype == 'binary':
+            generate = self.compile_binary(conf)
+        elif ftype == 'static':
+            generate = self.compile_static(conf)
+        elif ftype in self.DEFAULTS['wave']['types']:
+            generate = self.compile_wave(conf)
+        elif ftype in self.DEFAULTS['random']['types']:
+            generate = self.compile_random(conf)
+        elif ftype == 'copy':
+            generate = self.make_memspace_reader(conf['source']['memspace'])
+        elif ftype == 'transform':
+            generate = self.compile_transform(conf)
+        elif ftype == 'operation':
+            generate = self.compile_operation(conf)
+        elif ftype == 'expression':
+            generate = self.compile_expression(conf)
+        elif ftype == 'batch':
+            generate = self.compile_batch(conf)
+        elif ftype == 'replay':
+            generate = self.compile_replay(conf)
+        elif ftype == 'clock':
+            generate = self.compile_clock(conf)
+        else:
+            raise ValueError("Unknown simulation function type: {}".format(ftype))
+
+        write = self.make_memspace_writer(conf['memspace'])
+        timer = self.define_timer(conf)
+
+        return Simulation(conf['id'], conf, generate, write, timer=timer, clock=self.clock)
+
+    def make_memspace_reader(self, conf):
+        """
+        Make a function to get data from the memory space defined in the conf
+
+        :param conf: The memspace configuration
+        :type conf: dict
+        :returns: A function that takes no arguments and returns the data
+        :rtype: function
+        """
+
+        section = conf['section']
+        addr = conf['addr']
+        nrefs = self.get_memspace_conf_nrefs(conf)
+
+        if section == 'bits':
+            get = self.memory_manager.get_bits
+        else:
+            get = self.memory_manager.get_data
+
+        def read():
+            return get(section, addr, nrefs)
+
+        return read
+
+    def make_memspace_writer(self, conf, batched=True):
+        """
+        Make a function to set data in the memory space defined in the conf
+
+        If the writes are batched, the function adds the data to the current
+        batch
+
+        :param conf: The memspace configuration
+        :type conf: dict
+        :param batched: If False, the data are always set immediately, even
+        if the writes are batched
+        :type batched: bool
+        :returns: A function that takes the data as its only argument
+        :rtype: function
+        """
+
+        section = conf['section']
+        addr = conf['addr']
+        nrefs = self.get_memspace_conf_nrefs(conf)
+
+        if batched and self.write_batch:
+            batch_write = self.write_batch.write
+            memory_manager = self.memory_manager
+
+            def write(data):
+                batch_write(section, addr, nrefs, data, memory_manager)
+
+            return write
+
+        if section == 'bits':
+            set_data = self.memory_manager.set_bits
+        else:
+            set_data = self.memory_manager.set_data
+
+        def write(data):
+            set_data(section, addr, nrefs, data)
+
+        return write
+
+    def make_value_reader(self, conf):
+        """
+        Make a function to get a value from the memory space defined in the conf
+
+        :param conf: The memspace configuration
+        :type conf: dict
+        :returns: A function that takes no arguments and returns the data
+        as a single integer value
+        :rtype: function
+        """
+
+        read = self.make_memspace_reader(conf)
+        byteorder = self.DEFAULTS['byteorder']
+        from_bytes = int.from_bytes
+
+        def read_value():
+            return from_bytes(read(), byteorder)
+
+        return read_value
+
+    def make_values_reader(self, confs):
+        """
+        Make a function to get a value from each memory space defined in confs
+
+        If there is more than one memory space, the values are got in a
+        single transaction, so that they are a consistent snapshot
+
+        :param confs: The memspace configurations
+        :type confs: list
+        :returns: A function that takes no arguments and returns a list of
+        the data as integer values, in the order of confs
+        :rtype: function
+        """
+
+        if len(confs) < 2:
+            readers = [self.make_value_reader(conf) for conf in confs]
+
+            def read_values():
+                return [read() for read in readers]
+
+            return read_values
+
+        tx = self.memory_manager.transaction()
+        byteorder = self.DEFAULTS['byteorder']
+        from_bytes = int.from_bytes
+
+        for conf in confs:
+            section = conf['section']
+            nrefs = self.get_memspace_conf_nrefs(conf)
+
+            if section == 'bits':
+                tx.get_bits(section, conf['addr'], nrefs)
+            else:
+                tx.get_data(section, conf['addr'], nrefs)
+
+        def read_values():
+            return [from_bytes(data, byteorder) for data in tx.commit()]
+
+        return read_values
+
+    def get_memspace_conf_layout(self, conf):
+        """
+        Get the number of references and word length of a simulation's memspace
+
+        :param conf: The simulation configuration
+        :type conf: dict
+        :returns: The number of references and word length in bytes
+        :rtype: tuple of ints
+        """
 
         wlen = self.memory_manager.get_section_word_len(conf['memspace']['section'])
         nrefs = self.get_memspace_conf_nrefs(conf['memspace'])
 
-        if conf['function']['type'] == 'counter':
-            value = sources['counter']
-            sources['counter'] = self.get_next_range_value(conf['function']['range'], value)
-            data = self.value_to_bytes(value, nrefs, wlen)
-        elif conf['function']['type'] == 'binary':
-            value = sources['counter']
-            sources['counter'] = (value + 1) % 2
-            data = self.value_to_bytes(value, nrefs, wlen)
-        elif conf['function']['type'] == 'static':
-            value = int(conf['function']['value'])
-            data = self.value_to_bytes(value, nrefs, wlen)
-        elif conf['function']['type'] in self.DEFAULTS['wave']['types']:
-            res = int(self.DEFAULTS['wave']['resolution'])
-            value = sources['counter']
-            sources['counter'] = (value + 1) % (2 * res + 1)
-
-            if conf['function']['type'] in ['sin','sine']:
-                y = int(math.sin((value / res) * math.pi) * res + res)
-            elif conf['function']['type'] in ['cos','cosine']:
-                y = int(math.cos((value / res) * math.pi) * res + res)
-            elif conf['function']['type'] == 'sawtooth':
-                y = value
-            elif conf['function']['type'] == 'square':
-                w = math.sin((value / res) * math.pi)
-                y = res if w < 0.0 else 2 * res
-
-            data = self.value_to_bytes(y, nrefs, wlen)
-        elif conf['function']['type'] == 'randrange':
-            value = random.randrange(*conf['function']['range'])
-            data = self.value_to_bytes(value, nrefs, wlen)
-        elif conf['function']['type'] in self.DEFAULTS['random']['types']:
-            res = int(self.DEFAULTS['random']['resolution'])
-
-            if conf['function']['type'] == 'lognormal':
-                w = random.lognormvariate(conf['function']['mu'], conf['function']['sigma'])
-                y = int(w * res) % 2**(wlen * BITS_PER_BYTE)    # Avoid OverflowError
-            elif conf['function']['type'] == 'uniform':
-                w = random.uniform(conf['function']['a'], conf['function']['b'])
-                y = int(w * res)
-
-            data = self.value_to_bytes(y, nrefs, wlen)
-        elif conf['function']['type'] == 'copy':
-            data = self.get_memspace(conf['source']['memspace'])
-        elif conf['function']['type'] == 'transform':
-            buf = self.get_memspace(conf['source']['memspace'])
-            word = int.from_bytes(buf, byteorder=self.DEFAULTS['byteorder'])
-            value = self.transform_item(word, conf['function']['transform'])
-
-            if value is not None:
-                data = self.value_to_bytes(value, nrefs, wlen)
-            else:
-                data = None
-        elif conf['function']['type'] == 'operation':
-            value = self.perform_operation(conf)
+        return nrefs, wlen
 
-            if value is not None:
-                data = self.value_to_bytes(value, nrefs, wlen)
-            else:
-                data = None
+    def compile_counter(self, conf):
+        """
+        Compile a counter simulation function
 
-        return data
+        The counter steps through its range, starting again from the start
+        of the range once the stop value is reached
 
-    def value_to_bytes(self, value, nwords, wlen):
+        :param conf: The simulation configuration
+        :type conf: dict
+        :returns: The simulation data generating function
+        :rtype: function
         """
-        Convert the simulated data value to bytes
 
-        :param value: The simulation data value
-        :type value: number
-        :param nwords: The number of words that the value should fill
-        :type nwords: int
+        nrefs, wlen = self.get_memspace_conf_layout(conf)
+        byteorder = self.DEFAULTS['byteorder']
+        start, stop, step = conf['function']['range']
+        decrementing = step < 0
+        value = start
+
+        def generate():
+            nonlocal value
+            data = value.to_bytes(wlen, byteorder) * nrefs
+            value += step
+
+            if (value <= stop) if decrementing else (value >= stop):
+                value = start
+
+            return data
+
+        return generate
+
+    def compile_binary(self, conf):
+        """
+        Compile a binary simulation function
+
+        The value alternates between 0 and 1
+
+        :param conf: The simulation configuration
+        :type conf: dict
+        :returns: The simulation data generating function
+        :rtype: function
+        """
+
+        nrefs, wlen = self.get_memspace_conf_layout(conf)
+        states = (self.value_to_bytes(0, nrefs, wlen), self.value_to_bytes(1, nrefs, wlen))
+        value = 0
+
+        def generate():
+            nonlocal value
+            data = states[value]
+            value ^= 1
+
+            return data
+
+        return generate
+
+    def compile_static(self, conf):
+        """
+        Compile a static simulation function
+
+        :param conf: The simulation configuration
+        :type conf: dict
+        :returns: The simulation data generating function
+        :rtype: function
+        """
+
+        nrefs, wlen = self.get_memspace_conf_layout(conf)
+        data = self.value_to_bytes(int(conf['function']['value']), nrefs, wlen)
+
+        def generate():
+            return data
+
+        return generate
+
+    def get_wave_table(self, shape, resolution, amplitude, offset, nrefs, wlen):
+        """
+        Get the precomputed table for a wave
+
+        The table holds the simulation data for each step of one cycle of the
+        wave.  There are 2 * resolution + 1 steps in a cycle.  The values are:
+
+        * sine, cosine: int(wave(step / resolution * pi) * amplitude + offset)
+        * sawtooth: Rising from offset - amplitude to offset + amplitude.
+        * square: offset + amplitude for the first half of the cycle and offset for the second.
+
+        So the sine, cosine and sawtooth waves span offset +/- amplitude, but
+        the square wave spans offset to offset + amplitude.  Values are
+        wrapped to the word length.
+
+        The values of a wave are computed once for each distinct shape,
+        resolution, amplitude and offset, and the data for each distinct
+        number of references and word length.  The tables are shared by all
+        simulations
+
+        :param shape: The wave shape, one of 'sine', 'cosine', 'sawtooth' or 'square'
+        :type shape: str
+        :param resolution: The wave resolution
+        :type resolution: int
+        :param amplitude: The wave amplitude
+        :type amplitude: number
+        :param offset: The wave offset
+        :type offset: number
+        :param nrefs: The number of words that each value should fill
+        :type nrefs: int
         :param wlen: The length in bytes of a word
         :type wlen: int
-        :returns: The simulation data value as bytes
-        :rtype: bytearray
+        :returns: The simulation data for each step of the wave
+        :rtype: tuple of bytes
         """
 
-        data = bytearray(0)
-        b = value.to_bytes(wlen, byteorder=self.DEFAULTS['byteorder'])
+        key = (shape, resolution, amplitude, offset)
+        data_key = key + (nrefs, wlen)
 
-        for i in range(nwords):
-            data += b
+        with self.wave_tables_lock:
+            try:
+                return self.wave_tables[data_key]
+            except KeyError:
+                pass
+
+            try:
+                values = self.wave_tables[key]
+            except KeyError:
+                nsteps = 2 * resolution + 1
+                pi = math.pi
+
+                if shape == 'sine':
+                    values = [int(math.sin((x / resolution) * pi) * amplitude + offset) for x in range(nsteps)]
+                elif shape == 'cosine':
+                    values = [int(math.cos((x / resolution) * pi) * amplitude + offset) for x in range(nsteps)]
+                elif shape == 'sawtooth':
+                    values = [int(offset - amplitude + x * amplitude / resolution) for x in range(nsteps)]
+                elif shape == 'square':
+                    values = [int(offset if math.sin((x / resolution) * pi) < 0.0 else offset + amplitude) for x in range(nsteps)]
+                else:
+                    raise ValueError("Unknown wave shape: {}".format(shape))
+
+                values = tuple(values)
+                self.wave_tables[key] = values
+
+            byteorder = self.DEFAULTS['byteorder']
+            modulus = 2**(wlen * BITS_PER_BYTE)
+            data = tuple([(y % modulus).to_bytes(wlen, byteorder) * nrefs for y in values])
+            self.wave_tables[data_key] = data
 
         return data
 
-    def get_next_range_value(self, range_params, value):
+    def define_wave(self, conf):
         """
-        Get the next range value from the given range parameters
+        Construct the table and stepping parameters for a wave simulation
+
+        The wave is generated from a precomputed table.  See
+        `get_wave_table()`.  The function can configure the table's
+        `resolution`, `amplitude` and `offset`, the starting `phase` of the
+        wave (in cycles), and the `period` of the wave (s).  If no period is
+        given, the simulation steps through the table once per run, so the
+        period is the number of steps in the table times the simulation's
+        `pause`.  Otherwise, the simulation advances through the table by as
+        many steps per run as will complete a cycle in the given period,
+        which requires the simulation to have a `pause` greater than 0
 
-        :param range_params: The simulation range parameters
-        :type range_params: list
-        :param value: The current value from the range
-        :type value: number
-        :returns: The next value in the range
-        :rtype: number
+        :param conf: The simulation configuration
+        :type conf: dict
+        :raises: ValueError if the wave parameters are invalid
+        :returns: The wave table, the starting index into the table, and
+        the number of steps to advance through the table on each run
+        :rtype: tuple
         """
 
-        next_value = value + range_params[2]
-
-        if range_params[2] < 0:
-            if next_value <= range_params[1]:
-                next_value = range_params[0]
+        nrefs, wlen = self.get_memspace_conf_layout(conf)
+        fconf = conf['function']
+        defaults = self.DEFAULTS['wave']
+        shape = defaults['shapes'][fconf['type']]
+        res = int(self.define_parameter('resolution', fconf, defaults))
+        amplitude = self.define_parameter('amplitude', fconf, defaults)
+        offset = self.define_parameter('offset', fconf, defaults)
+        phase = float(self.define_parameter('phase', fconf, defaults))
+        period = self.define_parameter('period', fconf, defaults)
+
+        if res < 1:
+            raise ValueError("Wave resolution must be at least 1: {}".format(res))
+
+        if amplitude is None:
+            amplitude = res
+
+        if offset is None:
+            offset = res
+
+        table = self.get_wave_table(shape, res, amplitude, offset, nrefs, wlen)
+        nsteps = len(table)
+
+        if period is None:
+            advance = 1
+        elif period <= 0:
+            raise ValueError("Wave period must be greater than 0: {}".format(period))
+        elif conf.get('pause', 0) <= 0:
+            raise ValueError("Wave simulations with a period require a pause greater than 0: {}".format(conf.get('pause', 0)))
         else:
-            if next_value >= range_params[1]:
-                next_value = range_params[0]
+            advance = nsteps * conf['pause'] / period
+
+        index = (phase * nsteps) % nsteps
+
+        if advance == int(advance) and index == int(index):
+            advance = int(advance)
+            index = int(index)
+
+        return table, index, advance
+
+    def compile_wave(self, conf):
+        """
+        Compile a wave simulation function
 
-        return next_value
+        See `define_wave()` for details of the wave parameters
 
-    def transform_item(self, state, transform):
+        :param conf: The simulation configuration
+        :type conf: dict
+        :returns: The simulation data generating function
+        :rtype: function
         """
-        Transform the state according to the given transform rules
 
-        The state is the current value of the simulation as a word of the
-        simulation's memory space.  This word provides input to the rules
-        specified in transform.  The word is transformed according to the
-        rules and thereby provides the simulation's data value.
+        table, index, advance = self.define_wave(conf)
+        nsteps = len(table)
 
-        If the transform output is configured as 'null', then the returned
-        data value is simply the value of the state variable.  This is a
-        simple passthrough rule.
+        def generate():
+            nonlocal index
+            data = table[int(index)]
+            index = (index + advance) % nsteps
 
-        :param state: The current state of the simulation as a word value
-        :type state: number
-        :param transform: The simulation transform rules
-        :type transform: dict
-        :returns: The input state transformed to the output state
-        :rtype: number
+            return data
+
+        return generate
+
+    def compile_random(self, conf):
+        """
+        Compile a random simulation function
+
+        Each simulation has its own random number generator, seeded from the
+        function's `seed`, so a seeded simulation is reproducible irrespective
+        of any other simulations, and simulations don't contend for a shared
+        generator.  If no seed is given, the generator is seeded from the
+        operating system's randomness source.
+
+        If the function's `block` is greater than 0, the simulation data are
+        generated in blocks of that many values, which are then used in turn
+        on each run.  This gives the same values as generating them singly
+
+        :param conf: The simulation configuration
+        :type conf: dict
+        :returns: The simulation data generating function
+        :rtype: function
+        """
+
+        nrefs, wlen = self.get_memspace_conf_layout(conf)
+        byteorder = self.DEFAULTS['byteorder']
+        fconf = conf['function']
+        ftype = fconf['type']
+        res = int(self.DEFAULTS['random']['resolution'])
+        modulus = 2**(wlen * BITS_PER_BYTE)
+        rng = random.Random(self.define_parameter('seed', fconf, self.DEFAULTS['random']))
+        block = int(self.define_parameter('block', fconf, self.DEFAULTS['random']))
+
+        if ftype == 'randrange':
+            start, stop, step = fconf['range']
+            randrange = rng.randrange
+
+            def generate():
+                return randrange(start, stop, step).to_bytes(wlen, byteorder) * nrefs
+        elif ftype == 'lognormal':
+            mu = fconf['mu']
+            sigma = fconf['sigma']
+            lognormvariate = rng.lognormvariate
+
+            def generate():
+                # Avoid OverflowError
+                y = int(lognormvariate(mu, sigma) * res) % modulus
+                return y.to_bytes(wlen, byteorder) * nrefs
+        elif ftype == 'uniform':
+            a = fconf['a']
+            b = fconf['b']
+            uniform = rng.uniform
+
+            def generate():
+                return int(uniform(a, b) * res).to_bytes(wlen, byteorder) * nrefs
+
+        if block > 0:
+            generate = self.make_block_generator(generate, block)
+
+        return generate
+
+    def make_block_generator(self, generate, block):
+        """
+        Make a function that generates simulation data in blocks
+
+        :param generate: The simulation data generating function
+        :type generate: function
+        :param block: The number of values to generate at a time
+        :type block: int
+        :returns: A function that returns the next value from the current
+        block, generating a new block when the current block is exhausted
+        :rtype: function
+        """
+
+        values = []
+        index = 0
+
+        def generate_from_block():
+            nonlocal values, index
+
+            if index == len(values):
+                values = [generate() for i in range(block)]
+                index = 0
+
+            data = values[index]
+            index += 1
+
+            return data
+
+        return generate_from_block
+
+    def compile_transform(self, conf):
+        """
+        Compile a transform simulation function
+
+        The `transform` is either a single rule, or an ordered list of rules
+        where the first rule that matches the source value determines the
+        output.  Each rule has an `in`, which is either an exact value or an
+        inclusive `[lo, hi]` range, and an `out`.  If the `out` is null, the
+        output is the source value itself, so the rule is a passthrough.  If
+        no rule matches, nothing is written.  The rules are compiled into an
+        index, so looking up the output doesn't depend on the number of
+        rules.  See `plcsimulator.TransformIndex`
+
+        :param conf: The simulation configuration
+        :type conf: dict
+        :returns: The simulation data generating function
+        :rtype: function
         """
 
-        item = None
-        t_in = transform['in']
-        t_out = transform['out']
+        nrefs, wlen = self.get_memspace_conf_layout(conf)
+        byteorder = self.DEFAULTS['byteorder']
+        read_value = self.make_value_reader(conf['source']['memspace'])
+        lookup = TransformIndex(conf['function']['transform']).lookup
 
-        # If the transform output is configured as 'null', then it takes the
-        # value of the state variable
-        if t_out is None:
-            t_out = state
+        def generate():
+            value = lookup(read_value())
 
-        if isinstance(t_in, (list, tuple)):
-            if t_in[0] <= state <= t_in[1]:
-                item = t_out
-        elif state == t_in:
-                item = t_out
+            if value is None:
+                return None
 
-        return item
+            return value.to_bytes(wlen, byteorder) * nrefs
 
-    def perform_operation(self, conf):
+        return generate
+
+    def compile_operation(self, conf):
         """
-        Perform the operation specified in the simulation configuration
+        Compile an operation simulation function
 
         The operation to run is determined by the `operator` attribute.
         This must be a valid operator from the `operator` module of the
@@ -457,6 +1320,8 @@ class IoManager(object):
         The `operands` list is parsed from the simulation configuration
         and passed (in order) to the specified operator.  The number of
         operands in the list must match that required by the operator.
+        The memspace operands are got together in a single transaction, so
+        they are a consistent snapshot.
 
         Each operand is a `source` object.  For conformity, the operand
         definition may be in the `source` attribute of a surrounding
@@ -485,12 +1350,16 @@ class IoManager(object):
 
         :param conf: The simulation configuration
         :type conf: dict
-        :returns: The result of the operation
-        :rtype: number
+        :returns: The simulation data generating function
+        :rtype: function
         """
 
+        nrefs, wlen = self.get_memspace_conf_layout(conf)
+        byteorder = self.DEFAULTS['byteorder']
         fn = getattr(operator, conf['function']['operator'])
         args = []
+        positions = []
+        memspaces = []
 
         for operand in conf['operands']:
             # Get the operand definition from any optional source object
@@ -500,12 +1369,360 @@ class IoManager(object):
             if 'value' in operand:
                 args.append(int(operand['value']))
             elif 'memspace' in operand:
-                buf = self.get_memspace(operand['memspace'])
-                args.append(int.from_bytes(buf, byteorder=self.DEFAULTS['byteorder']))
+                positions.append(len(args))
+                memspaces.append(operand['memspace'])
+                args.append(None)
+            else:
+                raise ValueError("Unknown operand type: {}".format(operand))
+
+        read_values = self.make_values_reader(memspaces)
+
+        def generate():
+            operands = list(args)
+
+            for position, value in zip(positions, read_values()):
+                operands[position] = value
+
+            value = fn(*operands)
+
+            if value is None:
+                return None
+
+            return value.to_bytes(wlen, byteorder) * nrefs
+
+        return generate
+
+    def compile_expression(self, conf):
+        """
+        Compile an expression simulation function
+
+        The `expression` attribute is an arithmetic and boolean expression
+        over the named operands in the `operands` object.  See
+        `plcsimulator.Expression` for the permitted syntax.  As for the
+        `operation` function, each operand is either a constant integer
+        `value` or the value from a `memspace`, optionally in a `source`
+        object.  For example:
+
+        ```json
+        "operands": {
+            "a": {"memspace": {"section": "words16", "addr": 0, "nwords": 1}},
+            "b": {"value": 2}
+        },
+        "function": {"type": "expression", "expression": "(a * 10 + b) >> 2"}
+        ```
+
+        The memspace operands are got together in a single transaction.
+        The expression is parsed, validated and compiled once, with the
+        constant operands bound into it.  The result is truncated to an
+        integer and wrapped to the word length
+
+        :param conf: The simulation configuration
+        :type conf: dict
+        :raises: ValueError if the expression or its operands are invalid
+        :returns: The simulation data generating function
+        :rtype: function
+        """
+
+        nrefs, wlen = self.get_memspace_conf_layout(conf)
+        byteorder = self.DEFAULTS['byteorder']
+        modulus = 2**(wlen * BITS_PER_BYTE)
+        operands = conf.get('operands', {})
+        names = []
+        memspaces = []
+        constants = {}
+
+        if not isinstance(operands, dict):
+            raise ValueError("Expression operands must be named: {}".format(operands))
+
+        for name, operand in operands.items():
+            # Get the operand definition from any optional source object
+            if 'source' in operand:
+                operand = operand['source']
+
+            if 'value' in operand:
+                # As for the operation function, constants are integers
+                try:
+                    constants[name] = int(operand['value'])
+                except (TypeError, ValueError):
+                    raise ValueError("Invalid value for expression operand {}: {}".format(name, operand['value']))
+            elif 'memspace' in operand:
+                names.append(name)
+                memspaces.append(operand['memspace'])
             else:
                 raise ValueError("Unknown operand type: {}".format(operand))
 
-        result = fn(*args)
+        evaluate = Expression(conf['function']['expression'], names, constants).evaluate
+        read_values = self.make_values_reader(memspaces)
+
+        def generate():
+            value = int(evaluate(*read_values())) % modulus
+
+            return value.to_bytes(wlen, byteorder) * nrefs
+
+        return generate
+
+    def value_to_bytes(self, value, nwords, wlen):
+        """
+        Convert the simulated data value to bytes
+
+        :param value: The simulation data value
+        :type value: number
+        :param nwords: The number of words that the value should fill
+        :type nwords: int
+        :param wlen: The length in bytes of a word
+        :type wlen: int
+        :returns: The simulation data value as bytes
+        :rtype: bytearray
+        """
+
+        data = bytearray(0)
+        b = value.to_bytes(wlen, byteorder=self.DEFAULTS['byteorder'])
+
+        for i in range(nwords):
+            data += b
+
+        return data
+
+    def define_channel_parameter(self, name, conf, nchannels):
+        """
+        Get a per-channel parameter of a batch simulation function
+
+        The parameter can be configured as either a list, with a value for
+        each channel, or a single value that applies to all channels
+
+        :param name: The parameter name
+        :type name: str
+        :param conf: The function configuration
+        :type conf: dict
+        :param nchannels: The number of channels
+        :type nchannels: int
+        :raises: ValueError if a list doesn't have a value for each channel
+        :returns: The parameter value for each channel
+        :rtype: list
+        """
+
+        param = self.define_parameter(name, conf, self.DEFAULTS['batch'])
+
+        if isinstance(param, (list, tuple)):
+            if len(param) != nchannels:
+                raise ValueError("Batch parameter {} has {} values, expected {}".format(name, len(param), nchannels))
+        else:
+            param = [param] * nchannels
+
+        return [float(x) for x in param]
+
+    def compile_batch(self, conf):
+        """
+        Compile a batch simulation function
+
+        A batch simulation generates a waveform on each word of a contiguous
+        block of its memory space.  Each word is a channel, with its own
+        `phase` (in cycles), `scale` and `offset`.  These can be configured
+        for each channel in a list, or as a single value for all channels.
+        Additionally, `phase_step` is added to the phase of each successive
+        channel, which spreads the channels over the cycle.  Each channel's
+        value is:
+
+          int(waveform(2 * pi * (step / steps + phase)) * scale + offset)
+
+        where the waveform is in the range -1 to 1, and step is incremented
+        on each run of the simulation, over the number of `steps` in a cycle.
+        Values are wrapped to the word length.
+
+        The whole block is computed at once, and written to the memory space
+        in a single call.  If NumPy is installed, the block is computed as
+        a vectorised array operation
+
+        :param conf: The simulation configuration
+        :type conf: dict
+        :returns: The simulation data generating function
+        :rtype: function
+        """
+
+        if conf['memspace']['section'] == 'bits':
+            raise ValueError("Batch simulations require a words memspace section: {}".format(conf['memspace']))
+
+        nchannels, wlen = self.get_memspace_conf_layout(conf)
+        fconf = conf['function']
+        waveform = self.define_parameter('waveform', fconf, self.DEFAULTS['batch'])
+        nsteps = int(self.define_parameter('steps', fconf, self.DEFAULTS['batch']))
+        phase_step = float(self.define_parameter('phase_step', fconf, self.DEFAULTS['batch']))
+        phases = self.define_channel_parameter('phase', fconf, nchannels)
+        scales = self.define_channel_parameter('scale', fconf, nchannels)
+        offsets = self.define_channel_parameter('offset', fconf, nchannels)
+        modulus = 2**(wlen * BITS_PER_BYTE)
+        two_pi = 2 * math.pi
+        step = 0
+
+        if waveform not in self.DEFAULTS['batch']['waveforms']:
+            raise ValueError("Unknown batch waveform: {}".format(waveform))
+
+        # Phases are held as angles, including each channel's phase step
+        angles = [two_pi * (phase + i * phase_step) for i, phase in enumerate(phases)]
+
+        if numpy is not None:
+            angles = numpy.array(angles)
+            scales = numpy.array(scales)
+            offsets = numpy.array(offsets)
+            dtype = numpy.dtype('>u{}'.format(wlen))
+
+            if waveform == 'sine':
+                wave = numpy.sin
+            elif waveform == 'cosine':
+                wave = numpy.cos
+            elif waveform == 'sawtooth':
+                def wave(x):
+                    return 2 * ((x / two_pi) % 1.0) - 1
+            elif waveform == 'square':
+                def wave(x):
+                    return numpy.where(numpy.sin(x) < 0.0, -1.0, 1.0)
+
+            def generate():
+                nonlocal step
+                x = two_pi * step / nsteps
+                step = (step + 1) % nsteps
+                values = numpy.trunc(wave(x + angles) * scales + offsets)
+
+                # Casting from signed to unsigned wraps to the word length
+                return values.astype(numpy.int64).astype(dtype).tobytes()
+        else:
+            channels = list(zip(angles, scales, offsets))
+            pack = struct.Struct('>{}{}'.format(nchannels, self.DEFAULTS['struct_codes'][wlen])).pack
+
+            if waveform == 'sine':
+                wave = math.sin
+            elif waveform == 'cosine':
+                wave = math.cos
+            elif waveform == 'sawtooth':
+                def wave(x):
+                    return 2 * ((x / two_pi) % 1.0) - 1
+            elif waveform == 'square':
+                def wave(x):
+                    return -1.0 if math.sin(x) < 0.0 else 1.0
+
+            def generate():
+                nonlocal step
+                x = two_pi * step / nsteps
+                step = (step + 1) % nsteps
+
+                return pack(*[int(wave(x + a) * sc + of) % modulus for a, sc, of in channels])
+
+        return generate
+
+    def compile_replay(self, conf):
+        """
+        Compile a replay simulation function
+
+        A replay simulation replays a recording into a contiguous block of
+        its memory space.  See `plcsimulator.Recording` for the recording
+        file format.  The recording's word length and number of words must
+        match the memory space.
+
+        On each run, the latest record at or before the replay time is
+        written to the memory space, directly from the memory-mapped file.
+        If there is no new record since the last run, nothing is written.
+        The replay time starts at the first record's timestamp when the
+        simulation first runs, and advances at `speed` times the IO manager's
+        clock.  If `loop` is true, the replay starts again from the first
+        record, one mean record interval after the last record.  Otherwise,
+        the last record is held.  The simulation's `pause` should be no
+        greater than the record interval divided by the speed, so that no
+        records are missed
+
+        :param conf: The simulation configuration
+        :type conf: dict
+        :raises: ValueError if the recording is invalid or doesn't match the
+        memory space
+        :returns: The simulation data generating function
+        :rtype: function
+        """
+
+        if conf['memspace']['section'] == 'bits':
+            raise ValueError("Replay simulations require a words memspace section: {}".format(conf['memspace']))
+
+        nwords, wlen = self.get_memspace_conf_layout(conf)
+        fconf = conf['function']
+        speed = float(self.define_parameter('speed', fconf, self.DEFAULTS['replay']))
+        loop = bool(self.define_parameter('loop', fconf, self.DEFAULTS['replay']))
+        recording = Recording(fconf['file'])
+
+        if (recording.wlen, recording.nwords) != (wlen, nwords):
+            raise ValueError("Replay recording {} has {} words of {} bytes, memspace has {} words of {} bytes".format(fconf['file'], recording.nwords, recording.wlen, nwords, wlen))
+
+        if speed <= 0:
+            raise ValueError("Replay speed must be greater than 0: {}".format(speed))
+
+        nrecords = len(recording)
+        first = recording[0]
+        duration = recording[-1] - first
+        cycle = duration + duration / (nrecords - 1) if nrecords > 1 else 0.0
+        find = recording.find
+        get_row = recording.get_row
+        monotonic = self.clock.monotonic
+        started = None
+        index = -1
+
+        def generate():
+            nonlocal started, index
+            now = monotonic()
+
+            if started is None:
+                started = now
+
+            elapsed = (now - started) * speed
+
+            if loop and cycle > 0:
+                elapsed %= cycle
+
+            target = first + elapsed
+
+            # Replay time only goes backwards when the replay loops
+            if index >= 0 and recording[index] <= target:
+                next_index = find(target, index)
+            else:
+                next_index = find(target)
+
+            if next_index == index:
+                return None
+
+            index = next_index
+
+            return get_row(index)
+
+        return generate
+
+    def compile_clock(self, conf):
+        """
+        Compile a clock simulation function
+
+        The value is the virtual time of the IO manager's clock, in units of
+        1 / `resolution` seconds.  If the `epoch` is 'start' (the default),
+        the time is elapsed since the IO manager was created.  If the epoch
+        is 'unix', the time is since the Unix epoch, as the wall clock time
+        when the IO manager was created plus the elapsed virtual time.
+        Values are wrapped to the word length
+
+        :param conf: The simulation configuration
+        :type conf: dict
+        :returns: The simulation data generating function
+        :rtype: function
+        """
+
+        nrefs, wlen = self.get_memspace_conf_layout(conf)
+        byteorder = self.DEFAULTS['byteorder']
+        modulus = 2**(wlen * BITS_PER_BYTE)
+        fconf = conf['function']
+        epoch = self.define_parameter('epoch', fconf, self.DEFAULTS['clock_function'])
+        resolution = self.define_parameter('resolution', fconf, self.DEFAULTS['clock_function'])
+
+        if epoch not in self.DEFAULTS['clock_function']['epochs']:
+            raise ValueError("Unknown clock epoch: {}".format(epoch))
+
+        get_time = self.clock.time if epoch == 'unix' else self.clock.elapsed
+
+        def generate():
+            value = int(get_time() * resolution) % modulus
 
-        return result
+            return value.to_bytes(wlen, byteorder) * nrefs
 
+        return generate
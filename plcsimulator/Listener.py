@@ -10,21 +10,64 @@ PLC simulator network listener module
 
 This module contains the listener class.  It manages:
 
-* Creating and binding the TCP listening socket specified in the configuration.
-* Listening on the socket for incoming connection requests.
+* Creating and binding a TCP listening socket for the port specified in the configuration, and for each other port that a fieldbus module is mapped to.
+* Listening on the sockets for incoming connection requests.
 * Creating a backend to service the incoming request.
+
+The listener can run in one of two modes, as given by the `mode` setting
+in the configuration:
+
+* thread: (Default) A single accept loop waits on all the listening
+  sockets, and each accepted connection is serviced by a backend running on
+  a worker thread.  On each wakeup, all the pending connection requests on a
+  socket are accepted, so that a burst of connections doesn't overflow the
+  socket's backlog.
+* asyncio: A single event loop accepts connections and each backend is run
+  as a coroutine on that loop.  This scales to many more concurrent
+  clients, as there is no thread per connection.
+
+In either mode, one process can therefore expose several fieldbus endpoints,
+or, for example, a fleet of PLCs on a range of ports.
+
+With the `workers` setting, the listener forks that number of worker
+processes, each of which binds the port with `SO_REUSEPORT` and runs its own
+accept loop, in the listener mode.  The kernel then distributes incoming
+connections between the workers, so servicing requests isn't limited to a
+single core.  The parent process supervises the workers.  The workers must
+share the memory space with the parent process, so that they see the
+simulations and each other's writes.  See `plcsimulator.SharedMemspace`.
+
+With the `pool` setting, each accepted connection must be admitted to the
+listener's backend pool before it is serviced.  The pool limits the number of
+backends that run concurrently, the number of connections queued waiting for
+a backend, and the number of connections from each client address, and gives
+each backend an idle timeout.  A connection that can't be admitted is closed
+straight away, so a misbehaving client can't exhaust the simulator's
+resources, and the latency for well-behaved clients stays bounded.  In the
+thread mode, the backends are run by a pool of worker threads.  See
+`plcsimulator.BackendPool`.
 """
 
 import logging
+import os
+import selectors
+import signal
 import socket
-import threading
+import asyncio
+
+from plcsimulator.BackendPool import BackendPool
 
 class Listener(object):
     """
     Main server daemon for the PLC simulator
     """
 
-    def __init__(self, host='localhost', port=5555, backlog=10, fieldbus_manager=None):
+    DEFAULTS = {
+        'modes': ['thread', 'asyncio'],
+        'accept_batch': 256
+    }
+
+    def __init__(self, host='localhost', port=5555, backlog=socket.SOMAXCONN, mode='thread', workers=1, pool=None, fieldbus_manager=None):
         """
         Constructor
 
@@ -34,52 +77,324 @@ class Listener(object):
         :type port: int
         :param backlog: The number of pending connection requests to handle
         :type backlog: int
+        :param mode: The listener mode, one of 'thread' or 'asyncio'
+        :type mode: str
+        :param workers: The number of worker processes.  If 1, the listener
+        runs in the calling process
+        :type workers: int
+        :param pool: The backend pool configuration, with any of the
+        `max_backends`, `queue_depth`, `max_per_client`, `idle_timeout` and
+        `worker_linger` settings.  See `plcsimulator.BackendPool.BackendPool`
+        :type pool: dict
         :param fieldbus_manager: The instantiated fieldbus_manager object
         :type fieldbus_manager: plcsimulator.FieldbusManager.FieldbusManager
+        :raises: ValueError if the configuration is invalid
         """
 
         self.host = host
         self.port = port
         self.backlog = backlog
+        self.mode = mode
+        self.workers = workers
         self.fieldbus_manager = fieldbus_manager
+        self.pool = BackendPool(**(pool or {}))
+        self.backend_slots = None
         self.conn = None
+        self.pids = []
+
+        if self.mode not in self.DEFAULTS['modes']:
+            raise ValueError("Unknown listener mode: {}".format(self.mode))
+
+        if self.workers < 1:
+            raise ValueError("Listener workers must be at least 1: {}".format(self.workers))
+
+        if self.workers > 1 and not (hasattr(os, 'fork') and hasattr(socket, 'SO_REUSEPORT')):
+            raise ValueError("Listener workers require fork and SO_REUSEPORT, which this platform doesn't support")
+
+        # Otherwise, each worker would have its own copy of the memory space,
+        # which the simulations in the parent process don't write to
+        memory_manager = fieldbus_manager.memory_manager if fieldbus_manager else None
+
+        if self.workers > 1 and memory_manager is not None and memory_manager.shared is None:
+            raise ValueError('Listener workers require the memory space to be shared')
+
+    def fork_workers(self):
+        """
+        Fork the worker processes
+
+        This must be called before any other threads are started, as only
+        the calling thread is copied to each worker
+
+        :returns: True in a worker process, or False in the parent process
+        :rtype: bool
+        """
+
+        for i in range(self.workers):
+            pid = os.fork()
+
+            if pid == 0:
+                self.pids = []
+                return True
+
+            self.pids.append(pid)
+
+        logging.info("Started {} listener workers: {}".format(self.workers, self.pids))
+
+        return False
+
+    def supervise_workers(self):
+        """
+        Wait for the worker processes to exit
+
+        When this returns, including on an exception, such as a
+        KeyboardInterrupt, any workers still running are stopped
+        """
+
+        try:
+            while self.pids:
+                pid, status = os.wait()
+
+                if pid in self.pids:
+                    self.pids.remove(pid)
+                    logging.warning("Listener worker {} exited with status {}".format(pid, status))
+        finally:
+            self.stop_workers()
+
+    def stop_workers(self):
+        """
+        Stop the worker processes, and wait for them to exit
+        """
+
+        for pid in self.pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+        for pid in self.pids:
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+
+        self.pids = []
  
     def configure_socket(self):
         """
         Configure the listening socket
         """
 
-        self.conn = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.conn.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        self.conn.bind((self.host, self.port))
+        self.conn = self.make_socket(self.port)
+
+    def make_socket(self, port):
+        """
+        Make a listening socket, bound to the given port
+
+        :param port: The TCP port to bind the socket to
+        :type port: int
+        :returns: The socket
+        :rtype: socket.socket
+        """
+
+        conn = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        conn.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+
+        # Each worker binds its own socket to the port
+        if self.workers > 1:
+            conn.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+
+        conn.bind((self.host, port))
+
+        return conn
+
+    def get_ports(self):
+        """
+        Get all the ports to listen on
+
+        These are the listener's port, followed by any other ports that
+        fieldbus modules are mapped to
 
-    def listen(self, backlog=10):
+        :returns: The ports
+        :rtype: list
+        """
+
+        return [self.port] + [port for port in self.fieldbus_manager.get_ports() if port != self.port]
+
+    def listen(self, backlog=None):
         """
         Listen for incoming connection requests
 
-        :param backlog: The number of pending connection requests to handle
+        :param backlog: The number of pending connection requests to handle.
+        If None, the listener's backlog is used
         :type backlog: int
         """
 
-        self.conn.listen(backlog)
+        self.conn.listen(self.backlog if backlog is None else backlog)
 
     def service_client_requests(self):
         """
         Handle incoming connection requests from clients
 
-        * Configure the listening socket.
-        * Listen on the socket for incoming connection requests.
-        * Pass the connection to a new fieldbus-specific backend to process.
+        The requests are handled according to the listener mode.  In the
+        parent process of the worker processes, the workers are supervised
+        instead
+        """
+
+        if self.pids:
+            self.supervise_workers()
+        elif self.mode == 'asyncio':
+            asyncio.run(self.service_client_requests_async())
+        else:
+            self.service_client_requests_threaded()
+
+    def service_client_requests_threaded(self):
+        """
+        Handle incoming connection requests from clients
+
+        * Configure a listening socket for each port.
+        * Listen on the sockets for incoming connection requests.
+        * Wait until any socket has pending connection requests.
+        * Admit each connection to the backend pool, which passes it to a new
+          fieldbus-specific backend to process.
         """
 
         self.configure_socket()
-        self.listen(backlog=self.backlog)
+        self.listen()
+        ports = self.get_ports()
+        conns = [self.conn]
+
+        for port in ports[1:]:
+            conn = self.make_socket(port)
+            conn.listen(self.backlog)
+            conns.append(conn)
+
+        if len(ports) > 1:
+            logging.info("Listening on {}:{} and {} other ports".format(self.host, self.port, len(ports) - 1))
+        else:
+            logging.info("Listening on {}:{}".format(self.host, self.port))
+
+        with selectors.DefaultSelector() as selector:
+            for conn in conns:
+                conn.setblocking(False)
+                selector.register(conn, selectors.EVENT_READ)
+
+            try:
+                while True:
+                    for key, events in selector.select():
+                        self.accept_connections(key.fileobj)
+            finally:
+                for conn in conns:
+                    conn.close()
+
+    def accept_connections(self, conn):
+        """
+        Accept the pending connection requests on a listening socket
+
+        Up to the accept batch size of connection requests are accepted, or
+        until there are none left pending.  Each connection is submitted to
+        the backend pool, which passes it to a new fieldbus-specific backend
+        to process, or closes it if it can't be admitted
+
+        :param conn: The non-blocking listening socket
+        :type conn: socket.socket
+        :returns: The number of connections accepted
+        :rtype: int
+        """
+
+        naccepted = 0
+
+        for i in range(self.DEFAULTS['accept_batch']):
+            try:
+                current_conn, address = conn.accept()
+            except BlockingIOError:
+                break
+            except ConnectionAbortedError:
+                # The client gave up before its connection was accepted
+                continue
+
+            # The backends use blocking sockets
+            current_conn.setblocking(True)
+            naccepted += 1
+
+            self.pool.submit(self.run_backend, current_conn, address)
 
-        logging.info("Listening on {}:{}".format(self.host, self.port))
+        return naccepted
+
+    def run_backend(self, conn, address):
+        """
+        Run a new fieldbus-specific backend for an admitted connection
+
+        :param conn: The client socket
+        :type conn: socket.socket
+        :param address: The client address
+        :type address: tuple
+        """
+
+        self.fieldbus_manager.create_new_backend(conn, address, idle_timeout=self.pool.idle_timeout)
+
+    async def run_backend_async(self, reader, writer):
+        """
+        Run a new fieldbus-specific backend coroutine for a connection
+
+        The connection must first be admitted to the backend pool, otherwise
+        it is closed.  When the maximum number of backends are running, an
+        admitted connection waits for one of them to finish
+
+        :param reader: The stream to read client requests from
+        :type reader: asyncio.StreamReader
+        :param writer: The stream to write responses to the client
+        :type writer: asyncio.StreamWriter
+        """
+
+        address = writer.get_extra_info('peername')
+
+        if not self.pool.admit(address):
+            logging.debug("Backend pool at capacity, rejected client {}".format(address))
+            writer.close()
+
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+            return
+
+        try:
+            if self.backend_slots is None:
+                await self.fieldbus_manager.create_new_backend_async(reader, writer, idle_timeout=self.pool.idle_timeout)
+            else:
+                async with self.backend_slots:
+                    await self.fieldbus_manager.create_new_backend_async(reader, writer, idle_timeout=self.pool.idle_timeout)
+        finally:
+            self.pool.release(address)
+
+    async def service_client_requests_async(self):
+        """
+        Handle incoming connection requests from clients on an event loop
+
+        * Configure a listening socket for each port.
+        * Listen on the sockets for incoming connection requests.
+        * Admit each connection to the backend pool, and pass it to a new
+          fieldbus-specific backend coroutine.
+        """
+
+        if self.pool.max_backends is not None:
+            self.backend_slots = asyncio.Semaphore(self.pool.max_backends)
+
+        self.configure_socket()
+        servers = [await asyncio.start_server(self.run_backend_async, sock=self.conn, backlog=self.backlog)]
+        ports = self.get_ports()
 
-        while True:
-            current_conn, address = self.conn.accept()
+        for port in ports[1:]:
+            servers.append(await asyncio.start_server(self.run_backend_async, sock=self.make_socket(port), backlog=self.backlog))
 
-            backend = threading.Thread(target=self.fieldbus_manager.create_new_backend, args=(current_conn, address))
-            backend.start()
+        if len(ports) > 1:
+            logging.info("Listening on {}:{} and {} other ports (asyncio)".format(self.host, self.port, len(ports) - 1))
+        else:
+            logging.info("Listening on {}:{} (asyncio)".format(self.host, self.port))
 
+        try:
+            await asyncio.gather(*[server.serve_forever() for server in servers])
+        finally:
+            for server in servers:
+                server.close()
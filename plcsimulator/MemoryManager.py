@@ -12,12 +12,37 @@ This module contains the memory manager class.  It manages:
 
 * Initialising each memory space section specified in the configuration.
 * Getting and setting values in a given memory space section.
+
+Access to each memory space section is guarded by its own reader/writer
+lock.  Concurrent readers don't block each other, and access to one section
+doesn't contend with access to any other section.  The locks keep contention
+counters, which can be retrieved with `get_lock_stats()`.
+
+Read hooks can be added for an address range of a memory space section.
+Before any read that overlaps that range, the hook is called, which allows
+a value to be written to the memory space only when it is needed.
+
+Several ranges, in any of the sections, can be got and set atomically in a
+transaction.  See `transaction()`.
+
+By default, the memory space is private to the process.  Alternatively, it
+can be backed by a file that several processes attach to, so that, for
+example, fieldbus servers and simulations can run in separate processes.
+See `plcsimulator.SharedMemspace`.
 """
 
-from threading import Lock
+import bisect
+import contextlib
+
+from plcsimulator.RWLock import RWLock
+from plcsimulator.Transaction import Transaction
+from plcsimulator.SharedMemspace import SharedMemspace
 
 BITS_PER_BYTE = 8
 
+# The masks for the low n bits of a byte, indexed by n
+LOW_BIT_MASKS = tuple(2**n - 1 for n in range(BITS_PER_BYTE + 1))
+
 class MemoryManager(object):
     """
     Memory manager for the PLC simulator
@@ -33,7 +58,7 @@ class MemoryManager(object):
         }
     }
 
-    def __init__(self, blen=0, w16len=0, w32len=0, w64len=0):
+    def __init__(self, blen=0, w16len=0, w32len=0, w64len=0, shared=None):
         """
         Constructor
 
@@ -48,10 +73,17 @@ class MemoryManager(object):
         :type w32len: int
         :param w64len: The number of slots in the 64-bit words section
         :type w64len: int
+        :param shared: If given, the memory space is shared between
+        processes, backed by the file at its `path`.  An existing memory
+        space is attached to, keeping its data.  If its `create` is False,
+        the file must already exist, otherwise it is created if it doesn't
+        (the default).  See `plcsimulator.SharedMemspace.SharedMemspace`
+        :type shared: dict
         """
 
-        self.lock = Lock()
         self.memspace = self.DEFAULTS['memspace'].copy()
+        self.read_hooks = {}
+        self.shared = None
 
         # Ensure number of bits are aligned to whole byte lengths
         bits_nbytes = blen // BITS_PER_BYTE
@@ -59,10 +91,47 @@ class MemoryManager(object):
         if blen % BITS_PER_BYTE > 0:
             bits_nbytes += 1
 
-        self.memspace['bits'] = bytearray(bits_nbytes)
-        self.memspace['words16'] = bytearray(w16len * 2)
-        self.memspace['words32'] = bytearray(w32len * 4)
-        self.memspace['words64'] = bytearray(w64len * 8)
+        sizes = {'bits': bits_nbytes, 'words16': w16len * 2, 'words32': w32len * 4, 'words64': w64len * 8}
+
+        if shared:
+            self.shared = SharedMemspace(shared['path'], sizes, create=shared.get('create', True))
+            self.memspace.update(self.shared.sections)
+            self.locks = {section: self.shared.make_lock(section) for section in self.memspace}
+        else:
+            for section, nbytes in sizes.items():
+                self.memspace[section] = bytearray(nbytes)
+
+            self.locks = {section: RWLock() for section in self.memspace}
+
+    def get_section_seq(self, section):
+        """
+        Get the write sequence counter of the given memory space section
+
+        The counter is only kept for a shared memory space
+
+        :param section: The memory space section
+        :type section: str
+        :returns: The number of writes to the section since the shared memory
+        space was created, or None if the memory space isn't shared
+        :rtype: int
+        """
+
+        if self.shared is None:
+            return None
+
+        return self.shared.get_seq(section)
+
+    def close(self):
+        """
+        Close the memory manager
+
+        A shared memory space is detached from, but its file isn't removed
+        """
+
+        if self.shared is not None:
+            self.memspace = self.DEFAULTS['memspace'].copy()
+            self.shared.close()
+            self.shared = None
 
     def get_section_word_len(self, section):
         """
@@ -87,6 +156,111 @@ class MemoryManager(object):
 
         return word_len
 
+    def get_lock_stats(self):
+        """
+        Get the lock contention counters for each memory space section
+
+        :returns: The contention counters, keyed by section name.  See
+        `plcsimulator.RWLock.RWLock.get_stats()`
+        :rtype: dict
+        """
+
+        return {section: lock.get_stats() for section, lock in self.locks.items()}
+
+    def transaction(self):
+        """
+        Create a transaction to get and set several ranges atomically
+
+        See `plcsimulator.Transaction.Transaction`
+
+        :returns: The transaction
+        :rtype: plcsimulator.Transaction.Transaction
+        """
+
+        return Transaction(self)
+
+    def lock_sections(self, sections):
+        """
+        Lock several memory space sections
+
+        The sections are locked in sorted order, so that concurrent callers
+        can't deadlock, and are released in reverse order
+
+        :param sections: Whether to lock each section for writing, otherwise
+        for reading, keyed by section name
+        :type sections: dict
+        :returns: A context manager that holds the locks
+        :rtype: contextlib.ExitStack
+        """
+
+        stack = contextlib.ExitStack()
+
+        with stack:
+            for section in sorted(sections):
+                lock = self.locks[section]
+                stack.enter_context(lock.write if sections[section] else lock.read)
+
+            return stack.pop_all()
+
+    def add_read_hook(self, section, addr, nrefs, hook):
+        """
+        Add a hook to be called before any read of the given address range
+
+        The hook is called without any lock held, so it can set data in the
+        memory space.  For the bits section, the address range is in bits,
+        otherwise it is in words
+
+        :param section: The memory space section
+        :type section: str
+        :param addr: The start address in the memory space section
+        :type addr: int
+        :param nrefs: The number of references offset from start address
+        :type nrefs: int
+        :param hook: The hook.  It takes no arguments
+        :type hook: function
+        """
+
+        if section == 'bits':
+            self.check_bit_bounds(section=section, addr=addr, nbits=nrefs)
+        else:
+            self.check_bounds(section=section, addr=addr, nwords=nrefs)
+
+        entries = []
+
+        if section in self.read_hooks:
+            entries = list(self.read_hooks[section][1])
+
+        entries.append((addr, addr + nrefs, hook))
+        entries.sort(key=lambda entry: entry[:2])
+        starts = [entry[0] for entry in entries]
+        max_span = max([entry[1] - entry[0] for entry in entries])
+
+        # The hooks are replaced rather than updated in place, so readers
+        # never see a partially updated set of hooks
+        self.read_hooks[section] = (starts, entries, max_span)
+
+    def run_read_hooks(self, section, addr, nrefs):
+        """
+        Call the read hooks whose address range overlaps the given range
+
+        :param section: The memory space section
+        :type section: str
+        :param addr: The start address in the memory space section
+        :type addr: int
+        :param nrefs: The number of references offset from start address
+        :type nrefs: int
+        """
+
+        starts, entries, max_span = self.read_hooks[section]
+
+        # Only hooks that start within max_span before addr can overlap it
+        lo = bisect.bisect_right(starts, addr - max_span)
+        hi = bisect.bisect_left(starts, addr + nrefs)
+
+        for start, end, hook in entries[lo:hi]:
+            if end > addr:
+                hook()
+
     def check_bounds(self, section=None, addr=None, nwords=None):
         """
         Do a bounds check on a request to access a given memory space section
@@ -300,9 +474,83 @@ class MemoryManager(object):
 
         self.check_bounds(section=section, addr=addr, nwords=nwords)
 
-        with self.lock:
+        if section in self.read_hooks:
+            self.run_read_hooks(section, addr, nwords)
+
+        with self.locks[section].read:
             data = self.memspace[section][addr*wlen:addr*wlen+nwords*wlen]
 
+            # A shared section is a view, so the data must be copied
+            if self.shared is not None:
+                data = bytearray(data)
+
+        return data
+
+    def get_data_into(self, section=None, addr=None, nwords=None, out=None, offset=0):
+        """
+        Get a slice of data from the given memory space section into a buffer
+
+        This is as `get_data()`, except that the data are copied directly
+        into the given buffer, such as a preallocated response buffer, rather
+        than into a new bytearray
+
+        :param section: The memory space section
+        :type section: str
+        :param addr: The start address in the memory space section
+        :type addr: int
+        :param nwords: The number of words to get offset from start address
+        :type nwords: int
+        :param out: The buffer to copy the data into
+        :type out: bytearray or memoryview
+        :param offset: The byte offset in the buffer to copy the data to
+        :type offset: int
+        :raises: IndexError if the bounds of the section would be exceeded,
+        or the data would exceed the bounds of the buffer
+        :returns: The number of bytes copied
+        :rtype: int
+        """
+
+        wlen = self.get_section_word_len(section)
+        nbytes = nwords*wlen
+
+        self.check_bounds(section=section, addr=addr, nwords=nwords)
+
+        if offset < 0 or offset + nbytes > len(out):
+            raise IndexError("Buffer bounds exceeded: {}:{}".format(offset, offset + nbytes))
+
+        if section in self.read_hooks:
+            self.run_read_hooks(section, addr, nwords)
+
+        with self.locks[section].read:
+            # The view is only held with the lock, so it can't see a write
+            with memoryview(self.memspace[section]) as view:
+                out[offset:offset+nbytes] = view[addr*wlen:addr*wlen+nbytes]
+
+        return nbytes
+
+    def read_data(self, section, addr, nwords):
+        """
+        Get a slice of data, as `get_data()`, with the section lock already held
+
+        The slice is assumed to have already been bounds checked, and no read
+        hooks are called
+
+        :param section: The memory space section
+        :type section: str
+        :param addr: The start address in the memory space section
+        :type addr: int
+        :param nwords: The number of words to get offset from start address
+        :type nwords: int
+        :returns: The data slice
+        :rtype: bytearray
+        """
+
+        wlen = self.get_section_word_len(section)
+        data = self.memspace[section][addr*wlen:addr*wlen+nwords*wlen]
+
+        if self.shared is not None:
+            data = bytearray(data)
+
         return data
 
     def set_data(self, section=None, addr=None, nwords=None, data=None):
@@ -325,16 +573,58 @@ class MemoryManager(object):
 
         self.check_bounds(section=section, addr=addr, nwords=nwords)
 
-        with self.lock:
+        with self.locks[section].write:
             self.memspace[section][addr*wlen:addr*wlen+nwords*wlen] = data
 
         return data
 
+    def write_data(self, section, addr, nwords, data):
+        """
+        Set a slice of data, as `set_data()`, with the section lock already held
+
+        The slice is assumed to have already been bounds checked
+
+        :param section: The memory space section
+        :type section: str
+        :param addr: The start address in the memory space section
+        :type addr: int
+        :param nwords: The number of words to set offset from start address
+        :type nwords: int
+        :param data: The data values to set in the memory space section
+        :type data: bytearray
+        """
+
+        wlen = self.get_section_word_len(section)
+        self.memspace[section][addr*wlen:addr*wlen+nwords*wlen] = data
+
+    def check_bit_bounds(self, section='bits', addr=None, nbits=None):
+        """
+        Do a bounds check on a request to access a given bit range
+
+        :param section: The memory space section
+        :type section: str
+        :param addr: The start bit address in the bits memory space section
+        :type addr: int
+        :param nbits: The number of bits to access offset from start address
+        :type nbits: int
+        :raises: IndexError if the bounds of the section would be exceeded
+        """
+
+        if addr < 0 or nbits < 0 or addr + nbits > len(self.memspace[section]) * BITS_PER_BYTE:
+            raise IndexError("Memspace section {} bounds exceeded: {}:{}".format(section, addr, addr + nbits))
+
     def get_bits(self, section='bits', addr=None, nbits=None):
         """
         Get an arbitrary range of bits from the bits memory space section
 
-        Note that the bit range is ordered from right-to-left
+        Note that the bit range is ordered from right-to-left.  That is, bit
+        zero refers to the right-most bit in the last byte of the bits
+        section memory space.  The returned bits are likewise right-aligned,
+        so the bit at addr is the right-most bit of the returned data
+
+        If the bit range is byte-aligned, the bytes are copied directly from
+        the memory space.  Otherwise, the bytes covering the bit range are
+        shifted into alignment
 
         :param section: The memory space section
         :type section: str
@@ -346,31 +636,85 @@ class MemoryManager(object):
         :rtype: bytearray
         """
 
-        byteorder = self.DEFAULTS['byteorder']
+        self.check_bit_bounds(section=section, addr=addr, nbits=nbits)
 
-        right_addr = (len(self.memspace[section]) * BITS_PER_BYTE - addr - 1)
-        left_addr = right_addr - nbits + 1
+        if nbits == 0:
+            return bytearray(0)
 
-        masks = self.calc_masks(addr, nbits)
-        left_byte, right_byte = self.calc_mem_slice_byte_bounds(addr, nbits)
+        if section in self.read_hooks:
+            self.run_read_hooks(section, addr, nbits)
 
-        with self.lock:
-            mem_slice = self.memspace[section][left_byte:right_byte]
+        left_byte, right_byte = self.calc_bit_slice_bounds(section, addr, nbits)
 
-        data = mem_slice.copy()
-        data_bits = int.from_bytes(data, byteorder=byteorder)
-        masks_bits = int.from_bytes(masks, byteorder=byteorder)
+        with self.locks[section].read:
+            data = self.memspace[section][left_byte:right_byte]
 
-        masked_bits = data_bits & masks_bits
-        data = bytearray(masked_bits.to_bytes(len(masks), byteorder=byteorder))
-        data = self.rshift_bits(data, addr % BITS_PER_BYTE, truncate=True)
+            if self.shared is not None:
+                data = bytearray(data)
 
-        data_len = nbits // BITS_PER_BYTE
+        return self.align_bits(data, addr, nbits)
 
-        if nbits % BITS_PER_BYTE > 0:
-            data_len += 1
+    def read_bits(self, section, addr, nbits):
+        """
+        Get a range of bits, as `get_bits()`, with the section lock already held
+
+        The bit range is assumed to have already been bounds checked, and no
+        read hooks are called
+
+        :param section: The memory space section
+        :type section: str
+        :param addr: The start bit address in the bits memory space section
+        :type addr: int
+        :param nbits: The number of bits to get offset from start address
+        :type nbits: int
+        :returns: The bits
+        :rtype: bytearray
+        """
+
+        if nbits == 0:
+            return bytearray(0)
+
+        left_byte, right_byte = self.calc_bit_slice_bounds(section, addr, nbits)
+        data = self.memspace[section][left_byte:right_byte]
+
+        if self.shared is not None:
+            data = bytearray(data)
+
+        return self.align_bits(data, addr, nbits)
+
+    def align_bits(self, data, addr, nbits):
+        """
+        Right-align the bytes covering a bit range, and mask off other bits
+
+        An unaligned bit range is shifted as a single int of the covering
+        bytes, rather than byte by byte.  In pure Python, the int conversion
+        and shift run in C, whereas a per-byte shift and merge loop is about
+        20x slower for the 250 bytes of a 2000 coil range.  See
+        `benchmarks/bench_bits.py`
+
+        :param data: The bytes covering the bit range.  This may be modified
+        :type data: bytearray
+        :param addr: The start bit address of the bit range
+        :type addr: int
+        :param nbits: The number of bits in the bit range, must be > 0
+        :type nbits: int
+        :returns: The bits
+        :rtype: bytearray
+        """
+
+        shift = addr % BITS_PER_BYTE
+        data_len = (nbits + BITS_PER_BYTE - 1) // BITS_PER_BYTE
 
-        data = data[(data_len * -1):]
+        if shift > 0:
+            bits = int.from_bytes(data, byteorder='big') >> shift
+            data = bytearray(bits.to_bytes(len(data), byteorder='big'))
+
+            if len(data) > data_len:
+                del data[0]
+
+        # Mask off any bits in the left-most byte beyond the bit range
+        if nbits % BITS_PER_BYTE > 0:
+            data[0] &= LOW_BIT_MASKS[nbits % BITS_PER_BYTE]
 
         return data
 
@@ -378,7 +722,14 @@ class MemoryManager(object):
         """
         Set an arbitrary range of bits in the bits memory space section
 
-        Note that the bit range is ordered from right-to-left
+        Note that the bit range is ordered from right-to-left.  The given data
+        are likewise right-aligned, so the right-most bit of the data is set
+        at addr.  Any bits in the data beyond nbits are ignored
+
+        If the bit range is byte-aligned, the bytes are copied directly into
+        the memory space, merging only a partial left-most byte.  Otherwise,
+        the data are shifted into alignment with the bytes covering the bit
+        range and merged with them
 
         :param section: The memory space section
         :type section: str
@@ -392,28 +743,164 @@ class MemoryManager(object):
         :rtype: bytearray
         """
 
-        byteorder = self.DEFAULTS['byteorder']
+        self.check_bit_bounds(section=section, addr=addr, nbits=nbits)
+
+        if nbits == 0:
+            return data
+
+        with self.locks[section].write:
+            self.write_bits(section, addr, nbits, data)
+
+        return data
+
+    def write_bits(self, section, addr, nbits, data):
+        """
+        Set a range of bits, as `set_bits()`, with the section lock already held
+
+        The bit range is assumed to have already been bounds checked.  As for
+        `align_bits()`, an unaligned bit range is shifted and merged as a
+        single int of the covering bytes, as this is faster in pure Python
+        than doing so byte by byte
+
+        :param section: The memory space section
+        :type section: str
+        :param addr: The start bit address in the bits memory space section
+        :type addr: int
+        :param nbits: The number of bits to set offset from start address,
+        must be > 0
+        :type nbits: int
+        :param data: The bit values to set in the bits memory space section
+        :type data: bytearray
+        """
 
-        right_addr = (len(self.memspace[section]) * BITS_PER_BYTE - addr - 1)
-        left_addr = right_addr - nbits + 1
+        shift = addr % BITS_PER_BYTE
+        data_len = (nbits + BITS_PER_BYTE - 1) // BITS_PER_BYTE
+        left_byte, right_byte = self.calc_bit_slice_bounds(section, addr, nbits)
+        mem = self.memspace[section]
 
-        masks = self.calc_masks(addr, nbits)
-        left_byte, right_byte = self.calc_mem_slice_byte_bounds(addr, nbits)
+        if shift == 0:
+            # Take the right-most bytes of the data, padding if it is short
+            if len(data) >= data_len:
+                patch = bytearray(data[-data_len:])
+            else:
+                patch = bytearray(data_len - len(data)) + data
 
-        with self.lock:
-            mem_slice = self.memspace[section][left_byte:right_byte]
+            mask = LOW_BIT_MASKS[nbits % BITS_PER_BYTE] if nbits % BITS_PER_BYTE > 0 else 0xff
 
-            data = self.lshift_bits(data, addr % BITS_PER_BYTE)
+            if mask != 0xff:
+                patch[0] = (mem[left_byte] & ~mask) | (patch[0] & mask)
 
-            mem_slice_bits = int.from_bytes(mem_slice, byteorder=byteorder)
-            data_bits = int.from_bytes(data, byteorder=byteorder)
-            masks_bits = int.from_bytes(masks, byteorder=byteorder)
+            mem[left_byte:right_byte] = patch
+        else:
+            mask = ((1 << nbits) - 1) << shift
+            bits = (int.from_bytes(data, byteorder='big') << shift) & mask
+            mem_bits = int.from_bytes(mem[left_byte:right_byte], byteorder='big')
+            mem_bits = (mem_bits & ~mask) | bits
+            mem[left_byte:right_byte] = mem_bits.to_bytes(right_byte - left_byte, byteorder='big')
 
-            patched_bits = data_bits & masks_bits
-            patched_bits = patched_bits | (mem_slice_bits & ~masks_bits)
-            patched_bytes = bytearray(patched_bits.to_bytes(len(masks), byteorder=byteorder))
+    def apply_writes(self, writes):
+        """
+        Apply a batch of writes, with a single lock acquisition per section
+
+        Each write is a (section, addr, nrefs, data) tuple, where nrefs is
+        the number of bits for the bits section, otherwise the number of
+        words.  All writes are bounds checked before any are applied, and
+        they are applied atomically, with the locks of all the sections
+        taken together, as for a transaction.  Within a words
+        section, runs of writes to adjacent words are coalesced into a single
+        slice assignment, unless any of the section's writes overlap, in
+        which case they are applied in the order given
+
+        :param writes: The writes
+        :type writes: list
+        :raises: IndexError if the bounds of a section would be exceeded
+        """
 
-            self.memspace[section][left_byte:right_byte] = patched_bytes
+        sections = {}
 
-        return data
+        for write in writes:
+            section, addr, nrefs, data = write
+
+            if section == 'bits':
+                self.check_bit_bounds(section=section, addr=addr, nbits=nrefs)
+            else:
+                self.check_bounds(section=section, addr=addr, nwords=nrefs)
+
+            sections.setdefault(section, []).append(write)
+
+        runs = {section: self.coalesce_writes(sections[section], self.get_section_word_len(section)) for section in sections if section != 'bits'}
+
+        with self.lock_sections(dict.fromkeys(sections, True)):
+            for section in sections:
+                if section == 'bits':
+                    for _, addr, nbits, data in sections[section]:
+                        if nbits > 0:
+                            self.write_bits(section, addr, nbits, data)
+                else:
+                    mem = self.memspace[section]
+
+                    for start, end, data in runs[section]:
+                        mem[start:end] = data
+
+    def coalesce_writes(self, writes, wlen):
+        """
+        Coalesce writes to adjacent words of a words section
+
+        :param writes: The (section, addr, nwords, data) writes
+        :type writes: list
+        :param wlen: The word length of the section
+        :type wlen: int
+        :returns: The (start, end, data) slice assignments, with the start
+        and end as byte offsets
+        :rtype: list
+        """
+
+        ordered = sorted(writes, key=lambda write: write[1])
+        runs = []
+        run_start = run_end = None
+        run_data = []
+
+        for section, addr, nwords, data in ordered:
+            if run_end is not None and addr < run_end:
+                # Overlapping writes must be applied in the order given
+                return [(addr * wlen, (addr + nwords) * wlen, data) for section, addr, nwords, data in writes]
+
+            if addr != run_end:
+                if run_data:
+                    runs.append((run_start * wlen, run_end * wlen, b''.join(run_data)))
+
+                run_start = addr
+                run_data = []
+
+            run_data.append(data)
+            run_end = addr + nwords
+
+        if run_data:
+            runs.append((run_start * wlen, run_end * wlen, b''.join(run_data)))
+
+        return runs
+
+    def calc_bit_slice_bounds(self, section, addr, nbits):
+        """
+        Calculate the memory slice byte bounds covered by the given bit range
+
+        This is as `calc_mem_slice_byte_bounds()`, except that the bounds are
+        given as non-negative offsets from the start of the section, and the
+        bit range is assumed to have already been bounds checked
+
+        :param section: The memory space section
+        :type section: str
+        :param addr: The start address of the bit range
+        :type addr: int
+        :param nbits: The number of bits in the bit range, must be > 0
+        :type nbits: int
+        :returns: The left and right byte addresses marking the bounds
+        :rtype: tuple of ints
+        """
+
+        section_len = len(self.memspace[section])
+        left_byte = section_len - 1 - (addr + nbits - 1) // BITS_PER_BYTE
+        right_byte = section_len - addr // BITS_PER_BYTE
+
+        return left_byte, right_byte
 
@@ -12,7 +12,7 @@ This module contains a fieldbus-specific class for simulating a Modbus PLC.
 """
 
 import logging
-import socket
+import asyncio
 
 from plcsimulator.BaseFieldbusModule import BaseFieldbusModule
 from plcsimulator.FieldbusMessage import FieldbusMessage
@@ -24,6 +24,10 @@ class ModbusModule(BaseFieldbusModule):
 
     DEFAULTS = {
         'min_msg_len': 12,
+        'max_msg_len': 260,
+        'mbap_header_len': 6,
+        'recv_buf_len': 4096,
+        'send_buf_len': 4096,
         'byte_nbits': 8,
         'bit_mem_section': 'bits',
         'word_nbytes': 2,
@@ -32,32 +36,38 @@ class ModbusModule(BaseFieldbusModule):
             '0x01': {
                 'name': 'read coil status',
                 'code': 0x01,
-                'base_addr': 00000
+                'base_addr': 00000,
+                'handler': 'service_read_coil_status_request'
             },
             '0x03': {
                 'name': 'read holding registers',
                 'code': 0x03,
-                'base_addr': 40000
+                'base_addr': 40000,
+                'handler': 'service_read_holding_registers_request'
             },
             '0x05': {
                 'name': 'force single coil',
                 'code': 0x05,
-                'base_addr': 00000
+                'base_addr': 00000,
+                'handler': 'service_force_single_coil_request'
             },
             '0x06': {
                 'name': 'preset single register',
                 'code': 0x06,
-                'base_addr': 40000
+                'base_addr': 40000,
+                'handler': 'service_preset_single_register_request'
             },
             '0x0f': {
                 'name': 'force multiple coils',
                 'code': 0x0f,
-                'base_addr': 00000
+                'base_addr': 00000,
+                'handler': 'service_force_multiple_coils_request'
             },
             '0x10': {
                 'name': 'preset multiple registers',
                 'code': 0x10,
-                'base_addr': 40000
+                'base_addr': 40000,
+                'handler': 'service_preset_multiple_registers_request'
             }
         },
         'exception_flag': 0x80,
@@ -75,57 +85,230 @@ class ModbusModule(BaseFieldbusModule):
         }
     }
 
-    def recv_request_fragment(self, request, nbytes):
+    def init(self, conf={}, memory_manager=None):
         """
-        Receive a fragment of an incoming message into the buffer
+        Initialise the Modbus PLC class instance
 
-        :param request: The fieldbus message buffer to receive the message on
-        :type request: plcsimulator.FieldbusMessage.FieldbusMessage
-        :param nbytes: The total required bytes of the whole message
+        In addition to the base class initialisation, the functions table is
+        built from the supported Modbus functions in the defaults, and any
+        per-module constants used when servicing requests are precomputed
+
+        :param conf: The class configuration section
+        :type conf: dict
+        :param memory_manager: The instantiated memory_manager object
+        :type memory_manager: plcsimulator.MemoryManager.MemoryManager
+        """
+
+        super().init(conf=conf, memory_manager=memory_manager)
+
+        # Whether debug logging is enabled is determined once, so that
+        # debug messages cost nothing to service requests when it is not
+        self.debug_logging = logging.getLogger().isEnabledFor(logging.DEBUG)
+
+        self.functions_table = {}
+        self.log_prefixes = {}
+
+        for function in self.DEFAULTS['functions'].values():
+            self.register_function(function['code'], function['name'], getattr(type(self), function['handler']))
+
+        self.unknown_handler = type(self).service_unknown_request
+        self.unknown_log_prefix = '{}: {}:'.format(self.id, 'Unknown or unsupported function')
+
+        # Per-module constants, used when servicing requests
+        for key in ['min_msg_len', 'max_msg_len', 'mbap_header_len', 'byte_nbits', 'bit_mem_section', 'word_nbytes', 'word_mem_section']:
+            setattr(self, key, self.DEFAULTS[key])
+
+        # Requests can also be dispatched directly, outside of a connection
+        self.init_connection()
+
+    def register_function(self, code, name, handler):
+        """
+        Register the handler for the given Modbus function code
+
+        The handler is called with this class instance and the request
+        message, and must return the response message.  As each client is
+        serviced by a copy of this class instance, the handler must be a
+        plain function (e.g. `ModbusModule.service_unknown_request`), rather
+        than a method bound to a particular instance
+
+        :param code: The Modbus function code
+        :type code: int
+        :param name: The Modbus function name, used in logging output
+        :type name: str
+        :param handler: The function to handle requests for this function code
+        :type handler: function
+        """
+
+        self.functions_table[code] = handler
+        self.log_prefixes[code] = '{}: {}:'.format(self.id, name)
+
+    def init_connection(self):
+        """
+        Initialise the per-connection state of this backend
+
+        Each connection has its own preallocated receive buffer.  Incoming
+        data is received directly into this buffer, and complete requests are
+        then split from it.  Any trailing partial request is retained in the
+        buffer until the remainder of the request has been received
+
+        Each connection also has its own preallocated send buffer, which
+        read responses are constructed in.  See `alloc_response()`
+        """
+
+        self.recv_buf = bytearray(self.DEFAULTS['recv_buf_len'])
+        self.recv_view = memoryview(self.recv_buf)
+        self.recv_len = 0
+
+        self.send_buf = bytearray(self.DEFAULTS['send_buf_len'])
+        self.send_view = memoryview(self.send_buf)
+        self.send_len = 0
+
+    def alloc_response(self, nbytes):
+        """
+        Allocate a response message from the connection's send buffer
+
+        The response's buffer is a view onto the next free nbytes of the send
+        buffer, so constructing the response doesn't allocate.  The send
+        buffer is reused for each set of requests received together, so the
+        response is only valid until the responses have been sent.  If there
+        isn't enough free space, a new buffer is allocated instead
+
+        :param nbytes: The length of the response in bytes
         :type nbytes: int
+        :returns: The response message
+        :rtype: plcsimulator.FieldbusMessage.FieldbusMessage
+        """
+
+        start = self.send_len
+        end = start + nbytes
+
+        if end > len(self.send_buf):
+            return FieldbusMessage(nbytes)
+
+        response = FieldbusMessage(0)
+        response.buf = self.send_view[start:end]
+        self.send_len = end
+
+        return response
+
+    def split_requests(self):
+        """
+        Split all complete request messages from the receive buffer
+
+        Requests are delimited by the Length field of their Modbus TCP/IP
+        (MBAP) header.  A client may pipeline several requests, so there can
+        be any number of complete requests in the receive buffer
+
+        :returns: The complete requests, in the order that they were received
+        :rtype: list of plcsimulator.FieldbusMessage.FieldbusMessage
+        :raises: ValueError if a request has an invalid length
+        """
+
+        requests = []
+        header_nbytes = self.mbap_header_len
+        start = 0
+
+        while self.recv_len - start >= header_nbytes:
+            # The Length field counts the bytes that follow it in the request
+            length = (self.recv_buf[start+4] << 8) | self.recv_buf[start+5]
+            msg_nbytes = header_nbytes + length
+
+            if msg_nbytes < self.min_msg_len or msg_nbytes > self.max_msg_len:
+                raise ValueError('Invalid request length (Length field = {} bytes)'.format(length))
+
+            end = start + msg_nbytes
+
+            if end > self.recv_len:
+                break
+
+            request = FieldbusMessage(0)
+            request.buf = self.recv_buf[start:end]
+            requests.append(request)
+            start = end
+
+        # Move any trailing partial request to the start of the buffer
+        if start > 0:
+            nbytes_left = self.recv_len - start
+            self.recv_buf[0:nbytes_left] = self.recv_buf[start:self.recv_len]
+            self.recv_len = nbytes_left
+
+        return requests
+
+    def get_requests(self):
+        """
+        Get the incoming request messages from a client over the socket
+
+        This blocks until at least one complete request has been received,
+        or the client has closed the connection
+
+        :returns: The complete requests.  This is empty if the client closed
+        the connection
+        :rtype: list of plcsimulator.FieldbusMessage.FieldbusMessage
         """
 
-        request.recv_fragment(self.conn, nbytes, flags=socket.MSG_WAITALL)
+        requests = self.split_requests()
 
-        # If request length is exactly zero, this might be the client closing
-        # the connection.  This is not an error
-        if len(request.buf) > 0 and len(request.buf) < nbytes:
-            raise ValueError('Request length too short (received {} bytes, expected {} bytes)'.format(len(request.buf), nbytes))
+        while len(requests) == 0:
+            nbytes = self.conn.recv_into(self.recv_view[self.recv_len:])
 
-        return request
+            # If received length is exactly zero, this might be the client
+            # closing the connection.  This is not an error
+            if nbytes == 0:
+                if self.recv_len > 0:
+                    raise ValueError('Request length too short (received {} bytes)'.format(self.recv_len))
+                break
 
-    def get_request(self):
+            self.recv_len += nbytes
+            requests = self.split_requests()
+
+        return requests
+
+    async def get_requests_async(self, reader):
         """
-        Get an incoming request message from a client over the socket
+        Get the incoming request messages from a client over an asyncio stream
+
+        This is the coroutine equivalent of `get_requests()`.  If the backend
+        has an idle timeout, then each read is bounded by that time
+
+        :param reader: The stream to read the requests from
+        :type reader: asyncio.StreamReader
+        :returns: The complete requests.  This is empty if the client closed
+        the connection
+        :rtype: list of plcsimulator.FieldbusMessage.FieldbusMessage
+        :raises: asyncio.TimeoutError if the idle timeout expires
         """
 
-        request = FieldbusMessage(0)
+        requests = self.split_requests()
 
-        # Get the minimum message that is common to all Modbus requests
-        msg_nbytes = self.DEFAULTS['min_msg_len']
-        self.recv_request_fragment(request, msg_nbytes)
+        while len(requests) == 0:
+            if self.idle_timeout is None:
+                fragment = await reader.read(len(self.recv_buf) - self.recv_len)
+            else:
+                fragment = await asyncio.wait_for(reader.read(len(self.recv_buf) - self.recv_len), self.idle_timeout)
+            nbytes = len(fragment)
 
-        if len(request.buf) >= msg_nbytes:
-            # For variable length write requests, we also need to read the data
-            # payload.  This consists of the data length byte and the data
-            if request.buf[7] in [self.DEFAULTS['functions']['0x0f']['code'], self.DEFAULTS['functions']['0x10']['code']]:
-                msg_nbytes += 1
-                self.recv_request_fragment(request, msg_nbytes)
-                data_nbytes = request.buf[12]
+            # If received length is exactly zero, this might be the client
+            # closing the connection.  This is not an error
+            if nbytes == 0:
+                if self.recv_len > 0:
+                    raise ValueError('Request length too short (received {} bytes)'.format(self.recv_len))
+                break
 
-                msg_nbytes += data_nbytes
-                self.recv_request_fragment(request, msg_nbytes)
+            self.recv_buf[self.recv_len:self.recv_len+nbytes] = fragment
+            self.recv_len += nbytes
+            requests = self.split_requests()
 
-        return request
+        return requests
 
     def process_request(self):
         """
-        Process an incoming request message
+        Process the incoming request messages
 
-        The request is passed to a function to handle the Modbus function
-        contained in the request message
+        Each request is passed to a function to handle the Modbus function
+        contained in the request message.  The responses to all requests
+        received together are sent to the client in a single write
 
-        Note that the request may be zero-length if the client is closing
+        Note that no requests may be received if the client is closing
         the socket.  This is not an error.  In this case, return non-zero
         to signal that this backend should close this end of the socket
 
@@ -134,28 +317,86 @@ class ModbusModule(BaseFieldbusModule):
         """
 
         retval = 0
-        request = self.get_request()
+        requests = self.get_requests()
 
-        if len(request.buf) == 0:           # Client closing socket
+        if len(requests) == 0:              # Client closing socket
             retval = -1
         else:
-            if request.buf[7] == self.DEFAULTS['functions']['0x01']['code']:
-                self.service_read_coil_status_request(request)
-            elif request.buf[7] == self.DEFAULTS['functions']['0x03']['code']:
-                self.service_read_holding_registers_request(request)
-            elif request.buf[7] == self.DEFAULTS['functions']['0x05']['code']:
-                self.service_force_single_coil_request(request)
-            elif request.buf[7] == self.DEFAULTS['functions']['0x06']['code']:
-                self.service_preset_single_register_request(request)
-            elif request.buf[7] == self.DEFAULTS['functions']['0x0f']['code']:
-                self.service_force_multiple_coils_request(request)
-            elif request.buf[7] == self.DEFAULTS['functions']['0x10']['code']:
-                self.service_preset_multiple_registers_request(request)
-            else:
-                self.service_unknown_request(request)
+            self.conn.sendall(self.dispatch_requests(requests))
 
         return retval
 
+    async def process_request_async(self, reader, writer):
+        """
+        Process the incoming request messages from an asyncio stream
+
+        This is the coroutine equivalent of `process_request()`
+
+        :param reader: The stream to read the requests from
+        :type reader: asyncio.StreamReader
+        :param writer: The stream to write the responses to
+        :type writer: asyncio.StreamWriter
+        :returns: Zero if a valid request was received or non-zero otherwise
+        :rtype: int
+        """
+
+        retval = 0
+        requests = await self.get_requests_async(reader)
+
+        if len(requests) == 0:              # Client closing socket
+            retval = -1
+        else:
+            # The transport may keep a reference to the data until it is
+            # sent, so it mustn't be a view onto the reused send buffer
+            writer.write(bytes(self.dispatch_requests(requests)))
+            await writer.drain()
+
+        return retval
+
+    def dispatch_requests(self, requests):
+        """
+        Dispatch each of the given requests, in order
+
+        :param requests: The incoming request messages
+        :type requests: list of plcsimulator.FieldbusMessage.FieldbusMessage
+        :returns: The concatenated responses to return to the client
+        :rtype: bytearray, bytes or memoryview
+        """
+
+        # The responses to any earlier requests have been sent
+        self.send_len = 0
+
+        if len(requests) == 1:
+            responses = self.dispatch_request(requests[0]).buf
+        else:
+            responses = b''.join([self.dispatch_request(request).buf for request in requests])
+
+        return responses
+
+    def dispatch_request(self, request):
+        """
+        Pass the request to the function that handles its Modbus function
+
+        The handler is looked up by function code in the functions table.
+        For a fleet of PLCs, the memory space of the PLC addressed by the
+        connection's port and the request's unit identifier is resolved first
+
+        :param request: The incoming request message
+        :type request: plcsimulator.FieldbusMessage.FieldbusMessage
+        :returns: The response to return to the client
+        :rtype: plcsimulator.FieldbusMessage.FieldbusMessage
+        """
+
+        if self.fleet is not None:
+            self.memory_manager = self.fleet.get_memory_manager(self.port, request.buf[6])
+
+            if self.memory_manager is None:
+                return self.service_unknown_unit_request(request)
+
+        handler = self.functions_table.get(request.buf[7], self.unknown_handler)
+
+        return handler(self, request)
+
     def construct_exception_response(self, request, excode):
         """
         Construct a response message to provide details of an exception
@@ -179,7 +420,7 @@ class ModbusModule(BaseFieldbusModule):
         Handle a read-coil-status request
 
         * Read the specified coils from this PLC's memory space.
-        * Return the Modbus response to the client.
+        * Construct the Modbus response to return to the client.
         * The response contains the values of the specified coils.
         * Return a Modbus exception response if the request was invalid.
 
@@ -189,8 +430,10 @@ class ModbusModule(BaseFieldbusModule):
         :rtype: plcsimulator.FieldbusMessage.FieldbusMessage
         """
 
-        log_prefix = '{}: {}:'.format(self.id, self.DEFAULTS['functions']['0x01']['name'])
-        logging.debug('{}: request: {}'.format(log_prefix, request.buf))
+        log_prefix = self.log_prefixes[0x01]
+
+        if self.debug_logging:
+            logging.debug('{} request: {}'.format(log_prefix, request.buf))
 
         addr = request.make_word(8, 9)
         nbits = request.make_word(10, 11)
@@ -198,24 +441,25 @@ class ModbusModule(BaseFieldbusModule):
         try:
             # The memory manager bits section is ordered right-to-left,
             # so we have to reverse the data payload in the response
-            data = self.memory_manager.get_bits(section=self.DEFAULTS['bit_mem_section'], addr=addr, nbits=nbits)
+            data = self.memory_manager.get_bits(section=self.bit_mem_section, addr=addr, nbits=nbits)
             data.reverse()
-            data_nbytes = nbits // self.DEFAULTS['byte_nbits'] + 1 if nbits % self.DEFAULTS['byte_nbits'] > 0 else nbits // self.DEFAULTS['byte_nbits']
+            data_nbytes = nbits // self.byte_nbits + 1 if nbits % self.byte_nbits > 0 else nbits // self.byte_nbits
 
-            logging.debug('{} addr = {}, nbits = {}, data_nbytes = {}, data = {}'.format(log_prefix, addr, nbits, data_nbytes, data))
+            if self.debug_logging:
+                logging.debug('{} addr = {}, nbits = {}, data_nbytes = {}, data = {}'.format(log_prefix, addr, nbits, data_nbytes, data))
 
             response = FieldbusMessage(9 + data_nbytes)
             response.buf[0:8] = request.buf[0:8]
             response.buf[8] = data_nbytes
             response.buf[9:9+data_nbytes+1] = data
-            response.buf[5] = len(response.buf[6:])
+            response.buf[5] = len(response.buf) - 6
         except IndexError as e:
             # Request exceeds bounds of the memory space.  Inform the client
             logging.error(e)
             response = self.construct_exception_response(request, 'illegal_data_address')
 
-        logging.debug('{} response: {}'.format(log_prefix, response.buf))
-        self.conn.sendall(response.buf)
+        if self.debug_logging:
+            logging.debug('{} response: {}'.format(log_prefix, response.buf))
 
         return response
 
@@ -224,7 +468,7 @@ class ModbusModule(BaseFieldbusModule):
         Handle a read-holding-registers request
 
         * Read the specified registers from this PLC's memory space.
-        * Return the Modbus response to the client.
+        * Construct the Modbus response to return to the client.
         * The response contains the values of the specified registers.
         * Return a Modbus exception response if the request was invalid.
 
@@ -234,30 +478,35 @@ class ModbusModule(BaseFieldbusModule):
         :rtype: plcsimulator.FieldbusMessage.FieldbusMessage
         """
 
-        log_prefix = '{}: {}:'.format(self.id, self.DEFAULTS['functions']['0x03']['name'])
-        logging.debug('{}: request: {}'.format(log_prefix, request.buf))
+        log_prefix = self.log_prefixes[0x03]
+
+        if self.debug_logging:
+            logging.debug('{} request: {}'.format(log_prefix, request.buf))
 
         addr = request.make_word(8, 9)
         nwords = request.make_word(10, 11)
 
         try:
-            data = self.memory_manager.get_data(section=self.DEFAULTS['word_mem_section'], addr=addr, nwords=nwords)
-            data_nbytes = nwords * self.DEFAULTS['word_nbytes']
+            # The data are copied straight from the memory space into the
+            # response, which is allocated from the connection's send buffer
+            self.memory_manager.check_bounds(section=self.word_mem_section, addr=addr, nwords=nwords)
+            data_nbytes = nwords * self.word_nbytes
+            response = self.alloc_response(9 + data_nbytes)
+            self.memory_manager.get_data_into(section=self.word_mem_section, addr=addr, nwords=nwords, out=response.buf, offset=9)
 
-            logging.debug('{} addr = {}, nwords = {}, data_nbytes = {}, data = {}'.format(log_prefix, addr, nwords, data_nbytes, data))
+            if self.debug_logging:
+                logging.debug('{} addr = {}, nwords = {}, data_nbytes = {}, data = {}'.format(log_prefix, addr, nwords, data_nbytes, bytes(response.buf[9:])))
 
-            response = FieldbusMessage(9 + data_nbytes)
             response.buf[0:8] = request.buf[0:8]
             response.buf[8] = data_nbytes
-            response.buf[9:9+data_nbytes+1] = data
-            response.buf[5] = len(response.buf[6:])
+            response.buf[5] = len(response.buf) - 6
         except IndexError as e:
             # Request exceeds bounds of the memory space.  Inform the client
             logging.error(e)
             response = self.construct_exception_response(request, 'illegal_data_address')
 
-        logging.debug('{} response: {}'.format(log_prefix, response.buf))
-        self.conn.sendall(response.buf)
+        if self.debug_logging:
+            logging.debug('{} response: {}'.format(log_prefix, bytes(response.buf)))
 
         return response
 
@@ -266,7 +515,7 @@ class ModbusModule(BaseFieldbusModule):
         Handle a force-single-coil request
 
         * Write the specified coil value to this PLC's memory space.
-        * Return the Modbus response to the client.
+        * Construct the Modbus response to return to the client.
         * Return a Modbus exception response if the request was invalid.
 
         :param request: The incoming request message
@@ -275,8 +524,10 @@ class ModbusModule(BaseFieldbusModule):
         :rtype: plcsimulator.FieldbusMessage.FieldbusMessage
         """
 
-        log_prefix = '{}: {}:'.format(self.id, self.DEFAULTS['functions']['0x05']['name'])
-        logging.debug('{}: request: {}'.format(log_prefix, request.buf))
+        log_prefix = self.log_prefixes[0x05]
+
+        if self.debug_logging:
+            logging.debug('{} request: {}'.format(log_prefix, request.buf))
 
         # As this is a request to write to a single coil, the request is a
         # fixed length.  Instead of the word following the address containing
@@ -289,21 +540,22 @@ class ModbusModule(BaseFieldbusModule):
         data.reverse()
 
         try:
-            self.memory_manager.set_bits(section=self.DEFAULTS['bit_mem_section'], addr=addr, nbits=nbits, data=data)
+            self.memory_manager.set_bits(section=self.bit_mem_section, addr=addr, nbits=nbits, data=data)
 
-            logging.debug('{} addr = {}, nbits = {}, data_nbytes = {}, data = {}'.format(log_prefix, addr, nbits, data_nbytes, data))
+            if self.debug_logging:
+                logging.debug('{} addr = {}, nbits = {}, data_nbytes = {}, data = {}'.format(log_prefix, addr, nbits, data_nbytes, data))
 
             # A successful response is an echo of the request
             response = FieldbusMessage(len(request.buf))
             response.buf = request.buf.copy()
-            response.buf[5] = len(response.buf[6:])
+            response.buf[5] = len(response.buf) - 6
         except IndexError as e:
             # Request exceeds bounds of the memory space.  Inform the client
             logging.error(e)
             response = self.construct_exception_response(request, 'illegal_data_address')
 
-        logging.debug('{} response: {}'.format(log_prefix, response.buf))
-        self.conn.sendall(response.buf)
+        if self.debug_logging:
+            logging.debug('{} response: {}'.format(log_prefix, response.buf))
 
         return response
 
@@ -312,7 +564,7 @@ class ModbusModule(BaseFieldbusModule):
         Handle a preset-single-register request
 
         * Write the specified register value to this PLC's memory space.
-        * Return the Modbus response to the client.
+        * Construct the Modbus response to return to the client.
         * Return a Modbus exception response if the request was invalid.
 
         :param request: The incoming request message
@@ -321,8 +573,10 @@ class ModbusModule(BaseFieldbusModule):
         :rtype: plcsimulator.FieldbusMessage.FieldbusMessage
         """
 
-        log_prefix = '{}: {}:'.format(self.id, self.DEFAULTS['functions']['0x06']['name'])
-        logging.debug('{}: request: {}'.format(log_prefix, request.buf))
+        log_prefix = self.log_prefixes[0x06]
+
+        if self.debug_logging:
+            logging.debug('{} request: {}'.format(log_prefix, request.buf))
 
         # As this is a request to write to a single register, the request is a
         # fixed length
@@ -332,21 +586,22 @@ class ModbusModule(BaseFieldbusModule):
         data = request.buf[10:10+data_nbytes]
 
         try:
-            self.memory_manager.set_data(section=self.DEFAULTS['word_mem_section'], addr=addr, nwords=nwords, data=data)
+            self.memory_manager.set_data(section=self.word_mem_section, addr=addr, nwords=nwords, data=data)
 
-            logging.debug('{} addr = {}, nwords = {}, data_nbytes = {}, data = {}'.format(log_prefix, addr, nwords, data_nbytes, data))
+            if self.debug_logging:
+                logging.debug('{} addr = {}, nwords = {}, data_nbytes = {}, data = {}'.format(log_prefix, addr, nwords, data_nbytes, data))
 
             # A successful response is an echo of the request
             response = FieldbusMessage(len(request.buf))
             response.buf = request.buf.copy()
-            response.buf[5] = len(response.buf[6:])
+            response.buf[5] = len(response.buf) - 6
         except IndexError as e:
             # Request exceeds bounds of the memory space.  Inform the client
             logging.error(e)
             response = self.construct_exception_response(request, 'illegal_data_address')
 
-        logging.debug('{} response: {}'.format(log_prefix, response.buf))
-        self.conn.sendall(response.buf)
+        if self.debug_logging:
+            logging.debug('{} response: {}'.format(log_prefix, response.buf))
 
         return response
 
@@ -355,7 +610,7 @@ class ModbusModule(BaseFieldbusModule):
         Handle a force-multiple-coils request
 
         * Write the specified coil values to this PLC's memory space.
-        * Return the Modbus response to the client.
+        * Construct the Modbus response to return to the client.
         * Return a Modbus exception response if the request was invalid.
 
         :param request: The incoming request message
@@ -364,8 +619,10 @@ class ModbusModule(BaseFieldbusModule):
         :rtype: plcsimulator.FieldbusMessage.FieldbusMessage
         """
 
-        log_prefix = '{}: {}:'.format(self.id, self.DEFAULTS['functions']['0x0f']['name'])
-        logging.debug('{}: request: {}'.format(log_prefix, request.buf))
+        log_prefix = self.log_prefixes[0x0f]
+
+        if self.debug_logging:
+            logging.debug('{} request: {}'.format(log_prefix, request.buf))
 
         # The memory manager bits section is ordered right-to-left,
         # so we have to reverse the data payload from the request
@@ -376,20 +633,21 @@ class ModbusModule(BaseFieldbusModule):
         data.reverse()
 
         try:
-            self.memory_manager.set_bits(section=self.DEFAULTS['bit_mem_section'], addr=addr, nbits=nbits, data=data)
+            self.memory_manager.set_bits(section=self.bit_mem_section, addr=addr, nbits=nbits, data=data)
 
-            logging.debug('{} addr = {}, nbits = {}, data_nbytes = {}, data = {}'.format(log_prefix, addr, nbits, data_nbytes, data))
+            if self.debug_logging:
+                logging.debug('{} addr = {}, nbits = {}, data_nbytes = {}, data = {}'.format(log_prefix, addr, nbits, data_nbytes, data))
 
             response = FieldbusMessage(12)
             response.buf[0:12] = request.buf[0:12]
-            response.buf[5] = len(response.buf[6:])
+            response.buf[5] = len(response.buf) - 6
         except IndexError as e:
             # Request exceeds bounds of the memory space.  Inform the client
             logging.error(e)
             response = self.construct_exception_response(request, 'illegal_data_address')
 
-        logging.debug('{} response: {}'.format(log_prefix, response.buf))
-        self.conn.sendall(response.buf)
+        if self.debug_logging:
+            logging.debug('{} response: {}'.format(log_prefix, response.buf))
 
         return response
 
@@ -398,7 +656,7 @@ class ModbusModule(BaseFieldbusModule):
         Handle a preset-multiple-registers request
 
         * Write the specified register values to this PLC's memory space.
-        * Return the Modbus response to the client.
+        * Construct the Modbus response to return to the client.
         * Return a Modbus exception response if the request was invalid.
 
         :param request: The incoming request message
@@ -407,8 +665,10 @@ class ModbusModule(BaseFieldbusModule):
         :rtype: plcsimulator.FieldbusMessage.FieldbusMessage
         """
 
-        log_prefix = '{}: {}:'.format(self.id, self.DEFAULTS['functions']['0x10']['name'])
-        logging.debug('{}: request: {}'.format(log_prefix, request.buf))
+        log_prefix = self.log_prefixes[0x10]
+
+        if self.debug_logging:
+            logging.debug('{} request: {}'.format(log_prefix, request.buf))
 
         addr = request.make_word(8, 9)
         nwords = request.make_word(10, 11)
@@ -416,20 +676,41 @@ class ModbusModule(BaseFieldbusModule):
         data = request.buf[13:13+data_nbytes+1]
 
         try:
-            self.memory_manager.set_data(section=self.DEFAULTS['word_mem_section'], addr=addr, nwords=nwords, data=data)
+            self.memory_manager.set_data(section=self.word_mem_section, addr=addr, nwords=nwords, data=data)
 
-            logging.debug('{} addr = {}, nwords = {}, data_nbytes = {}, data = {}'.format(log_prefix, addr, nwords, data_nbytes, data))
+            if self.debug_logging:
+                logging.debug('{} addr = {}, nwords = {}, data_nbytes = {}, data = {}'.format(log_prefix, addr, nwords, data_nbytes, data))
 
             response = FieldbusMessage(12)
             response.buf[0:12] = request.buf[0:12]
-            response.buf[5] = len(response.buf[6:])
+            response.buf[5] = len(response.buf) - 6
         except IndexError as e:
             # Request exceeds bounds of the memory space.  Inform the client
             logging.error(e)
             response = self.construct_exception_response(request, 'illegal_data_address')
 
-        logging.debug('{} response: {}'.format(log_prefix, response.buf))
-        self.conn.sendall(response.buf)
+        if self.debug_logging:
+            logging.debug('{} response: {}'.format(log_prefix, response.buf))
+
+        return response
+
+    def service_unknown_unit_request(self, request):
+        """
+        Handle a request for a unit that isn't in the fleet
+
+        * Construct a Modbus exception response, as a gateway would if the
+          target device didn't respond.
+
+        :param request: The incoming request message
+        :type request: plcsimulator.FieldbusMessage.FieldbusMessage
+        :returns: The response to return to the client
+        :rtype: plcsimulator.FieldbusMessage.FieldbusMessage
+        """
+
+        logging.error('{}: Unknown unit: port = {}, unit = {}'.format(self.id, self.port, request.buf[6]))
+
+        response = self.construct_exception_response(request, 'mbp_gw_device_no_response')
+        response.buf[5] = len(response.buf) - 6
 
         return response
 
@@ -437,7 +718,7 @@ class ModbusModule(BaseFieldbusModule):
         """
         Handle an unknown request
 
-        * Return a Modbus exception response.
+        * Construct a Modbus exception response.
 
         :param request: The incoming request message
         :type request: plcsimulator.FieldbusMessage.FieldbusMessage
@@ -445,13 +726,11 @@ class ModbusModule(BaseFieldbusModule):
         :rtype: plcsimulator.FieldbusMessage.FieldbusMessage
         """
 
-        log_prefix = '{}: {}:'.format(self.id, 'Unknown or unsupported function')
-        logging.error('{} function = {:#04x}'.format(log_prefix, request.buf[7]))
+        logging.error('{} function = {:#04x}'.format(self.unknown_log_prefix, request.buf[7]))
 
         # Unknown or unsupported function.  Inform the client
         response = self.construct_exception_response(request, 'illegal_function')
-        response.buf[5] = len(response.buf[6:])
-        self.conn.sendall(response.buf)
+        response.buf[5] = len(response.buf) - 6
 
         return response
 
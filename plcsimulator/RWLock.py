@@ -0,0 +1,194 @@
+###############################################################################
+# Project: PLC Simulator
+# Purpose: Class to encapsulate a reader/writer lock
+# Author:  Paul M. Breen
+# Date:    2026-10-16
+###############################################################################
+
+"""
+PLC simulator reader/writer lock module
+
+This module contains the reader/writer lock class.  It provides:
+
+* Shared locking for readers, so that concurrent readers don't block each
+  other.
+* Exclusive locking for writers.  Waiting writers take precedence over new
+  readers, so that writers are not starved by a steady stream of readers.
+* Contention counters, so that the time spent waiting for the lock can be
+  monitored.
+"""
+
+import threading
+import time
+
+class LockGuard(object):
+    """
+    Context manager that acquires and releases a lock using the given functions
+    """
+
+    def __init__(self, acquire, release):
+        """
+        Constructor
+
+        :param acquire: The function to acquire the lock
+        :type acquire: function
+        :param release: The function to release the lock
+        :type release: function
+        """
+
+        self.acquire = acquire
+        self.release = release
+
+    def __enter__(self):
+        self.acquire()
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+class RWLock(object):
+    """
+    Reader/writer lock for the PLC simulator
+
+    The lock can be used as a context manager via its `read` and `write`
+    attributes:
+
+      with lock.read:
+          ...
+
+      with lock.write:
+          ...
+    """
+
+    def __init__(self):
+        """
+        Constructor
+        """
+
+        self.mutex = threading.Lock()
+        self.cond = threading.Condition(self.mutex)
+        self.nreaders = 0
+        self.writer = False
+        self.nwriters_waiting = 0
+        self.stats = {
+            'read': self.init_stats(),
+            'write': self.init_stats()
+        }
+
+        self.read = LockGuard(self.acquire_read, self.release_read)
+        self.write = LockGuard(self.acquire_write, self.release_write)
+
+    def init_stats(self):
+        """
+        Initialise the contention counters for one type of lock access
+
+        :returns: The contention counters
+        :rtype: dict
+        """
+
+        return {'acquisitions': 0, 'contentions': 0, 'wait_time': 0.0, 'max_wait_time': 0.0}
+
+    def update_stats(self, stats, wait_time):
+        """
+        Update the given contention counters for a contended acquisition
+
+        :param stats: The contention counters
+        :type stats: dict
+        :param wait_time: The time (s) spent waiting to acquire the lock
+        :type wait_time: float
+        """
+
+        stats['contentions'] += 1
+        stats['wait_time'] += wait_time
+
+        if wait_time > stats['max_wait_time']:
+            stats['max_wait_time'] = wait_time
+
+    def acquire_read(self):
+        """
+        Acquire the lock for reading
+
+        This blocks while a writer holds, or is waiting for, the lock
+        """
+
+        with self.mutex:
+            if self.writer or self.nwriters_waiting > 0:
+                t0 = time.perf_counter()
+
+                while self.writer or self.nwriters_waiting > 0:
+                    self.cond.wait()
+
+                self.update_stats(self.stats['read'], time.perf_counter() - t0)
+
+            self.stats['read']['acquisitions'] += 1
+            self.nreaders += 1
+
+    def release_read(self):
+        """
+        Release the lock for reading
+        """
+
+        with self.mutex:
+            self.nreaders -= 1
+
+            if self.nreaders == 0:
+                self.cond.notify_all()
+
+    def acquire_write(self):
+        """
+        Acquire the lock for writing
+
+        This blocks while any reader or another writer holds the lock
+        """
+
+        with self.mutex:
+            if self.writer or self.nreaders > 0:
+                t0 = time.perf_counter()
+                self.nwriters_waiting += 1
+
+                while self.writer or self.nreaders > 0:
+                    self.cond.wait()
+
+                self.nwriters_waiting -= 1
+                self.update_stats(self.stats['write'], time.perf_counter() - t0)
+
+            self.stats['write']['acquisitions'] += 1
+            self.writer = True
+
+    def release_write(self):
+        """
+        Release the lock for writing
+        """
+
+        with self.mutex:
+            self.writer = False
+            self.cond.notify_all()
+
+    def get_stats(self):
+        """
+        Get a snapshot of the contention counters
+
+        For each of read and write access, the counters are the total number
+        of acquisitions, the number of those that had to wait for the lock,
+        and the total and maximum time (s) spent waiting
+
+        :returns: The contention counters, keyed by 'read' and 'write'
+        :rtype: dict
+        """
+
+        with self.mutex:
+            stats = {k: v.copy() for k, v in self.stats.items()}
+
+        return stats
+
+    def reset_stats(self):
+        """
+        Reset the contention counters
+        """
+
+        with self.mutex:
+            self.stats = {
+                'read': self.init_stats(),
+                'write': self.init_stats()
+            }
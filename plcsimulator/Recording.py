@@ -0,0 +1,271 @@
+###############################################################################
+# Project: PLC Simulator
+# Purpose: Class to encapsulate a recording of timestamped memory space data
+# Author:  Paul M. Breen
+# Date:    2026-10-16
+###############################################################################
+
+"""
+PLC simulator recording module
+
+This module contains the recording class.  It manages:
+
+* Memory-mapping a recording file, so that a recording of any size can be
+  replayed without reading it into memory.
+* Finding the latest record at or before a given time.
+* Writing recording files, including converting them from CSV files.
+
+A recording file is a header, followed by fixed-length records.  All values
+are big-endian.  The header is:
+
+* The magic bytes `PLCR`.
+* The format version (unsigned 16-bit).
+* The word length in bytes (unsigned 16-bit).
+* The number of words in each record (unsigned 32-bit).
+* 4 reserved bytes.
+
+Each record is a timestamp in seconds (64-bit float), followed by the raw
+data of each word.  The timestamps must not decrease.
+
+A CSV file, where the first column is the timestamp and each remaining
+column is a word value, can be converted to a recording file by running this
+module:
+
+```bash
+$ python -m plcsimulator.Recording trace.csv trace.plcr --wlen 2
+```
+"""
+
+import argparse
+import bisect
+import csv
+import mmap
+import struct
+
+from plcsimulator import PROGNAME
+
+BITS_PER_BYTE = 8
+
+class Recording(object):
+    """
+    Memory-mapped recording for the PLC simulator
+
+    Indexing the recording gives the timestamp of each record, so the
+    recording can be searched with the `bisect` module
+    """
+
+    DEFAULTS = {
+        'magic': b'PLCR',
+        'version': 1,
+        'header': struct.Struct('>4sHHI4x'),
+        'timestamp': struct.Struct('>d'),
+        'wlens': [1, 2, 4, 8]
+    }
+
+    def __init__(self, path):
+        """
+        Constructor
+
+        :param path: The path of the recording file
+        :type path: str
+        :raises: ValueError if the file isn't a valid recording
+        """
+
+        self.path = path
+
+        with open(path, 'rb') as f:
+            try:
+                self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise ValueError("Recording file is empty: {}".format(path))
+
+        header = self.DEFAULTS['header']
+
+        if len(self.mm) < header.size:
+            raise ValueError("Recording file is too short for its header: {}".format(path))
+
+        magic, version, self.wlen, self.nwords = header.unpack_from(self.mm, 0)
+
+        if magic != self.DEFAULTS['magic']:
+            raise ValueError("Not a recording file: {}".format(path))
+
+        if version != self.DEFAULTS['version']:
+            raise ValueError("Unsupported recording file version: {}: {}".format(path, version))
+
+        self.header_len = header.size
+        self.row_len = self.wlen * self.nwords
+        self.record_len = self.DEFAULTS['timestamp'].size + self.row_len
+        self.nrecords = (len(self.mm) - self.header_len) // self.record_len
+        self.view = memoryview(self.mm)
+        self.unpack_timestamp = self.DEFAULTS['timestamp'].unpack_from
+
+        if self.nrecords == 0:
+            raise ValueError("Recording file has no records: {}".format(path))
+
+    def __len__(self):
+        return self.nrecords
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.nrecords
+
+        if not 0 <= index < self.nrecords:
+            raise IndexError("Recording index out of range: {}".format(index))
+
+        return self.unpack_timestamp(self.mm, self.header_len + index * self.record_len)[0]
+
+    def get_row(self, index):
+        """
+        Get the data of the given record
+
+        The data are a view onto the memory-mapped file, so aren't copied
+
+        :param index: The record index
+        :type index: int
+        :returns: The data
+        :rtype: memoryview
+        """
+
+        offset = self.header_len + index * self.record_len + self.DEFAULTS['timestamp'].size
+
+        return self.view[offset:offset + self.row_len]
+
+    def find(self, timestamp, lo=0):
+        """
+        Find the latest record at or before the given time
+
+        :param timestamp: The time
+        :type timestamp: float
+        :param lo: The index of a record known to be at or before the time,
+        from which to start the search
+        :type lo: int
+        :returns: The record index, or -1 if all records are after the time
+        :rtype: int
+        """
+
+        return bisect.bisect_right(self, timestamp, lo) - 1
+
+    def close(self):
+        """
+        Close the recording
+        """
+
+        self.view.release()
+        self.mm.close()
+
+    @classmethod
+    def write(cls, path, wlen, nwords, records):
+        """
+        Write a recording file
+
+        Values are wrapped to the word length, so negative values are
+        stored as two's complement
+
+        :param path: The path of the recording file
+        :type path: str
+        :param wlen: The word length in bytes
+        :type wlen: int
+        :param nwords: The number of words in each record
+        :type nwords: int
+        :param records: The records, each a (timestamp, values) pair
+        :type records: iterable
+        :raises: ValueError if the records are invalid
+        :returns: The number of records written
+        :rtype: int
+        """
+
+        if wlen not in cls.DEFAULTS['wlens']:
+            raise ValueError("Invalid recording word length: {}".format(wlen))
+
+        modulus = 2**(wlen * BITS_PER_BYTE)
+        pack_timestamp = cls.DEFAULTS['timestamp'].pack
+        last_timestamp = None
+        nrecords = 0
+
+        with open(path, 'wb') as f:
+            f.write(cls.DEFAULTS['header'].pack(cls.DEFAULTS['magic'], cls.DEFAULTS['version'], wlen, nwords))
+
+            for timestamp, values in records:
+                if len(values) != nwords:
+                    raise ValueError("Recording record has {} values, expected {}".format(len(values), nwords))
+
+                if last_timestamp is not None and timestamp < last_timestamp:
+                    raise ValueError("Recording timestamps must not decrease: {} < {}".format(timestamp, last_timestamp))
+
+                f.write(pack_timestamp(timestamp))
+                f.write(b''.join([(int(value) % modulus).to_bytes(wlen, byteorder='big') for value in values]))
+                last_timestamp = timestamp
+                nrecords += 1
+
+        return nrecords
+
+    @classmethod
+    def convert_csv(cls, csv_path, path, wlen):
+        """
+        Convert a CSV file to a recording file
+
+        The first column of each row is the timestamp in seconds, and each
+        remaining column is a word value.  A header row is skipped
+
+        :param csv_path: The path of the CSV file
+        :type csv_path: str
+        :param path: The path of the recording file
+        :type path: str
+        :param wlen: The word length in bytes
+        :type wlen: int
+        :returns: The number of records written
+        :rtype: int
+        """
+
+        def read_records(reader):
+            for row in reader:
+                try:
+                    timestamp = float(row[0])
+                except (ValueError, IndexError):
+                    continue
+
+                yield timestamp, [int(float(value)) for value in row[1:]]
+
+        with open(csv_path, newline='') as f:
+            reader = csv.reader(f)
+            records = read_records(reader)
+
+            try:
+                first = next(records)
+            except StopIteration:
+                raise ValueError("CSV file has no records: {}".format(csv_path))
+
+            def all_records():
+                yield first
+                yield from records
+
+            return cls.write(path, wlen, len(first[1]), all_records())
+
+def parse_cmdln():
+    """
+    Parse the command line
+
+    :returns: An object containing the command line arguments and options
+    :rtype: argparse.Namespace
+    """
+
+    parser = argparse.ArgumentParser(description='Convert a CSV file to a PLC simulator recording file', prog='{}.Recording'.format(PROGNAME))
+    parser.add_argument('csv_file', help='The CSV file, with a timestamp (s) column followed by a column for each word')
+    parser.add_argument('recording_file', help='The recording file to write')
+    parser.add_argument('-w', '--wlen', type=int, default=2, help='The word length in bytes (default: 2)')
+
+    args = parser.parse_args()
+
+    return args
+
+def main():
+    """
+    Main function
+    """
+
+    args = parse_cmdln()
+    nrecords = Recording.convert_csv(args.csv_file, args.recording_file, args.wlen)
+    print('Wrote {} records to {}'.format(nrecords, args.recording_file))
+
+if __name__ == '__main__':
+    main()
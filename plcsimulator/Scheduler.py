@@ -0,0 +1,232 @@
+###############################################################################
+# Project: PLC Simulator
+# Purpose: Class to encapsulate the task scheduler functionality
+# Author:  Paul M. Breen
+# Date:    2026-10-16
+###############################################################################
+
+"""
+PLC simulator scheduler module
+
+This module contains the scheduler class.  It manages:
+
+* Running any number of periodic tasks from a fixed number of worker
+  threads.
+* Keeping each worker's tasks in a heap keyed on the time that each task is
+  next due to run.
+
+A task is a function that is called with the time that it was due to run.
+It returns the time that it is next due to run, or None if it shouldn't be
+run again.  All times are virtual times from the scheduler's clock.  See
+`plcsimulator.Clock`.  In the clock's step mode, a worker doesn't wait for
+the next task to become due, but advances the clock to the time that it is
+due.
+
+Each time a worker wakes, it runs all the tasks that are then due as a
+single pass.  The pass can optionally be run within a context, such as a
+`plcsimulator.WriteBatch.WriteBatch`.
+"""
+
+import logging
+import threading
+import heapq
+import itertools
+import contextlib
+
+from plcsimulator.Clock import Clock
+
+class TaskQueue(object):
+    """
+    A heap of tasks that are run by a single worker thread
+    """
+
+    def __init__(self, name, clock=None, context=None):
+        """
+        Constructor
+
+        :param name: The name of this queue's worker thread
+        :type name: str
+        :param clock: The clock.  If None, a real time clock is used
+        :type clock: plcsimulator.Clock.Clock
+        :param context: A reusable context manager that each pass of the
+        due tasks is run within.  If None, the pass isn't run in a context
+        :type context: context manager
+        """
+
+        self.name = name
+        self.clock = clock or Clock()
+        self.context = context or contextlib.nullcontext()
+        self.heap = []
+        self.cond = threading.Condition(threading.Lock())
+        self.seq = itertools.count()
+        self.running = False
+        self.thread = None
+
+    def __len__(self):
+        return len(self.heap)
+
+    def push(self, due, task):
+        """
+        Add the task to the queue to be run at the given time
+
+        :param due: The time that the task is due to run
+        :type due: float
+        :param task: The task
+        :type task: function
+        """
+
+        with self.cond:
+            # The sequence number ensures tasks that are due at the same
+            # time are run in the order they were added, and that tasks
+            # themselves are never compared
+            heapq.heappush(self.heap, (due, next(self.seq), task))
+
+            if self.heap[0][2] is task:
+                self.cond.notify()
+
+    def start(self):
+        """
+        Start this queue's worker thread
+        """
+
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name=self.name)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        """
+        Stop this queue's worker thread
+        """
+
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+
+    def run(self):
+        """
+        Run the tasks as they become due
+
+        This is the entry point for this queue's worker thread
+        """
+
+        clock = self.clock
+
+        while True:
+            with self.cond:
+                while self.running:
+                    if len(self.heap) == 0:
+                        self.cond.wait()
+                        continue
+
+                    delay = self.heap[0][0] - clock.monotonic()
+
+                    if delay <= 0:
+                        break
+
+                    if clock.stepping:
+                        clock.advance(self.heap[0][0])
+                        break
+
+                    self.cond.wait(clock.to_real(delay))
+
+                if not self.running:
+                    break
+
+                # Run all the tasks that are now due as a single pass
+                now = clock.monotonic()
+                tasks = [heapq.heappop(self.heap)]
+
+                while len(self.heap) > 0 and self.heap[0][0] <= now:
+                    tasks.append(heapq.heappop(self.heap))
+
+            rescheduled = []
+
+            with self.context:
+                for due, seq, task in tasks:
+                    try:
+                        next_due = task(due)
+                    except Exception as e:
+                        logging.exception("Error detected running task, task will not be rescheduled: {}".format(e))
+                        next_due = None
+
+                    if next_due is not None:
+                        rescheduled.append((next_due, task))
+
+            for next_due, task in rescheduled:
+                self.push(next_due, task)
+
+class Scheduler(object):
+    """
+    Scheduler for the PLC simulator
+    """
+
+    DEFAULTS = {
+        'workers': 1
+    }
+
+    def __init__(self, workers=1, clock=None, context=None):
+        """
+        Constructor
+
+        :param workers: The number of worker threads to run the tasks
+        :type workers: int
+        :param clock: The clock.  If None, a real time clock is used
+        :type clock: plcsimulator.Clock.Clock
+        :param context: A reusable context manager that each worker's pass
+        of the due tasks is run within.  It is shared by all the workers
+        :type context: context manager
+        """
+
+        if workers < 1:
+            raise ValueError("Number of scheduler workers must be at least 1: {}".format(workers))
+
+        self.clock = clock or Clock()
+        self.queues = [TaskQueue('Scheduler-{}'.format(i), clock=self.clock, context=context) for i in range(workers)]
+        self.next_queue = itertools.cycle(self.queues)
+
+    def add(self, task, due=None):
+        """
+        Add a task to the scheduler
+
+        Tasks are distributed over the worker threads in turn
+
+        :param task: The task
+        :type task: function
+        :param due: The time that the task is first due to run.  If None, the
+        task is due to run immediately
+        :type due: float
+        """
+
+        if due is None:
+            due = self.clock.monotonic()
+
+        next(self.next_queue).push(due, task)
+
+    def start(self):
+        """
+        Start the worker threads
+        """
+
+        for queue in self.queues:
+            queue.start()
+
+    def stop(self):
+        """
+        Stop the worker threads
+
+        Any task that is currently running is allowed to complete
+        """
+
+        for queue in self.queues:
+            queue.stop()
+
+    def get_ntasks(self):
+        """
+        Get the number of tasks waiting to run
+
+        :returns: The number of tasks
+        :rtype: int
+        """
+
+        return sum([len(queue) for queue in self.queues])
@@ -0,0 +1,318 @@
+###############################################################################
+# Project: PLC Simulator
+# Purpose: Class to encapsulate a memory space shared between processes
+# Author:  Paul M. Breen
+# Date:    2026-10-16
+###############################################################################
+
+"""
+PLC simulator shared memory space module
+
+This module contains the shared memory space class.  It manages:
+
+* Backing the memory space sections with a memory-mapped file, so that
+  several processes can attach to the same PLC memory space.
+* Locking each section across processes, as well as between the threads of
+  each process.
+* Counting the writes to each section, so that any process can tell whether
+  a section has changed.
+
+The file is a header, followed by each section in turn.  The header is:
+
+* The magic bytes `PLCM`.
+* The format version (unsigned 16-bit).
+* 2 reserved bytes.
+* The length in bytes of each of the bits, words16, words32 and words64
+  sections (unsigned 64-bit each).
+
+The header is padded to 64 bytes.  Each section is an 8-byte write sequence
+counter, followed by the section's data, padded to a multiple of 8 bytes.
+The header is big-endian, and the sequence counters are in native byte
+order.
+
+Between processes, a section is locked with a POSIX record lock on its
+sequence counter, shared for reading and exclusive for writing.  As record
+locks are held per process, the threads of each process first take the
+section's in-process reader/writer lock, and only the first of the process's
+concurrent readers takes the shared record lock.  The sequence counter is
+incremented each time the exclusive lock is released.
+
+For a memory space held in RAM, the file can be on a memory-backed file
+system, such as `/dev/shm` on Linux.  Record locks are released when a
+process closes any descriptor of the file, so each process should attach to
+the file only once.
+"""
+
+import mmap
+import os
+import struct
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from plcsimulator.RWLock import RWLock
+
+class SharedRWLock(RWLock):
+    """
+    Reader/writer lock for a shared memory space section
+
+    This extends the in-process lock with a record lock on the given byte of
+    the shared file
+    """
+
+    def __init__(self, fd, offset, seq):
+        """
+        Constructor
+
+        :param fd: The file descriptor of the shared file
+        :type fd: int
+        :param offset: The offset of the byte to lock in the shared file
+        :type offset: int
+        :param seq: The section's write sequence counter
+        :type seq: memoryview
+        """
+
+        super().__init__()
+
+        self.fd = fd
+        self.offset = offset
+        self.seq = seq
+        self.shared_mutex = threading.Lock()
+        self.nshared = 0
+
+    def acquire_read(self):
+        """
+        Acquire the lock for reading
+
+        The first of the process's concurrent readers also takes the shared
+        record lock
+        """
+
+        super().acquire_read()
+
+        try:
+            with self.shared_mutex:
+                if self.nshared == 0:
+                    fcntl.lockf(self.fd, fcntl.LOCK_SH, 1, self.offset)
+
+                self.nshared += 1
+        except Exception:
+            super().release_read()
+            raise
+
+    def release_read(self):
+        """
+        Release the lock for reading
+        """
+
+        with self.shared_mutex:
+            self.nshared -= 1
+
+            if self.nshared == 0:
+                fcntl.lockf(self.fd, fcntl.LOCK_UN, 1, self.offset)
+
+        super().release_read()
+
+    def acquire_write(self):
+        """
+        Acquire the lock for writing, including the exclusive record lock
+        """
+
+        super().acquire_write()
+
+        try:
+            fcntl.lockf(self.fd, fcntl.LOCK_EX, 1, self.offset)
+        except Exception:
+            super().release_write()
+            raise
+
+    def release_write(self):
+        """
+        Release the lock for writing, incrementing the sequence counter
+        """
+
+        self.seq[0] += 1
+        fcntl.lockf(self.fd, fcntl.LOCK_UN, 1, self.offset)
+        super().release_write()
+
+class SharedMemspace(object):
+    """
+    Memory space shared between processes for the PLC simulator
+    """
+
+    DEFAULTS = {
+        'magic': b'PLCM',
+        'version': 1,
+        'header': struct.Struct('>4sH2x4Q'),
+        'header_len': 64,
+        'seq_len': 8,
+        'align': 8,
+        'sections': ['bits', 'words16', 'words32', 'words64']
+    }
+
+    def __init__(self, path, sizes, create=True):
+        """
+        Constructor
+
+        The file is attached to without being truncated, so that any number
+        of processes can attach to a live memory space.  If the file has no
+        header, it is initialised with zeroed sections.  This is done under
+        an exclusive record lock on the header, so only the first process to
+        attach initialises the file
+
+        :param path: The path of the shared file
+        :type path: str
+        :param sizes: The length in bytes of each section, keyed by section
+        name
+        :type sizes: dict
+        :param create: If True, the file is created if it doesn't exist.  If
+        False, the file must already exist
+        :type create: bool
+        :raises: ValueError if the file isn't a valid shared memory space
+        for the given section lengths
+        :raises: NotImplementedError if record locks aren't supported on
+        this platform
+        """
+
+        if fcntl is None:
+            raise NotImplementedError("A shared memory space requires POSIX record locks (fcntl)")
+
+        self.path = path
+        self.sizes = {section: sizes.get(section, 0) for section in self.DEFAULTS['sections']}
+        self.offsets, size = self.define_layout(self.sizes)
+
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT if create else os.O_RDWR)
+        header_len = self.DEFAULTS['header_len']
+
+        try:
+            # The header doesn't overlap any section's record lock
+            fcntl.lockf(self.fd, fcntl.LOCK_EX, header_len, 0)
+
+            try:
+                if os.pread(self.fd, len(self.DEFAULTS['magic']), 0) != self.DEFAULTS['magic']:
+                    # Nothing can have mapped a file without a header, so
+                    # it's safe to zero it
+                    os.ftruncate(self.fd, 0)
+                    os.ftruncate(self.fd, size)
+                    self.mm = mmap.mmap(self.fd, size)
+                    self.write_header()
+                else:
+                    self.mm = mmap.mmap(self.fd, 0)
+
+                    try:
+                        self.check_header(size)
+                    except Exception:
+                        self.mm.close()
+                        raise
+            finally:
+                fcntl.lockf(self.fd, fcntl.LOCK_UN, header_len, 0)
+        except Exception:
+            os.close(self.fd)
+            raise
+
+        self.view = memoryview(self.mm)
+        self.sections = {}
+        self.seqs = {}
+
+        for section, offset in self.offsets.items():
+            start = offset + self.DEFAULTS['seq_len']
+            self.seqs[section] = self.view[offset:start].cast('Q')
+            self.sections[section] = self.view[start:start + self.sizes[section]]
+
+    def define_layout(self, sizes):
+        """
+        Define the offset of each section in the shared file
+
+        :param sizes: The length in bytes of each section
+        :type sizes: dict
+        :returns: The offset of each section's sequence counter, and the total
+        length of the file
+        :rtype: tuple
+        """
+
+        align = self.DEFAULTS['align']
+        offsets = {}
+        offset = self.DEFAULTS['header_len']
+
+        for section in self.DEFAULTS['sections']:
+            offsets[section] = offset
+            offset += self.DEFAULTS['seq_len'] + (sizes[section] + align - 1) // align * align
+
+        return offsets, offset
+
+    def write_header(self):
+        """
+        Write the header of the shared file
+        """
+
+        sizes = [self.sizes[section] for section in self.DEFAULTS['sections']]
+        self.DEFAULTS['header'].pack_into(self.mm, 0, self.DEFAULTS['magic'], self.DEFAULTS['version'], *sizes)
+
+    def check_header(self, size):
+        """
+        Check that the header of the shared file matches the section lengths
+
+        :param size: The expected length of the file
+        :type size: int
+        :raises: ValueError if the header doesn't match
+        """
+
+        header = self.DEFAULTS['header']
+
+        if len(self.mm) < size:
+            raise ValueError("Shared memory space file is too short: {}".format(self.path))
+
+        magic, version, *sizes = header.unpack_from(self.mm, 0)
+
+        if magic != self.DEFAULTS['magic']:
+            raise ValueError("Not a shared memory space file: {}".format(self.path))
+
+        if version != self.DEFAULTS['version']:
+            raise ValueError("Unsupported shared memory space file version: {}: {}".format(self.path, version))
+
+        expected = [self.sizes[section] for section in self.DEFAULTS['sections']]
+
+        if sizes != expected:
+            raise ValueError("Shared memory space file section lengths {} don't match the configuration {}: {}".format(sizes, expected, self.path))
+
+    def make_lock(self, section):
+        """
+        Make the lock for the given section
+
+        :param section: The memory space section
+        :type section: str
+        :returns: The lock
+        :rtype: plcsimulator.SharedMemspace.SharedRWLock
+        """
+
+        return SharedRWLock(self.fd, self.offsets[section], self.seqs[section])
+
+    def get_seq(self, section):
+        """
+        Get the write sequence counter of the given section
+
+        :param section: The memory space section
+        :type section: str
+        :returns: The number of writes to the section since it was created
+        :rtype: int
+        """
+
+        return self.seqs[section][0]
+
+    def close(self):
+        """
+        Close the shared memory space
+
+        The shared file isn't removed
+        """
+
+        for views in (self.sections, self.seqs):
+            for view in views.values():
+                view.release()
+
+        self.view.release()
+        self.mm.close()
+        os.close(self.fd)
@@ -0,0 +1,97 @@
+###############################################################################
+# Project: PLC Simulator
+# Purpose: Class to encapsulate a compiled simulation
+# Author:  Paul M. Breen
+# Date:    2026-10-16
+###############################################################################
+
+"""
+PLC simulator simulation module
+
+This module contains the simulation class.  A simulation is compiled by the
+IO manager from its configuration.  It holds:
+
+* A function that generates the simulation data.  Everything that can be
+  resolved from the configuration (word length, number of references, byte
+  order, range parameters etc.) is resolved when the function is compiled,
+  so generating the data is a single call.
+* A function that writes the simulation data to the simulation's memory
+  space.
+* The simulation's timer.
+* Optionally, a function that propagates the written data to any simulations
+  that depend on it.  See `plcsimulator.DependencyGraph`.
+"""
+
+from plcsimulator.Clock import Clock
+
+class Simulation(object):
+    """
+    Compiled simulation for the PLC simulator
+    """
+
+    __slots__ = ('id', 'conf', 'generate', 'write', 'timer', 'propagate', 'clock')
+
+    def __init__(self, id, conf, generate, write, timer=None, propagate=None, clock=None):
+        """
+        Constructor
+
+        :param id: The simulation ID
+        :type id: str
+        :param conf: The simulation configuration
+        :type conf: dict
+        :param generate: The function that generates the simulation data.
+        It takes no arguments and returns the data, or None if the simulation
+        didn't generate any data
+        :type generate: function
+        :param write: The function that writes the simulation data to the
+        memory space.  It takes the data as its only argument
+        :type write: function
+        :param timer: The simulation timer
+        :type timer: plcsimulator.SimulationTimer.SimulationTimer
+        :param propagate: The function that propagates the written data to
+        any dependent simulations.  It takes the data as its only argument
+        :type propagate: function
+        :param clock: The clock that times the simulation.  If None, a real
+        time clock is used
+        :type clock: plcsimulator.Clock.Clock
+        """
+
+        self.id = id
+        self.conf = conf
+        self.generate = generate
+        self.write = write
+        self.timer = timer
+        self.propagate = propagate
+        self.clock = clock or Clock()
+
+    def step(self):
+        """
+        Run a single step of the simulation
+
+        The simulation data are generated and written to the memory space,
+        and then propagated to any dependent simulations
+        """
+
+        data = self.generate()
+
+        if data is not None:
+            self.write(data)
+
+            if self.propagate is not None:
+                self.propagate(data)
+
+    def run(self, due):
+        """
+        Run the simulation as a scheduler task
+
+        :param due: The time that the simulation was due to run
+        :type due: float
+        :returns: The time that the simulation is next due to run
+        :rtype: float
+        """
+
+        monotonic = self.clock.monotonic
+        started = monotonic()
+        self.step()
+
+        return self.timer.complete(due, started, monotonic())
@@ -0,0 +1,153 @@
+###############################################################################
+# Project: PLC Simulator
+# Purpose: Class to encapsulate the timing of a simulation
+# Author:  Paul M. Breen
+# Date:    2026-10-16
+###############################################################################
+
+"""
+PLC simulator simulation timer module
+
+This module contains the simulation timer class.  It manages:
+
+* Calculating when a simulation is next due to run, according to its timing
+  mode.
+* Recording statistics on how closely the simulation is keeping to its
+  period.
+
+The timing mode is one of:
+
+* pause: (Default) The simulation is next due once its period has elapsed
+  after each run.  The effective period is therefore the period plus the
+  time taken by each run.
+* deadline: The simulation is next due exactly one period after it was last
+  due, so its rate doesn't drift.  If a run overruns one or more following
+  deadlines, the overrun policy determines what happens:  + skip: (Default)
+  The missed deadlines are skipped, and the simulation is next due at the
+  first deadline still in the future.  + catch_up: The missed deadlines are
+  run immediately, one after the other, until the simulation has caught up.
+"""
+
+import math
+
+class SimulationTimer(object):
+    """
+    Simulation timer for the PLC simulator
+    """
+
+    DEFAULTS = {
+        'modes': ['pause', 'deadline'],
+        'mode': 'pause',
+        'overruns': ['skip', 'catch_up'],
+        'overrun': 'skip'
+    }
+
+    __slots__ = ('period', 'mode', 'overrun', 'nruns', 'nmissed', 'first_start', 'last_start', 'lateness_sum', 'lateness_sq_sum', 'max_lateness')
+
+    def __init__(self, period=0, mode='pause', overrun='skip'):
+        """
+        Constructor
+
+        :param period: The simulation period (s)
+        :type period: float
+        :param mode: The timing mode, one of 'pause' or 'deadline'
+        :type mode: str
+        :param overrun: The overrun policy, one of 'skip' or 'catch_up'
+        :type overrun: str
+        """
+
+        if mode not in self.DEFAULTS['modes']:
+            raise ValueError("Unknown simulation timing mode: {}".format(mode))
+
+        if overrun not in self.DEFAULTS['overruns']:
+            raise ValueError("Unknown simulation overrun policy: {}".format(overrun))
+
+        self.period = period
+        self.mode = mode
+        self.overrun = overrun
+        self.nruns = 0
+        self.nmissed = 0
+        self.first_start = None
+        self.last_start = None
+        self.lateness_sum = 0.0
+        self.lateness_sq_sum = 0.0
+        self.max_lateness = 0.0
+
+    def complete(self, due, started, finished):
+        """
+        Record a completed run of the simulation and calculate the next due time
+
+        :param due: The time that the run was due to start
+        :type due: float
+        :param started: The time that the run started
+        :type started: float
+        :param finished: The time that the run finished
+        :type finished: float
+        :returns: The time that the simulation is next due to run
+        :rtype: float
+        """
+
+        lateness = started - due
+
+        if self.first_start is None:
+            self.first_start = started
+
+        self.last_start = started
+        self.nruns += 1
+        self.lateness_sum += lateness
+        self.lateness_sq_sum += lateness * lateness
+
+        if lateness > self.max_lateness:
+            self.max_lateness = lateness
+
+        if self.mode == 'pause':
+            next_due = finished + self.period
+        else:
+            next_due = due + self.period
+
+            if next_due < finished and self.period > 0:
+                # This run overran one or more following deadlines
+                nmissed = int((finished - next_due) // self.period) + 1
+                self.nmissed += nmissed
+
+                if self.overrun == 'skip':
+                    next_due += nmissed * self.period
+
+        return next_due
+
+    def get_stats(self):
+        """
+        Get the timing statistics of the simulation
+
+        The statistics are:
+
+        * runs: The number of runs.
+        * rate: The achieved rate (Hz), from the first to the last run.
+        * mean_lateness: The mean time (s) that runs started after they were due.
+        * jitter: The standard deviation of the lateness (s).
+        * max_lateness: The maximum lateness (s).
+        * missed: The number of deadlines that passed while a run was still in progress.
+
+        :returns: The timing statistics
+        :rtype: dict
+        """
+
+        rate = 0.0
+        mean_lateness = 0.0
+        jitter = 0.0
+
+        if self.nruns > 1 and self.last_start > self.first_start:
+            rate = (self.nruns - 1) / (self.last_start - self.first_start)
+
+        if self.nruns > 0:
+            mean_lateness = self.lateness_sum / self.nruns
+            jitter = math.sqrt(max(self.lateness_sq_sum / self.nruns - mean_lateness**2, 0.0))
+
+        return {
+            'runs': self.nruns,
+            'rate': rate,
+            'mean_lateness': mean_lateness,
+            'jitter': jitter,
+            'max_lateness': self.max_lateness,
+            'missed': self.nmissed
+        }
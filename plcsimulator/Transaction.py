@@ -0,0 +1,197 @@
+###############################################################################
+# Project: PLC Simulator
+# Purpose: Class to encapsulate an atomic memory space transaction
+# Author:  Paul M. Breen
+# Date:    2026-10-16
+###############################################################################
+
+"""
+PLC simulator transaction module
+
+This module contains the transaction class.  It manages:
+
+* Collecting get and set operations on ranges of any of the memory space
+  sections.
+* Bounds checking each operation as it is added, so that an invalid
+  transaction fails before any data are accessed.
+* Committing the operations atomically, with each section's lock taken once,
+  in a canonical order.
+
+A transaction is created by
+`plcsimulator.MemoryManager.MemoryManager.transaction()`.  Each operation
+returns its index in the list of results returned by `commit()`.  For
+example:
+
+```python
+tx = memory_manager.transaction()
+value = tx.get_data('words32', 0, 1)
+status = tx.get_bits('bits', 8, 4)
+results = tx.commit()
+```
+
+As a context manager, the transaction is committed on exit, unless an
+exception was raised, and the results are then available as `results`.
+
+The operations are applied in the order that they were added, so a get that
+follows a set of the same range in a transaction sees the set data.  A
+transaction can be committed any number of times, which allows, for example,
+a simulation to build a transaction to get its inputs once, and commit it
+each time it runs.
+"""
+
+class Transaction(object):
+    """
+    Atomic memory space transaction for the PLC simulator
+    """
+
+    DEFAULTS = {
+        'data_ops': ['get_data', 'set_data'],
+        'bits_ops': ['get_bits', 'set_bits']
+    }
+
+    def __init__(self, memory_manager):
+        """
+        Constructor
+
+        :param memory_manager: The memory manager that the transaction
+        accesses
+        :type memory_manager: plcsimulator.MemoryManager.MemoryManager
+        """
+
+        self.memory_manager = memory_manager
+        self.ops = []
+        self.sections = {}
+        self.results = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+
+        return False
+
+    def add(self, op, section, addr, nrefs, data=None):
+        """
+        Add an operation to the transaction
+
+        :param op: The operation, one of 'get_data', 'get_bits', 'set_data'
+        or 'set_bits'
+        :type op: str
+        :param section: The memory space section
+        :type section: str
+        :param addr: The start address in the memory space section
+        :type addr: int
+        :param nrefs: The number of bits for a bits operation, otherwise the
+        number of words
+        :type nrefs: int
+        :param data: The data to set, for a set operation
+        :type data: bytearray
+        :raises: ValueError if the operation is unknown
+        :raises: IndexError if the bounds of the section would be exceeded
+        :returns: The index of the operation's result
+        :rtype: int
+        """
+
+        if op in self.DEFAULTS['bits_ops']:
+            self.memory_manager.check_bit_bounds(section=section, addr=addr, nbits=nrefs)
+        elif op in self.DEFAULTS['data_ops']:
+            self.memory_manager.check_bounds(section=section, addr=addr, nwords=nrefs)
+        else:
+            raise ValueError("Unknown transaction operation: {}".format(op))
+
+        write = op.startswith('set_')
+        self.sections[section] = self.sections.get(section, False) or write
+        self.ops.append((op, section, addr, nrefs, data))
+
+        return len(self.ops) - 1
+
+    def get_data(self, section=None, addr=None, nwords=None):
+        """
+        Add a get of a slice of data from the given memory space section
+
+        See `plcsimulator.MemoryManager.MemoryManager.get_data()`
+
+        :returns: The index of the operation's result
+        :rtype: int
+        """
+
+        return self.add('get_data', section, addr, nwords)
+
+    def set_data(self, section=None, addr=None, nwords=None, data=None):
+        """
+        Add a set of a slice of data in the given memory space section
+
+        See `plcsimulator.MemoryManager.MemoryManager.set_data()`
+
+        :returns: The index of the operation's result
+        :rtype: int
+        """
+
+        return self.add('set_data', section, addr, nwords, data)
+
+    def get_bits(self, section='bits', addr=None, nbits=None):
+        """
+        Add a get of a range of bits from the bits memory space section
+
+        See `plcsimulator.MemoryManager.MemoryManager.get_bits()`
+
+        :returns: The index of the operation's result
+        :rtype: int
+        """
+
+        return self.add('get_bits', section, addr, nbits)
+
+    def set_bits(self, section='bits', addr=None, nbits=None, data=None):
+        """
+        Add a set of a range of bits in the bits memory space section
+
+        See `plcsimulator.MemoryManager.MemoryManager.set_bits()`
+
+        :returns: The index of the operation's result
+        :rtype: int
+        """
+
+        return self.add('set_bits', section, addr, nbits, data)
+
+    def commit(self):
+        """
+        Commit the transaction
+
+        Any read hooks for the ranges to get are called first.  The lock of
+        each section is then taken, for writing if there is any set of the
+        section, otherwise for reading, and the operations are applied in
+        order
+
+        :returns: The results of the operations.  For a get, this is the
+        data, and for a set, the data that were set
+        :rtype: list
+        """
+
+        mm = self.memory_manager
+
+        for op, section, addr, nrefs, data in self.ops:
+            if op.startswith('get_') and section in mm.read_hooks and nrefs > 0:
+                mm.run_read_hooks(section, addr, nrefs)
+
+        results = []
+
+        with mm.lock_sections(self.sections):
+            for op, section, addr, nrefs, data in self.ops:
+                if op == 'get_data':
+                    results.append(mm.read_data(section, addr, nrefs))
+                elif op == 'get_bits':
+                    results.append(mm.read_bits(section, addr, nrefs))
+                elif op == 'set_data':
+                    mm.write_data(section, addr, nrefs, data)
+                    results.append(data)
+                elif op == 'set_bits':
+                    if nrefs > 0:
+                        mm.write_bits(section, addr, nrefs, data)
+
+                    results.append(data)
+
+        self.results = results
+
+        return results
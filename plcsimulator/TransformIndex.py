@@ -0,0 +1,194 @@
+###############################################################################
+# Project: PLC Simulator
+# Purpose: Class to encapsulate an index of transform rules
+# Author:  Paul M. Breen
+# Date:    2026-10-16
+###############################################################################
+
+"""
+PLC simulator transform index module
+
+This module contains the transform index class.  It manages:
+
+* Compiling an ordered list of transform rules into an index of disjoint
+  intervals.
+* Looking up the output of the first rule that matches a given input value.
+
+Each rule has an `in` and an `out`.  The `in` is either an exact value, or
+an inclusive `[lo, hi]` range.  If the `out` is null, the output is the
+input value itself.  Where the rules overlap, the earlier rule takes
+precedence.
+
+If the rules span a small domain of values, the index is a dense table,
+indexed by the input value.  Otherwise, the index is a sorted list of
+intervals that is searched by bisection.
+"""
+
+import bisect
+import math
+
+# Marks a table entry whose output is the input value
+PASSTHROUGH = object()
+
+class TransformIndex(object):
+    """
+    Index of transform rules for the PLC simulator
+    """
+
+    DEFAULTS = {
+        'dense_max': 4096
+    }
+
+    def __init__(self, rules, dense_max=None):
+        """
+        Constructor
+
+        :param rules: The transform rules, in order of precedence.  For
+        compatibility, a single rule can be given on its own
+        :type rules: list or dict
+        :param dense_max: The maximum span of input values for which the
+        index is a dense table.  If None, the default is used
+        :type dense_max: int
+        :raises: ValueError if a rule is invalid
+        """
+
+        if isinstance(rules, dict):
+            rules = [rules]
+
+        if dense_max is None:
+            dense_max = self.DEFAULTS['dense_max']
+
+        self.intervals = self.build_intervals(rules)
+
+        if self.intervals and self.intervals[-1][1] - self.intervals[0][0] < dense_max:
+            self.dense = True
+            self.lookup = self.make_dense_lookup()
+        else:
+            self.dense = False
+            self.lookup = self.make_interval_lookup()
+
+    def define_bounds(self, rule):
+        """
+        Get the inclusive integer bounds of the input values that a rule matches
+
+        The input values are words, so only integer values can match
+
+        :param rule: The transform rule
+        :type rule: dict
+        :raises: ValueError if the rule has no `in` and `out`
+        :returns: The lower and upper bounds, or None if no value can match
+        :rtype: tuple
+        """
+
+        try:
+            t_in = rule['in']
+            rule['out']
+        except (KeyError, TypeError):
+            raise ValueError("Transform rule requires an in and an out: {}".format(rule))
+
+        if isinstance(t_in, (list, tuple)):
+            lo, hi = math.ceil(t_in[0]), math.floor(t_in[1])
+        else:
+            lo, hi = math.ceil(t_in), math.floor(t_in)
+
+        return (lo, hi) if lo <= hi else None
+
+    def build_intervals(self, rules):
+        """
+        Build the sorted, disjoint intervals from the ordered rules
+
+        Each rule only claims those input values that no earlier rule has
+        already claimed
+
+        :param rules: The transform rules, in order of precedence
+        :type rules: list
+        :returns: The (lo, hi, out) intervals, sorted by lo
+        :rtype: list
+        """
+
+        intervals = []
+
+        for rule in rules:
+            bounds = self.define_bounds(rule)
+
+            if bounds is None:
+                continue
+
+            out = PASSTHROUGH if rule['out'] is None else rule['out']
+            pieces = [bounds]
+
+            for claimed_lo, claimed_hi, claimed_out in intervals:
+                remaining = []
+
+                for lo, hi in pieces:
+                    if hi < claimed_lo or lo > claimed_hi:
+                        remaining.append((lo, hi))
+                        continue
+
+                    if lo < claimed_lo:
+                        remaining.append((lo, claimed_lo - 1))
+
+                    if hi > claimed_hi:
+                        remaining.append((claimed_hi + 1, hi))
+
+                pieces = remaining
+
+            intervals.extend([(lo, hi, out) for lo, hi in pieces])
+            intervals.sort(key=lambda interval: interval[0])
+
+        return intervals
+
+    def make_dense_lookup(self):
+        """
+        Make a lookup function over a dense table of the outputs
+
+        :returns: A function that takes the input value and returns the
+        output value, or None if no rule matches
+        :rtype: function
+        """
+
+        base = self.intervals[0][0]
+        table = [None] * (self.intervals[-1][1] - base + 1)
+
+        for lo, hi, out in self.intervals:
+            table[lo - base:hi - base + 1] = [out] * (hi - lo + 1)
+
+        nentries = len(table)
+
+        def lookup(state):
+            i = state - base
+
+            if 0 <= i < nentries:
+                out = table[i]
+
+                return state if out is PASSTHROUGH else out
+
+            return None
+
+        return lookup
+
+    def make_interval_lookup(self):
+        """
+        Make a lookup function that bisects the sorted intervals
+
+        :returns: A function that takes the input value and returns the
+        output value, or None if no rule matches
+        :rtype: function
+        """
+
+        starts = [interval[0] for interval in self.intervals]
+        ends = [interval[1] for interval in self.intervals]
+        outs = [interval[2] for interval in self.intervals]
+        bisect_right = bisect.bisect_right
+
+        def lookup(state):
+            i = bisect_right(starts, state) - 1
+
+            if i >= 0 and state <= ends[i]:
+                out = outs[i]
+
+                return state if out is PASSTHROUGH else out
+
+            return None
+
+        return lookup
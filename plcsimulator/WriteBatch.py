@@ -0,0 +1,132 @@
+###############################################################################
+# Project: PLC Simulator
+# Purpose: Class to encapsulate batching of memory space writes
+# Author:  Paul M. Breen
+# Date:    2026-10-16
+###############################################################################
+
+"""
+PLC simulator write batch module
+
+This module contains the write batch class.  It manages:
+
+* Collecting the memory space writes made by the simulations that run in a
+  single scheduling pass.
+* Applying the collected writes at the end of the pass, with a single lock
+  acquisition per memory space section.  See
+  `plcsimulator.MemoryManager.MemoryManager.apply_writes()`.
+* Collecting items for any functions that depend on the writes, such as
+  propagating them to dependent simulations, and calling each function once,
+  with all its items, after the writes have been applied.
+
+The write batch is used as a context manager around each scheduling pass.
+Batches are per thread, so a single write batch can be shared by all
+scheduler workers.  Outside of a pass, writes are applied immediately.  A
+batch can collect writes to several memory managers, such as those of a
+fleet of PLCs that share a scheduler.
+"""
+
+import logging
+import threading
+
+class WriteBatch(object):
+    """
+    Write batch for the PLC simulator
+    """
+
+    def __init__(self, memory_manager=None):
+        """
+        Constructor
+
+        :param memory_manager: The memory manager that the writes are
+        applied to, unless another is given for a write
+        :type memory_manager: plcsimulator.MemoryManager.MemoryManager
+        """
+
+        self.memory_manager = memory_manager
+        self.local = threading.local()
+
+    def __enter__(self):
+        self.local.writes = {}
+        self.local.collected = {}
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        writes = self.local.writes
+        collected = self.local.collected
+        self.local.writes = None
+        self.local.collected = None
+
+        for memory_manager, mm_writes in writes.items():
+            try:
+                memory_manager.apply_writes(mm_writes)
+            except Exception as e:
+                logging.exception("Error detected applying batched writes: {}".format(e))
+
+        for fn, items in collected.items():
+            try:
+                fn(items)
+            except Exception as e:
+                logging.exception("Error detected running function after batched writes: {}".format(e))
+
+        return False
+
+    def write(self, section, addr, nrefs, data, memory_manager=None):
+        """
+        Write the data to the memory space, or add it to the current batch
+
+        The write is bounds checked immediately, so an invalid write raises
+        an exception in the caller, as it would if it wasn't batched
+
+        :param section: The memory space section
+        :type section: str
+        :param addr: The start address in the memory space section
+        :type addr: int
+        :param nrefs: The number of bits for the bits section, otherwise the
+        number of words
+        :type nrefs: int
+        :param data: The data to write
+        :type data: bytearray
+        :param memory_manager: The memory manager to write to.  If None, the
+        write batch's memory manager is used
+        :type memory_manager: plcsimulator.MemoryManager.MemoryManager
+        :raises: IndexError if the bounds of the section would be exceeded
+        """
+
+        memory_manager = memory_manager or self.memory_manager
+        writes = getattr(self.local, 'writes', None)
+
+        if writes is None:
+            if section == 'bits':
+                memory_manager.set_bits(section, addr, nrefs, data)
+            else:
+                memory_manager.set_data(section, addr, nrefs, data)
+        else:
+            if section == 'bits':
+                memory_manager.check_bit_bounds(section=section, addr=addr, nbits=nrefs)
+            else:
+                memory_manager.check_bounds(section=section, addr=addr, nwords=nrefs)
+
+            writes.setdefault(memory_manager, []).append((section, addr, nrefs, data))
+
+    def collect(self, fn, item):
+        """
+        Collect an item for the function, to be called after the current batch
+
+        Once the current batch has been applied, the function is called once
+        with a list of all the items collected for it, in the order that
+        they were collected.  If there is no current batch, the function is
+        called immediately with a list of just this item
+
+        :param fn: The function
+        :type fn: function
+        :param item: The item
+        """
+
+        collected = getattr(self.local, 'collected', None)
+
+        if collected is None:
+            fn([item])
+        else:
+            collected.setdefault(fn, []).append(item)
@@ -1,11 +1,1027 @@
 import os
+import socket
+import struct
+import threading
+import time
 
 import pytest
 
 import plcsimulator
+from plcsimulator.MemoryManager import MemoryManager
+from plcsimulator.FieldbusManager import FieldbusManager
+from plcsimulator.Listener import Listener
+from plcsimulator.BackendPool import BackendPool
 
 base = os.path.dirname(__file__)
 
+def get_free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('localhost', 0))
+        port = s.getsockname()[1]
+
+    return port
+
+def start_simulator(mode='thread', blen=64, w16len=100, pool=None):
+    port = get_free_port()
+    memory_manager = MemoryManager(blen=blen, w16len=w16len)
+    modules = [{'module': 'plcsimulator.ModbusModule', 'class': 'ModbusModule', 'id': 'modbus', 'port': port, 'conf': {}}]
+    fieldbus_manager = FieldbusManager(modules=modules, memory_manager=memory_manager)
+    fieldbus_manager.init_modules()
+    listener = Listener(host='localhost', port=port, mode=mode, pool=pool, fieldbus_manager=fieldbus_manager)
+    server = threading.Thread(target=listener.service_client_requests, daemon=True)
+    server.start()
+
+    for i in range(50):
+        try:
+            socket.create_connection(('localhost', port)).close()
+            break
+        except ConnectionRefusedError:
+            time.sleep(0.05)
+
+    return port, memory_manager
+
+def recv_response(conn):
+    header = conn.recv(6, socket.MSG_WAITALL)
+    nbytes = struct.unpack('>H', header[4:6])[0]
+
+    return header + conn.recv(nbytes, socket.MSG_WAITALL)
+
 def test_version():
     assert plcsimulator.__version__ == '0.6.0'
 
+@pytest.mark.parametrize('mode', ['thread', 'asyncio'])
+def test_listener_modes_serve_modbus_requests(mode):
+    port, memory_manager = start_simulator(mode=mode)
+    memory_manager.set_data(section='words16', addr=0, nwords=2, data=bytearray(b'\x00\x01\x00\x02'))
+
+    with socket.create_connection(('localhost', port)) as conn:
+        conn.sendall(struct.pack('>HHHBBHH', 1, 0, 6, 1, 0x03, 0, 2))
+        assert recv_response(conn) == bytes.fromhex('0001000000070103040001' '0002')
+
+        conn.sendall(struct.pack('>HHHBBHHB', 2, 0, 9, 1, 0x10, 5, 1, 2) + b'\x12\x34')
+        assert recv_response(conn) == bytes.fromhex('000200000006011000050001')
+
+    assert memory_manager.get_data(section='words16', addr=5, nwords=1) == b'\x12\x34'
+
+def test_listener_rejects_unknown_mode():
+    with pytest.raises(ValueError):
+        Listener(mode='fork')
+
+@pytest.mark.parametrize('mode', ['thread', 'asyncio'])
+def test_pipelined_requests_are_answered_in_order(mode):
+    port, memory_manager = start_simulator(mode=mode)
+    memory_manager.set_data(section='words16', addr=0, nwords=2, data=bytearray(b'\x00\x01\x00\x02'))
+    requests = b''.join([struct.pack('>HHHBBHH', tid, 0, 6, 1, 0x03, tid - 1, 1) for tid in (1, 2)])
+
+    with socket.create_connection(('localhost', port)) as conn:
+        # Send two pipelined requests, the second split across segments
+        conn.sendall(requests[:17])
+        time.sleep(0.05)
+        conn.sendall(requests[17:])
+
+        assert recv_response(conn) == bytes.fromhex('00010000000501030200' '01')
+        assert recv_response(conn) == bytes.fromhex('00020000000501030200' '02')
+
+def test_modbus_functions_table_dispatch():
+    from plcsimulator.ModbusModule import ModbusModule
+    from plcsimulator.FieldbusMessage import FieldbusMessage
+
+    def service_echo_request(plc, request):
+        return request
+
+    plc = ModbusModule('modbus')
+    plc.init(conf={}, memory_manager=MemoryManager(w16len=10))
+    plc.register_function(0x2b, 'echo', service_echo_request)
+
+    request = FieldbusMessage(0)
+    request.buf = bytearray(struct.pack('>HHHBBHH', 1, 0, 6, 1, 0x2b, 0, 1))
+    assert plc.dispatch_request(request).buf[7] == 0x2b
+
+    request.buf[7] = 0x2c
+    assert plc.dispatch_request(request).buf[7:9] == bytearray([0xac, 0x01])
+
+def test_memory_manager_bits_are_addressed_right_to_left():
+    memory_manager = MemoryManager(blen=32)
+    memory_manager.memspace['bits'][:] = bytearray(b'\x00\x00\x00\x00')
+
+    def bits_to_int():
+        return int.from_bytes(memory_manager.memspace['bits'], byteorder='big')
+
+    memory_manager.set_bits(addr=0, nbits=1, data=bytearray(b'\x01'))
+    memory_manager.set_bits(addr=5, nbits=6, data=bytearray(b'\xff\x3f'))
+    memory_manager.set_bits(addr=16, nbits=12, data=bytearray(b'\x0a\xbc'))
+    assert bits_to_int() == 0x0abc07e1
+
+    for addr, nbits in [(0, 32), (0, 8), (3, 5), (5, 6), (7, 13), (16, 12), (31, 1)]:
+        expected = (bits_to_int() >> addr) & (2**nbits - 1)
+        data = memory_manager.get_bits(addr=addr, nbits=nbits)
+        assert len(data) == (nbits + 7) // 8
+        assert int.from_bytes(data, byteorder='big') == expected
+
+    with pytest.raises(IndexError):
+        memory_manager.get_bits(addr=30, nbits=3)
+
+def test_rwlock_readers_share_and_writers_wait():
+    from plcsimulator.RWLock import RWLock
+
+    lock = RWLock()
+    events = []
+
+    def writer():
+        with lock.write:
+            events.append('write')
+
+    with lock.read:
+        # A second reader isn't blocked by the first
+        with lock.read:
+            events.append('read')
+
+        w = threading.Thread(target=writer)
+        w.start()
+        time.sleep(0.05)
+        assert events == ['read']
+
+    w.join()
+    assert events == ['read', 'write']
+
+    stats = lock.get_stats()
+    assert stats['read']['acquisitions'] == 2
+    assert stats['write']['acquisitions'] == 1
+    assert stats['write']['contentions'] == 1
+    assert stats['write']['wait_time'] > 0
+
+def test_memory_manager_lock_stats_are_per_section():
+    memory_manager = MemoryManager(blen=8, w16len=10, w32len=10)
+    memory_manager.get_data(section='words16', addr=0, nwords=1)
+    memory_manager.set_bits(addr=0, nbits=1, data=bytearray(b'\x01'))
+
+    stats = memory_manager.get_lock_stats()
+    assert stats['words16']['read']['acquisitions'] == 1
+    assert stats['bits']['write']['acquisitions'] == 1
+    assert stats['words32']['read']['acquisitions'] == 0
+
+def test_scheduler_runs_tasks_when_due():
+    from plcsimulator.Scheduler import Scheduler
+
+    scheduler = Scheduler(workers=2)
+    runs = {'fast': 0, 'slow': 0}
+
+    def make_task(name, pause):
+        def task(due):
+            runs[name] += 1
+            return time.monotonic() + pause if runs[name] < 5 else None
+        return task
+
+    scheduler.add(make_task('fast', 0.01))
+    scheduler.add(make_task('slow', 10), due=time.monotonic() + 0.05)
+    scheduler.start()
+    time.sleep(0.2)
+    scheduler.stop()
+
+    assert runs == {'fast': 5, 'slow': 1}
+
+def test_io_manager_heap_scheduler_runs_simulations():
+    from plcsimulator.IoManager import IoManager
+
+    memory_manager = MemoryManager(blen=8, w16len=10)
+    conf = {
+        'scheduler': {'mode': 'heap', 'workers': 1},
+        'simulations': [
+            {'memspace': {'section': 'words16', 'addr': 0, 'nwords': 1}, 'function': {'type': 'counter'}, 'pause': 0.001},
+            {'memspace': {'section': 'words16', 'addr': 1, 'nwords': 2}, 'function': {'type': 'static', 'value': 321}, 'pause': 60},
+            {'memspace': {'section': 'bits', 'addr': 2, 'nbits': 1}, 'function': {'type': 'static', 'value': 1}, 'pause': 60}
+        ]
+    }
+    io_manager = IoManager(conf, memory_manager=memory_manager)
+    io_manager.init_io()
+    time.sleep(0.1)
+    io_manager.scheduler.stop()
+
+    assert int.from_bytes(memory_manager.get_data(section='words16', addr=0, nwords=1), byteorder='big') > 10
+    assert memory_manager.get_data(section='words16', addr=1, nwords=2) == bytearray(b'\x01\x41\x01\x41')
+    assert memory_manager.get_bits(addr=0, nbits=8) == bytearray(b'\x04')
+
+def test_simulation_timer_deadline_mode_does_not_drift():
+    from plcsimulator.SimulationTimer import SimulationTimer
+
+    pause = SimulationTimer(period=1.0, mode='pause')
+    assert pause.complete(0.0, 0.1, 0.3) == 1.3
+
+    skip = SimulationTimer(period=1.0, mode='deadline', overrun='skip')
+    assert skip.complete(0.0, 0.1, 0.3) == 1.0
+    assert skip.complete(1.0, 1.0, 3.5) == 4.0
+    assert skip.get_stats()['missed'] == 2
+
+    catch_up = SimulationTimer(period=1.0, mode='deadline', overrun='catch_up')
+    assert catch_up.complete(0.0, 0.0, 2.5) == 1.0
+    assert catch_up.complete(1.0, 2.5, 2.6) == 2.0
+
+    stats = catch_up.get_stats()
+    assert stats['runs'] == 2
+    assert stats['rate'] == pytest.approx(1 / 2.5)
+    assert stats['max_lateness'] == 1.5
+    assert stats['jitter'] == pytest.approx(0.75)
+
+def test_io_manager_compiles_simulations():
+    from plcsimulator.IoManager import IoManager
+
+    memory_manager = MemoryManager(w16len=10)
+    io_manager = IoManager({'simulations': []}, memory_manager=memory_manager)
+    memory_manager.set_data(section='words16', addr=9, nwords=1, data=bytearray(b'\x00\x05'))
+
+    confs = [
+        {'id': 'counter', 'memspace': {'section': 'words16', 'addr': 0, 'nwords': 2}, 'function': {'type': 'counter', 'range': [10, 0, -4]}},
+        {'id': 'binary', 'memspace': {'section': 'words16', 'addr': 0, 'nwords': 1}, 'function': {'type': 'binary'}},
+        {'id': 'op', 'memspace': {'section': 'words16', 'addr': 0, 'nwords': 1}, 'operands': [{'memspace': {'section': 'words16', 'addr': 9, 'nwords': 1}}, {'source': {'value': 3}}], 'function': {'type': 'operation', 'operator': 'mul'}}
+    ]
+    counter, binary, op = [io_manager.init_simulation(conf) for conf in confs]
+
+    assert [counter.generate() for i in range(4)] == [b'\x00\x0a\x00\x0a', b'\x00\x06\x00\x06', b'\x00\x02\x00\x02', b'\x00\x0a\x00\x0a']
+    assert [binary.generate() for i in range(3)] == [b'\x00\x00', b'\x00\x01', b'\x00\x00']
+    assert op.generate() == b'\x00\x0f'
+
+    op.step()
+    assert memory_manager.get_data(section='words16', addr=0, nwords=1) == b'\x00\x0f'
+
+@pytest.mark.parametrize('vectorised', [True, False])
+def test_io_manager_batch_simulation_writes_whole_block(vectorised, monkeypatch):
+    from plcsimulator import IoManager as io_manager_module
+    from plcsimulator.IoManager import IoManager
+
+    if vectorised:
+        pytest.importorskip('numpy')
+    else:
+        monkeypatch.setattr(io_manager_module, 'numpy', None)
+
+    memory_manager = MemoryManager(w16len=10)
+    io_manager = IoManager({'simulations': []}, memory_manager=memory_manager)
+    conf = {'id': 'batch', 'memspace': {'section': 'words16', 'addr': 2, 'nwords': 4}, 'function': {'type': 'batch', 'waveform': 'sine', 'steps': 4, 'phase_step': 0.25, 'scale': 100, 'offset': [0, 100, 200, 300]}}
+    simulation = io_manager.init_simulation(conf)
+    simulation.step()
+
+    data = memory_manager.get_data(section='words16', addr=2, nwords=4)
+    assert struct.unpack('>4H', data) == (0, 200, 200, 200)
+
+    # Both paths generate the same bytes, including negative values wrapped
+    # to the word length
+    expected = {
+        'sine': [(0, 1587, 2951, 3951), (781, 1998, 2834, 3351), (974, 1657, 2089, 2487), (433, 821, 1277, 2009), (65103, 119, 1009, 2277), (64562, 80, 1487, 3089), (64755, 733, 2351, 3834)],
+        'cosine': [(1000, 1809, 2309, 2690), (623, 1044, 1449, 2063), (65314, 246, 1004, 2141), (64636, 16, 1308, 2865), (64636, 526, 2134, 3691), (65314, 1393, 2858, 3995), (623, 1963, 2936, 3550)],
+        'sawtooth': [(64536, 200, 1400, 2600), (64822, 485, 1685, 2885), (65108, 771, 1971, 3171), (65394, 1057, 2257, 3457), (142, 1342, 2542, 3742), (428, 1628, 2828, 2028), (714, 1914, 1114, 2314)],
+        'square': [(1000, 2000, 3000, 4000), (1000, 2000, 3000, 4000), (1000, 2000, 3000, 2000), (1000, 0, 1000, 2000), (64536, 0, 1000, 2000), (64536, 0, 1000, 4000), (64536, 0, 3000, 4000)]
+    }
+
+    for waveform, values in expected.items():
+        conf = {'id': waveform, 'memspace': {'section': 'words16', 'addr': 2, 'nwords': 4}, 'function': {'type': 'batch', 'waveform': waveform, 'steps': 7, 'phase_step': 0.1, 'scale': 1000, 'offset': [0, 1000, 2000, 3000]}}
+        generate = io_manager.compile_batch(conf)
+        assert [struct.unpack('>4H', generate()) for i in range(7)] == values
+
+    with pytest.raises(ValueError):
+        io_manager.init_simulation({'id': 'bad', 'memspace': {'section': 'words16', 'addr': 0, 'nwords': 2}, 'function': {'type': 'batch', 'scale': [1, 2, 3]}})
+
+def test_io_manager_wave_tables_are_shared():
+    from plcsimulator.IoManager import IoManager
+
+    memory_manager = MemoryManager(w16len=10)
+    io_manager = IoManager({'simulations': []}, memory_manager=memory_manager)
+    confs = [
+        {'id': 'sine_a', 'memspace': {'section': 'words16', 'addr': 0, 'nwords': 1}, 'function': {'type': 'sine', 'resolution': 2, 'amplitude': 100, 'offset': 500}, 'pause': 0.5},
+        {'id': 'sine_b', 'memspace': {'section': 'words16', 'addr': 1, 'nwords': 1}, 'function': {'type': 'sin', 'resolution': 2, 'amplitude': 100, 'offset': 500, 'phase': 0.2, 'period': 1.25}, 'pause': 0.5},
+        {'id': 'square', 'memspace': {'section': 'words16', 'addr': 2, 'nwords': 1}, 'function': {'type': 'square', 'resolution': 2, 'amplitude': 10, 'offset': 5}}
+    ]
+    sine_a, sine_b, square = [io_manager.init_simulation(conf) for conf in confs]
+
+    assert [struct.unpack('>H', sine_a.generate())[0] for i in range(6)] == [500, 600, 500, 400, 500, 500]
+
+    # The 5 step table is advanced 2 steps per run to complete a cycle in 1.25 s
+    assert [struct.unpack('>H', sine_b.generate())[0] for i in range(3)] == [600, 400, 500]
+    assert [struct.unpack('>H', square.generate())[0] for i in range(5)] == [15, 15, 15, 5, 5]
+    assert io_manager.get_wave_table('sine', 2, 100, 500, 1, 2) is IoManager.wave_tables[('sine', 2, 100, 500, 1, 2)]
+
+    # A period can't be completed without a pause between runs
+    for pause in [{}, {'pause': 0}]:
+        with pytest.raises(ValueError):
+            io_manager.init_simulation({'id': 'sine_c', 'memspace': {'section': 'words16', 'addr': 3, 'nwords': 1}, 'function': {'type': 'sine', 'period': 1}, **pause})
+
+def test_memory_manager_read_hooks_fire_on_overlapping_reads():
+    memory_manager = MemoryManager(blen=16, w16len=10)
+    calls = []
+    memory_manager.add_read_hook('words16', 2, 3, lambda: calls.append('a'))
+    memory_manager.add_read_hook('words16', 6, 1, lambda: calls.append('b'))
+    memory_manager.add_read_hook('bits', 4, 4, lambda: calls.append('c'))
+
+    memory_manager.get_data(section='words16', addr=0, nwords=2)
+    memory_manager.get_data(section='words16', addr=5, nwords=1)
+    memory_manager.get_bits(addr=0, nbits=4)
+    assert calls == []
+
+    memory_manager.get_data(section='words16', addr=4, nwords=3)
+    memory_manager.get_bits(addr=7, nbits=2)
+    assert calls == ['a', 'b', 'c']
+
+def test_io_manager_lazy_simulations_are_evaluated_on_read():
+    from plcsimulator.IoManager import IoManager
+
+    memory_manager = MemoryManager(w16len=10)
+    conf = {'simulations': [
+        {'id': 'lazy_counter', 'memspace': {'section': 'words16', 'addr': 0, 'nwords': 1}, 'function': {'type': 'counter'}, 'pause': 0.01, 'evaluation': 'lazy'}
+    ]}
+    io_manager = IoManager(conf, memory_manager=memory_manager)
+    io_manager.init_io()
+    time.sleep(0.1)
+
+    # Nothing is written until the memory space is read
+    assert memory_manager.memspace['words16'][0:2] == b'\x00\x00'
+    assert int.from_bytes(memory_manager.get_data(section='words16', addr=0, nwords=1), byteorder='big') >= 9
+    assert io_manager.timers == {}
+
+    with pytest.raises(ValueError):
+        io_manager.init_lazy_simulation({'id': 'bad', 'memspace': {'section': 'words16', 'addr': 1, 'nwords': 1}, 'function': {'type': 'uniform'}, 'pause': 1})
+
+def test_io_manager_lazy_simulations_bypass_write_batch():
+    from plcsimulator.IoManager import IoManager
+
+    memory_manager = MemoryManager(w16len=10)
+    conf = {
+        'scheduler': {'mode': 'heap', 'batch_writes': True},
+        'simulations': [
+            {'id': 'lazy_counter', 'memspace': {'section': 'words16', 'addr': 0, 'nwords': 1}, 'function': {'type': 'counter'}, 'pause': 0.01, 'evaluation': 'lazy'}
+        ]
+    }
+    io_manager = IoManager(conf, memory_manager=memory_manager)
+    io_manager.init_io()
+    copy = io_manager.init_simulation({'id': 'copy', 'memspace': {'section': 'words16', 'addr': 1, 'nwords': 1}, 'source': {'memspace': {'section': 'words16', 'addr': 0, 'nwords': 1}}, 'function': {'type': 'copy'}})
+    time.sleep(0.05)
+
+    # A copy run in a scheduling pass reads the value it materialises
+    with io_manager.write_batch:
+        copy.step()
+
+    io_manager.scheduler.stop()
+    words = memory_manager.memspace['words16']
+    assert words[0:2] != b'\x00\x00'
+    assert words[2:4] == words[0:2]
+
+def test_io_manager_random_simulations_have_independent_generators():
+    from plcsimulator.IoManager import IoManager
+
+    memory_manager = MemoryManager(w16len=10)
+    io_manager = IoManager({'simulations': []}, memory_manager=memory_manager)
+
+    def make_conf(id, **kwargs):
+        function = {'type': 'randrange', 'range': [0, 1000], 'seed': 42}
+        function.update(kwargs)
+        return {'id': id, 'memspace': {'section': 'words16', 'addr': 0, 'nwords': 1}, 'function': function}
+
+    a = io_manager.init_simulation(make_conf('a'))
+    b = io_manager.init_simulation(make_conf('b', block=16))
+    other = io_manager.init_simulation(make_conf('other', seed=7))
+
+    values = []
+
+    for i in range(40):
+        other.generate()
+        values.append(a.generate())
+        assert b.generate() == values[-1]
+
+    assert len(set(values)) > 1
+
+def test_io_manager_dependency_graph_evaluates_in_topological_order():
+    from plcsimulator.IoManager import IoManager
+
+    memory_manager = MemoryManager(w16len=10)
+    io_manager = IoManager({'simulations': []}, memory_manager=memory_manager)
+    confs = [
+        {'id': 'add', 'memspace': {'section': 'words16', 'addr': 2, 'nwords': 1}, 'operands': [{'memspace': {'section': 'words16', 'addr': 1, 'nwords': 1}}, {'value': 100}], 'function': {'type': 'operation', 'operator': 'add'}, 'pause': 60},
+        {'id': 'copy', 'memspace': {'section': 'words16', 'addr': 1, 'nwords': 1}, 'source': {'memspace': {'section': 'words16', 'addr': 0, 'nwords': 1}}, 'function': {'type': 'copy'}, 'pause': 60},
+        {'id': 'counter', 'memspace': {'section': 'words16', 'addr': 0, 'nwords': 1}, 'function': {'type': 'counter', 'range': [1, 10]}, 'pause': 60},
+        {'id': 'partial', 'memspace': {'section': 'words16', 'addr': 3, 'nwords': 1}, 'source': {'memspace': {'section': 'words16', 'addr': 2, 'nwords': 3}}, 'function': {'type': 'transform', 'transform': {'in': [0, 10], 'out': 1}}, 'pause': 60}
+    ]
+    simulations = io_manager.init_dependency_graph(confs)
+    assert sorted([simulation.id for simulation in simulations]) == ['counter', 'partial']
+    assert sorted(io_manager.timers) == ['counter', 'partial']
+
+    counter = [simulation for simulation in simulations if simulation.id == 'counter'][0]
+    counter.step()
+    assert memory_manager.get_data(section='words16', addr=0, nwords=3) == b'\x00\x01\x00\x01\x00\x65'
+    counter.step()
+    assert memory_manager.get_data(section='words16', addr=0, nwords=3) == b'\x00\x02\x00\x02\x00\x66'
+
+    # Unchanged upstream data isn't propagated
+    memory_manager.set_data(section='words16', addr=2, nwords=1, data=b'\x00\x00')
+    io_manager.graph.nodes[2].propagate(b'\x00\x02')
+    assert memory_manager.get_data(section='words16', addr=2, nwords=1) == b'\x00\x00'
+
+    # Of several scheduler workers writing the same changed data, only one
+    # sees it as changed
+    node = io_manager.graph.nodes[2]
+    barrier = threading.Barrier(8)
+    results = []
+
+    def write_changed():
+        barrier.wait()
+        results.append(node.changed(b'\x00\x09'))
+
+    threads = [threading.Thread(target=write_changed) for i in range(8)]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    assert sorted(results) == [False] * 7 + [True]
+
+    cycle = [
+        {'id': 'a', 'memspace': {'section': 'words16', 'addr': 5, 'nwords': 1}, 'source': {'memspace': {'section': 'words16', 'addr': 6, 'nwords': 1}}, 'function': {'type': 'copy'}},
+        {'id': 'b', 'memspace': {'section': 'words16', 'addr': 6, 'nwords': 1}, 'source': {'memspace': {'section': 'words16', 'addr': 5, 'nwords': 1}}, 'function': {'type': 'copy'}}
+    ]
+
+    with pytest.raises(ValueError, match='cycle'):
+        io_manager.init_dependency_graph(cycle)
+
+    # An accumulator reads its own output, so it isn't driven by itself
+    accumulator = [
+        {'id': 'src', 'memspace': {'section': 'words16', 'addr': 7, 'nwords': 1}, 'function': {'type': 'static', 'value': 2}, 'pause': 60},
+        {'id': 'acc', 'memspace': {'section': 'words16', 'addr': 8, 'nwords': 1}, 'operands': [{'memspace': {'section': 'words16', 'addr': 8, 'nwords': 1}}, {'memspace': {'section': 'words16', 'addr': 7, 'nwords': 1}}], 'function': {'type': 'operation', 'operator': 'add'}, 'pause': 60}
+    ]
+    simulations = io_manager.init_dependency_graph(accumulator)
+    assert sorted([simulation.id for simulation in simulations]) == ['acc', 'src']
+
+    for simulation in simulations:
+        simulation.step()
+
+    assert memory_manager.get_data(section='words16', addr=7, nwords=2) == b'\x00\x02\x00\x02'
+
+def test_io_manager_dependency_graph_failing_dependent_does_not_stop_producer():
+    from plcsimulator.IoManager import IoManager
+
+    memory_manager = MemoryManager(w16len=10)
+    conf = {'dependencies': True, 'simulations': [
+        {'id': 'counter', 'memspace': {'section': 'words16', 'addr': 0, 'nwords': 1}, 'function': {'type': 'counter', 'range': [1, 1000]}, 'pause': 0.02},
+        {'id': 'div', 'memspace': {'section': 'words16', 'addr': 1, 'nwords': 1}, 'operands': [{'memspace': {'section': 'words16', 'addr': 0, 'nwords': 1}}, {'value': 0}], 'function': {'type': 'operation', 'operator': 'floordiv'}},
+        {'id': 'copy', 'memspace': {'section': 'words16', 'addr': 2, 'nwords': 1}, 'source': {'memspace': {'section': 'words16', 'addr': 0, 'nwords': 1}}, 'function': {'type': 'copy'}}
+    ]}
+    io_manager = IoManager(conf, memory_manager=memory_manager)
+    io_manager.init_io()
+    time.sleep(0.2)
+
+    # In the thread scheduler mode, the dependents run in the producer's
+    # thread, which carries on when one of them fails
+    assert io_manager.get_simulation_stats()['counter']['runs'] > 2
+    value = memory_manager.get_data(section='words16', addr=0, nwords=1)
+    assert value != b'\x00\x00'
+    assert memory_manager.get_data(section='words16', addr=2, nwords=1) in (value, (int.from_bytes(value, 'big') - 1).to_bytes(2, 'big'))
+
+def test_io_manager_expression_simulations():
+    from plcsimulator.IoManager import IoManager
+
+    memory_manager = MemoryManager(w16len=10)
+    io_manager = IoManager({'simulations': []}, memory_manager=memory_manager)
+    memory_manager.set_data(section='words16', addr=0, nwords=2, data=bytearray(b'\x00\x07\x00\x02'))
+
+    def make_conf(expression):
+        return {'id': expression, 'memspace': {'section': 'words16', 'addr': 5, 'nwords': 1}, 'operands': {'a': {'memspace': {'section': 'words16', 'addr': 0, 'nwords': 1}}, 'b': {'source': {'memspace': {'section': 'words16', 'addr': 1, 'nwords': 1}}}, 'k': {'value': 10}}, 'function': {'type': 'expression', 'expression': expression}}
+
+    assert io_manager.init_simulation(make_conf('(a * k + b) >> 2')).generate() == b'\x00\x12'
+    assert io_manager.init_simulation(make_conf('a > b and not b == 3')).generate() == b'\x00\x01'
+    assert io_manager.init_simulation(make_conf('b - a')).generate() == b'\xff\xfb'
+    assert io_manager.get_simulation_inputs(make_conf('a')) == [{'section': 'words16', 'addr': 0, 'nwords': 1}, {'section': 'words16', 'addr': 1, 'nwords': 1}]
+
+    # Constant operands are integers, as for the operation function
+    conf = make_conf('a + k')
+    conf['operands']['k'] = {'value': '10'}
+    assert io_manager.init_simulation(conf).generate() == b'\x00\x11'
+
+    for value in ['ten', None]:
+        conf['operands']['k'] = {'value': value}
+
+        with pytest.raises(ValueError, match='operand k'):
+            io_manager.init_simulation(conf)
+
+    for expression in ['__import__("os").getpid()', 'a.real', 'c + 1', 'a +']:
+        with pytest.raises(ValueError):
+            io_manager.init_simulation(make_conf(expression))
+
+def test_transform_index_first_matching_rule_wins():
+    from plcsimulator.TransformIndex import TransformIndex
+
+    rules = [{'in': 5, 'out': 50}, {'in': [0, 10], 'out': 1}, {'in': [8, 20], 'out': None}, {'in': [1000, 2000], 'out': 3}]
+    dense = TransformIndex(rules[:3])
+    sparse = TransformIndex(rules, dense_max=100)
+    assert dense.dense and not sparse.dense
+
+    for index in [dense, sparse]:
+        assert [index.lookup(x) for x in [-1, 0, 5, 10, 11, 20, 21]] == [None, 1, 50, 1, 11, 20, None]
+
+    assert sparse.lookup(1500) == 3
+    assert TransformIndex({'in': [0, 10], 'out': 1}).lookup(3) == 1
+
+def test_io_manager_replay_simulation_from_recording(tmp_path):
+    from plcsimulator.IoManager import IoManager
+    from plcsimulator.Recording import Recording
+
+    csv_path = tmp_path / 'trace.csv'
+    csv_path.write_text('time,a,b\n0.0,1,2\n0.05,3,-1\n0.1,5,6\n')
+    path = str(tmp_path / 'trace.plcr')
+    assert Recording.convert_csv(str(csv_path), path, 2) == 3
+
+    recording = Recording(path)
+    assert (len(recording), recording.nwords, recording.wlen) == (3, 2, 2)
+    assert bytes(recording.get_row(1)) == b'\x00\x03\xff\xff'
+    assert recording.find(0.07) == 1
+    recording.close()
+
+    memory_manager = MemoryManager(w16len=4)
+    io_manager = IoManager({'simulations': []}, memory_manager=memory_manager)
+    conf = {'id': 'replay', 'memspace': {'section': 'words16', 'addr': 1, 'nwords': 2}, 'function': {'type': 'replay', 'file': path, 'speed': 10.0}}
+    simulation = io_manager.init_simulation(conf)
+    simulation.step()
+    assert memory_manager.get_data(section='words16', addr=1, nwords=2) == b'\x00\x01\x00\x02'
+    assert simulation.generate() is None
+
+    time.sleep(0.012)
+    simulation.step()
+    assert memory_manager.get_data(section='words16', addr=1, nwords=2) == b'\x00\x05\x00\x06'
+
+    with pytest.raises(ValueError):
+        io_manager.init_simulation({'id': 'bad', 'memspace': {'section': 'words16', 'addr': 0, 'nwords': 3}, 'function': {'type': 'replay', 'file': path}})
+
+def test_clock_speed_and_step_scheduling():
+    from plcsimulator.Clock import Clock
+    from plcsimulator.Scheduler import Scheduler
+
+    fast = Clock(speed=100)
+    fast.sleep(5)
+    assert fast.elapsed() >= 5
+    assert fast.to_real(5) == 0.05
+
+    clock = Clock(mode='step')
+    scheduler = Scheduler(clock=clock)
+    runs = []
+
+    def make_task(name, period):
+        def task(due):
+            runs.append((round(clock.elapsed(), 6), name))
+            return due + period
+
+        return task
+
+    scheduler.add(make_task('a', 10.0))
+    scheduler.add(make_task('b', 25.0))
+    scheduler.start()
+    time.sleep(0.1)
+    scheduler.stop()
+
+    # Virtual time jumps straight to each task's due time, in order
+    assert clock.elapsed() > 1000
+    assert runs[:7] == [(0.0, 'a'), (0.0, 'b'), (10.0, 'a'), (20.0, 'a'), (25.0, 'b'), (30.0, 'a'), (40.0, 'a')]
+
+    # With nothing run periodically, the step clock would never advance
+    from plcsimulator.IoManager import IoManager
+
+    conf = {'clock': {'mode': 'step'}, 'simulations': [
+        {'id': 'lazy_counter', 'memspace': {'section': 'words16', 'addr': 0, 'nwords': 1}, 'function': {'type': 'counter'}, 'pause': 1, 'evaluation': 'lazy'}
+    ]}
+
+    with pytest.raises(ValueError, match='step clock'):
+        IoManager(conf, memory_manager=MemoryManager(w16len=10)).init_io()
+
+    # A simulation without a pause is always due, so would starve the others
+    conf = {'clock': {'mode': 'step'}, 'simulations': [
+        {'id': 'counter_a', 'memspace': {'section': 'words16', 'addr': 0, 'nwords': 1}, 'function': {'type': 'counter'}, 'pause': 1},
+        {'id': 'counter_b', 'memspace': {'section': 'words16', 'addr': 1, 'nwords': 1}, 'function': {'type': 'counter'}}
+    ]}
+
+    with pytest.raises(ValueError, match='counter_b'):
+        IoManager(conf, memory_manager=MemoryManager(w16len=10)).init_io()
+
+def test_memory_manager_apply_writes_coalesces_adjacent_words():
+    memory_manager = MemoryManager(blen=16, w16len=8)
+    memory_manager.apply_writes([
+        ('words16', 3, 1, b'\x00\x03'),
+        ('bits', 1, 2, b'\x03'),
+        ('words16', 1, 2, b'\x00\x01\x00\x02'),
+        ('words16', 6, 1, b'\x00\x06')
+    ])
+
+    assert memory_manager.coalesce_writes([('words16', 3, 1, b'\x00\x03'), ('words16', 1, 2, b'\x00\x01\x00\x02'), ('words16', 6, 1, b'\x00\x06')], 2) == [(2, 8, b'\x00\x01\x00\x02\x00\x03'), (12, 14, b'\x00\x06')]
+    assert memory_manager.get_data(section='words16', addr=0, nwords=7) == b'\x00\x00\x00\x01\x00\x02\x00\x03\x00\x00\x00\x00\x00\x06'
+    assert memory_manager.get_bits(addr=0, nbits=8) == b'\x06'
+    assert memory_manager.get_lock_stats()['words16']['write']['acquisitions'] == 1
+
+    # Overlapping writes are applied in order
+    memory_manager.apply_writes([('words16', 0, 2, b'\x00\x0a\x00\x0b'), ('words16', 1, 1, b'\x00\x0c')])
+    assert memory_manager.get_data(section='words16', addr=0, nwords=2) == b'\x00\x0a\x00\x0c'
+
+    with pytest.raises(IndexError):
+        memory_manager.apply_writes([('words16', 0, 1, b'\x00\x01'), ('words16', 8, 1, b'\x00\x01')])
+
+def test_io_manager_batches_writes_in_each_scheduling_pass():
+    from plcsimulator.IoManager import IoManager
+
+    memory_manager = MemoryManager(w16len=20)
+    conf = {
+        'scheduler': {'mode': 'heap'},
+        'dependencies': True,
+        'simulations': [{'id': 'static_{}'.format(i), 'memspace': {'section': 'words16', 'addr': i, 'nwords': 1}, 'function': {'type': 'static', 'value': i}, 'pause': 60} for i in range(10)]
+    }
+    conf['simulations'].append({'id': 'copy', 'memspace': {'section': 'words16', 'addr': 10, 'nwords': 10}, 'source': {'memspace': {'section': 'words16', 'addr': 0, 'nwords': 10}}, 'function': {'type': 'copy'}})
+    io_manager = IoManager(conf, memory_manager=memory_manager)
+    io_manager.init_io()
+    time.sleep(0.1)
+    io_manager.scheduler.stop()
+
+    expected = b''.join([i.to_bytes(2, byteorder='big') for i in range(10)])
+    assert memory_manager.get_data(section='words16', addr=0, nwords=10) == expected
+    assert memory_manager.get_data(section='words16', addr=10, nwords=10) == expected
+
+    # One batch for the static simulations, then one write by the copy
+    assert memory_manager.get_lock_stats()['words16']['write']['acquisitions'] == 2
+
+def test_memory_manager_transaction_is_atomic_across_sections():
+    memory_manager = MemoryManager(blen=16, w16len=4, w32len=2)
+
+    with memory_manager.transaction() as tx:
+        tx.set_data('words32', 1, 1, b'\x00\x01\x00\x02')
+        tx.set_bits('bits', 4, 4, b'\x0a')
+        value = tx.get_data('words32', 1, 1)
+        status = tx.get_bits('bits', 4, 4)
+
+    assert tx.results[value] == b'\x00\x01\x00\x02'
+    assert tx.results[status] == b'\x0a'
+    assert memory_manager.get_bits(addr=0, nbits=8) == b'\xa0'
+
+    # Each section's lock is taken once, for writing
+    stats = memory_manager.get_lock_stats()
+    assert stats['words32']['write']['acquisitions'] == 1
+    assert stats['words32']['read']['acquisitions'] == 0
+
+    # A read-only transaction can be committed repeatedly
+    tx = memory_manager.transaction()
+    tx.get_data('words32', 1, 1)
+    tx.get_data('words16', 0, 2)
+    memory_manager.set_data('words16', 0, 1, b'\x00\x07')
+    assert tx.commit() == [b'\x00\x01\x00\x02', b'\x00\x07\x00\x00']
+
+    # An invalid operation fails before any data are accessed
+    tx = memory_manager.transaction()
+    tx.set_data('words16', 0, 1, b'\x00\x09')
+
+    with pytest.raises(IndexError):
+        tx.get_data('words16', 3, 2)
+
+    with pytest.raises(ValueError, match='set_bit'):
+        tx.add('set_bit', 'bits', 0, 1, b'\x01')
+
+    assert memory_manager.get_data('words16', 0, 1) == b'\x00\x07'
+    assert memory_manager.get_bits(addr=0, nbits=1) == b'\x00'
+
+def test_modbus_read_responses_use_connection_send_buffer():
+    from plcsimulator.ModbusModule import ModbusModule
+    from plcsimulator.FieldbusMessage import FieldbusMessage
+
+    memory_manager = MemoryManager(w16len=4000)
+    memory_manager.set_data(section='words16', addr=0, nwords=2, data=bytearray(b'\x00\x01\x00\x02'))
+    plc = ModbusModule('modbus')
+    plc.init(conf={}, memory_manager=memory_manager)
+    requests = []
+
+    for tid in (1, 2):
+        request = FieldbusMessage(0)
+        request.buf = bytearray(struct.pack('>HHHBBHH', tid, 0, 6, 1, 0x03, tid - 1, 1))
+        requests.append(request)
+
+    assert plc.dispatch_requests(requests) == bytes.fromhex('00010000000501030200' '01' '00020000000501030200' '02')
+    assert plc.send_len == 22
+
+    # The send buffer is reused for the next requests
+    response = plc.dispatch_requests(requests[:1])
+    assert isinstance(response, memoryview) and response.obj is plc.send_buf
+    assert plc.send_len == 11
+
+    out = bytearray(8)
+    assert memory_manager.get_data_into(section='words16', addr=0, nwords=2, out=out, offset=4) == 4
+    assert out == b'\x00\x00\x00\x00\x00\x01\x00\x02'
+
+    with pytest.raises(IndexError):
+        memory_manager.get_data_into(section='words16', addr=0, nwords=3, out=out, offset=4)
+
+def write_shared_memspace(path):
+    memory_manager = MemoryManager(blen=16, w16len=4, shared={'path': path, 'create': False})
+    memory_manager.set_data(section='words16', addr=1, nwords=2, data=b'\x00\x01\x00\x02')
+    memory_manager.set_bits(addr=3, nbits=1, data=b'\x01')
+    memory_manager.close()
+
+@pytest.mark.skipif(os.name != 'posix', reason='requires POSIX record locks')
+def test_memory_manager_shared_memspace_between_processes(tmp_path):
+    import multiprocessing
+
+    path = str(tmp_path / 'plc.mem')
+    memory_manager = MemoryManager(blen=16, w16len=4, shared={'path': path})
+    assert memory_manager.get_section_seq('words16') == 0
+
+    process = multiprocessing.Process(target=write_shared_memspace, args=(path,))
+    process.start()
+    process.join(10)
+    assert process.exitcode == 0
+
+    assert memory_manager.get_data(section='words16', addr=0, nwords=3) == b'\x00\x00\x00\x01\x00\x02'
+    assert memory_manager.get_bits(addr=0, nbits=8) == b'\x08'
+    assert memory_manager.get_section_seq('words16') == 1
+    assert memory_manager.get_section_seq('bits') == 1
+
+    # Data got from a shared section are a copy
+    data = memory_manager.get_bits(addr=0, nbits=8)
+    data[0] = 0xff
+    assert memory_manager.get_bits(addr=0, nbits=8) == b'\x08'
+
+    with pytest.raises(ValueError):
+        MemoryManager(blen=16, w16len=8, shared={'path': path, 'create': False})
+
+    memory_manager.close()
+
+@pytest.mark.skipif(os.name != 'posix', reason='requires POSIX record locks')
+def test_memory_manager_shared_memspace_attach_keeps_data(tmp_path):
+    path = str(tmp_path / 'plc.mem')
+    memory_manager = MemoryManager(w16len=4, shared={'path': path})
+    memory_manager.set_data(section='words16', addr=0, nwords=1, data=b'\x04\xd2')
+
+    # A second attach with the default configuration doesn't reinitialise
+    # the live memory space
+    other = MemoryManager(w16len=4, shared={'path': path})
+    assert other.get_data(section='words16', addr=0, nwords=1) == b'\x04\xd2'
+    assert memory_manager.get_data(section='words16', addr=0, nwords=1) == b'\x04\xd2'
+    assert other.get_section_seq('words16') == 1
+    other.close()
+    memory_manager.close()
+
+    # A file without a header is initialised with zeroed sections
+    path = tmp_path / 'garbage.mem'
+    path.write_bytes(b'\xff' * 256)
+    memory_manager = MemoryManager(w16len=4, shared={'path': str(path)})
+    assert memory_manager.get_data(section='words16', addr=0, nwords=4) == bytes(8)
+    memory_manager.close()
+
+    with pytest.raises(FileNotFoundError):
+        MemoryManager(w16len=4, shared={'path': str(tmp_path / 'missing.mem'), 'create': False})
+
+@pytest.mark.skipif(not hasattr(socket, 'SO_REUSEPORT'), reason='requires SO_REUSEPORT')
+def test_listener_workers_serve_the_shared_memspace(tmp_path):
+    port = get_free_port()
+    memory_manager = MemoryManager(w16len=10, shared={'path': str(tmp_path / 'plc.mem')})
+    modules = [{'module': 'plcsimulator.ModbusModule', 'class': 'ModbusModule', 'id': 'modbus', 'port': port, 'conf': {}}]
+    fieldbus_manager = FieldbusManager(modules=modules, memory_manager=memory_manager)
+    fieldbus_manager.init_modules()
+    listener = Listener(host='localhost', port=port, workers=2, fieldbus_manager=fieldbus_manager)
+
+    if listener.fork_workers():
+        try:
+            listener.service_client_requests()
+        finally:
+            os._exit(0)
+
+    try:
+        assert len(listener.pids) == 2
+
+        # Data set in this process are served by the workers
+        memory_manager.set_data(section='words16', addr=0, nwords=1, data=b'\x00\x2a')
+        request = struct.pack('>HHHBBHH', 1, 0, 6, 1, 0x03, 0, 1)
+
+        for i in range(4):
+            for attempt in range(50):
+                try:
+                    conn = socket.create_connection(('localhost', port))
+                    break
+                except ConnectionRefusedError:
+                    time.sleep(0.05)
+
+            with conn:
+                conn.sendall(request)
+                assert recv_response(conn) == bytes.fromhex('00010000000501030200' '2a')
+    finally:
+        listener.stop_workers()
+
+    assert listener.pids == []
+    memory_manager.close()
+
+def test_listener_workers_require_a_shared_memspace():
+    memory_manager = MemoryManager(w16len=10)
+    fieldbus_manager = FieldbusManager(modules=[], memory_manager=memory_manager)
+
+    with pytest.raises(ValueError, match='shared'):
+        Listener(host='localhost', port=get_free_port(), workers=2, fieldbus_manager=fieldbus_manager)
+
+def test_listener_workers_serve_lazy_simulations_from_one_epoch(tmp_path):
+    from plcsimulator.IoManager import IoManager
+
+    port = get_free_port()
+    memory_manager = MemoryManager(w16len=10, shared={'path': str(tmp_path / 'plc.mem')})
+    conf = {'simulations': [
+        {'id': 'lazy_counter', 'memspace': {'section': 'words16', 'addr': 0, 'nwords': 1}, 'function': {'type': 'counter'}, 'pause': 0.1, 'evaluation': 'lazy'}
+    ]}
+    created = time.monotonic()
+    io_manager = IoManager(conf, memory_manager=memory_manager)
+    epoch = (created, time.monotonic())
+    modules = [{'module': 'plcsimulator.ModbusModule', 'class': 'ModbusModule', 'id': 'modbus', 'port': port, 'conf': {}}]
+    fieldbus_manager = FieldbusManager(modules=modules, memory_manager=memory_manager)
+    fieldbus_manager.init_modules()
+    listener = Listener(host='localhost', port=port, workers=2, fieldbus_manager=fieldbus_manager)
+
+    if listener.fork_workers():
+        try:
+            # The workers initialise their lazy simulations later than the
+            # parent, but evaluate them from the same epoch
+            time.sleep(0.3)
+            io_manager.init_io(eager=False)
+            listener.service_client_requests()
+        finally:
+            os._exit(0)
+
+    try:
+        io_manager.init_io()
+        request = struct.pack('>HHHBBHH', 1, 0, 6, 1, 0x03, 0, 1)
+
+        for i in range(4):
+            for attempt in range(50):
+                try:
+                    conn = socket.create_connection(('localhost', port))
+                    break
+                except ConnectionRefusedError:
+                    time.sleep(0.05)
+
+            # The served value is the number of runs since the epoch
+            with conn:
+                before = time.monotonic()
+                conn.sendall(request)
+                served = int.from_bytes(recv_response(conn)[9:11], byteorder='big')
+                after = time.monotonic()
+
+            assert (before - epoch[1]) // 0.1 <= served <= (after - epoch[0]) // 0.1
+    finally:
+        listener.stop_workers()
+
+    memory_manager.close()
+
+def test_fleet_plcs_are_addressed_by_port_and_unit():
+    from plcsimulator.Fleet import Fleet
+
+    ports = [get_free_port(), get_free_port()]
+    io_conf = {'simulations': [{'memspace': {'section': 'words16', 'addr': 0, 'nwords': 1}, 'function': {'type': 'static', 'value': 7}, 'pause': 60}]}
+    fleet = Fleet({'units': [1, 10]}, memspace={'w16len': 10}, io_conf=io_conf)
+    fleet.start()
+    modules = [{'module': 'plcsimulator.ModbusModule', 'class': 'ModbusModule', 'id': 'modbus', 'port': ports[0], 'conf': {}}, {'module': 'plcsimulator.ModbusModule', 'class': 'ModbusModule', 'id': 'modbus_b', 'port': ports[1], 'conf': {}}]
+    fieldbus_manager = FieldbusManager(modules=modules, fleet=fleet)
+    fieldbus_manager.init_modules()
+    listener = Listener(host='localhost', port=ports[0], mode='asyncio', fieldbus_manager=fieldbus_manager)
+    threading.Thread(target=listener.service_client_requests, daemon=True).start()
+
+    def request(port, unit, function, addr, value):
+        for i in range(50):
+            try:
+                conn = socket.create_connection(('localhost', port))
+                break
+            except ConnectionRefusedError:
+                time.sleep(0.05)
+
+        with conn:
+            conn.sendall(struct.pack('>HHHBBHH', 1, 0, 6, unit, function, addr, value))
+            return recv_response(conn)
+
+    # Each PLC has its own memory space, created when it is first addressed
+    assert request(ports[0], 1, 0x06, 1, 100) == struct.pack('>HHHBBHH', 1, 0, 6, 1, 0x06, 1, 100)
+    request(ports[0], 2, 0x03, 0, 2)
+    request(ports[1], 1, 0x03, 0, 2)
+    time.sleep(0.1)
+
+    assert request(ports[0], 2, 0x03, 0, 2) == bytes.fromhex('0001000000070203040007' '0000')
+    assert request(ports[1], 1, 0x03, 0, 2) == bytes.fromhex('0001000000070103040007' '0000')
+    assert request(ports[0], 1, 0x03, 0, 2) == bytes.fromhex('0001000000070103040007' '0064')
+    assert sorted(fleet.get_plcs()) == sorted([(ports[0], 1), (ports[0], 2), (ports[1], 1)])
+
+    # A unit outside the fleet's range gets a gateway exception
+    assert request(ports[0], 11, 0x03, 0, 1)[7:9] == bytes([0x83, 0x0b])
+
+    fleet.stop()
+
+def test_threaded_listener_serves_every_module_port():
+    ports = [get_free_port(), get_free_port()]
+    memory_manager = MemoryManager(w16len=10)
+    memory_manager.set_data(section='words16', addr=0, nwords=1, data=b'\x00\x2a')
+    modules = [{'module': 'plcsimulator.ModbusModule', 'class': 'ModbusModule', 'id': 'modbus_{}'.format(i), 'port': port, 'conf': {}} for i, port in enumerate(ports)]
+    fieldbus_manager = FieldbusManager(modules=modules, memory_manager=memory_manager)
+    fieldbus_manager.init_modules()
+    listener = Listener(host='localhost', port=ports[0], fieldbus_manager=fieldbus_manager)
+    threading.Thread(target=listener.service_client_requests, daemon=True).start()
+    request = struct.pack('>HHHBBHH', 1, 0, 6, 1, 0x03, 0, 1)
+    expected = bytes.fromhex('00010000000501030200' '2a')
+
+    for port in ports:
+        for i in range(50):
+            try:
+                socket.create_connection(('localhost', port)).close()
+                break
+            except ConnectionRefusedError:
+                time.sleep(0.05)
+
+    # A burst of connections is accepted without any being refused
+    conns = [socket.create_connection(('localhost', ports[i % 2]), timeout=5) for i in range(300)]
+
+    try:
+        for conn in conns:
+            conn.sendall(request)
+
+        for conn in conns:
+            assert recv_response(conn) == expected
+    finally:
+        for conn in conns:
+            conn.close()
+
+def test_backend_pool_admission_limits():
+    pool = BackendPool(max_backends=2, queue_depth=1, max_per_client=2)
+    a = ('10.0.0.1', 1000)
+    b = ('10.0.0.2', 1000)
+
+    assert pool.admit(a) and pool.admit(a)
+    assert not pool.admit(a)
+    assert pool.admit(b)
+    assert not pool.admit(b)
+    pool.release(a)
+    assert pool.admit(b)
+    assert pool.get_stats() == {'admitted': 4, 'queued': 2, 'rejected': 2, 'max_concurrent': 3}
+
+    # An idle worker lingers for another connection, even when woken for a
+    # connection that another worker has already taken
+    pool = BackendPool(worker_linger=0.2)
+    done = threading.Event()
+    pool.submit(lambda conn, address: (conn.close(), done.set()), socket.socket(), a)
+    assert done.wait(1)
+    time.sleep(0.05)
+
+    with pool.cond:
+        pool.cond.notify_all()
+
+    time.sleep(0.05)
+    assert pool.nworkers == 1
+    time.sleep(0.3)
+    assert pool.nworkers == 0
+
+    for conf in [{'max_backends': 0}, {'worker_linger': 0}]:
+        with pytest.raises(ValueError):
+            BackendPool(**conf)
+
+@pytest.mark.parametrize('mode', ['thread', 'asyncio'])
+def test_listener_backend_pool_queues_rejects_and_times_out(mode):
+    port, memory_manager = start_simulator(mode=mode, pool={'max_backends': 1, 'queue_depth': 1, 'idle_timeout': 0.5})
+    memory_manager.set_data(section='words16', addr=0, nwords=1, data=b'\x00\x2a')
+    request = struct.pack('>HHHBBHH', 1, 0, 6, 1, 0x03, 0, 1)
+    expected = bytes.fromhex('00010000000501030200' '2a')
+
+    # Let the backend of the start-up connection finish
+    time.sleep(0.2)
+
+    conns = [socket.create_connection(('localhost', port), timeout=5) for i in range(3)]
+
+    try:
+        for conn in conns:
+            conn.sendall(request)
+
+        # The first is serviced, the second is queued until the first's
+        # backend times out, and the third is rejected
+        assert recv_response(conns[0]) == expected
+
+        try:
+            assert conns[2].recv(1) == b''
+        except ConnectionResetError:
+            pass
+
+        start = time.monotonic()
+        assert recv_response(conns[1]) == expected
+        assert time.monotonic() - start > 0.2
+        assert conns[0].recv(1) == b''
+    finally:
+        for conn in conns:
+            conn.close()
+
+def test_listener_backend_pool_times_out_partial_request():
+    port, memory_manager = start_simulator(mode='thread', pool={'max_backends': 1, 'idle_timeout': 0.3})
+    memory_manager.set_data(section='words16', addr=0, nwords=1, data=b'\x00\x2a')
+
+    # Let the backend of the start-up connection finish
+    time.sleep(0.5)
+
+    with socket.create_connection(('localhost', port), timeout=5) as stalled:
+        stalled.sendall(b'\x00\x01\x00')
+        start = time.monotonic()
+
+        try:
+            assert stalled.recv(1) == b''
+        except ConnectionResetError:
+            pass
+
+        assert time.monotonic() - start < 2
+
+    # The stalled client's backend is free to service another client
+    with socket.create_connection(('localhost', port), timeout=5) as conn:
+        conn.sendall(struct.pack('>HHHBBHH', 1, 0, 6, 1, 0x03, 0, 1))
+        assert recv_response(conn) == bytes.fromhex('00010000000501030200' '2a')